@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+from metrics import REGISTRY
+
+SHED_REQUESTS = REGISTRY.counter(
+    'chat_shed_requests_total', 'Requests refused to keep latency bounded, by reason', ['reason'])
+
+
+class TokenBucket:
+    """rate tokens per second, holding at most burst"""
+
+    __slots__ = ('rate', 'burst', 'tokens', 'updated')
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def is_full(self, now: float) -> bool:
+        """Whether the bucket has refilled to burst by now"""
+        return self.tokens + (now - self.updated) * self.rate >= self.burst
+
+    def take(self, now: float) -> float:
+        """Take a token and return 0, or return the seconds until one is available"""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """Token buckets keyed by client address or sender
+
+    At most max_keys keys keep a bucket. Room for a new key is only made by
+    evicting the least recently seen bucket once it has refilled to burst,
+    since a new bucket for that key starts full too; a throttled key is
+    never forgotten. While every bucket is still refilling, new keys share
+    one overflow bucket, so a flood of fresh keys gets rate between them.
+    rate <= 0 disables the limit.
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None, max_keys: int = 10000,
+                 clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.burst = max(1.0, burst if burst is not None else rate)
+        self.max_keys = max_keys
+        self._clock = clock
+        self._buckets: 'OrderedDict[str, TokenBucket]' = OrderedDict()
+        self._overflow: Optional[TokenBucket] = None
+        self._lock = threading.Lock()
+        self.limited = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def check(self, key: str) -> float:
+        """0 if key may proceed now, otherwise the seconds it should wait"""
+        if not self.enabled:
+            return 0.0
+        now = self._clock()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                self._buckets.move_to_end(key)
+            else:
+                # Least recently seen first, so stop at the first that is still refilling
+                while len(self._buckets) >= self.max_keys:
+                    oldest = next(iter(self._buckets.values()))
+                    if not oldest.is_full(now):
+                        break
+                    self._buckets.popitem(last=False)
+                if len(self._buckets) < self.max_keys:
+                    bucket = self._buckets[key] = TokenBucket(self.rate, self.burst, now)
+                else:
+                    if self._overflow is None:
+                        self._overflow = TokenBucket(self.rate, self.burst, now)
+                    bucket = self._overflow
+            wait = bucket.take(now)
+            if wait:
+                self.limited += 1
+            return wait
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {'rate': self.rate, 'burst': self.burst, 'keys': len(self._buckets), 'limited': self.limited}
+
+
+class InFlightLimiter:
+    """Cap on requests being handled at once; limit <= 0 disables it
+
+    try_acquire never waits: a request over the cap is refused straight
+    away, which keeps queueing delay out of the latency of the requests
+    that are admitted.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            if 0 < self.limit <= self.in_flight:
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
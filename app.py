@@ -1,20 +1,157 @@
 #!/usr/bin/env python3
 from http.server import HTTPServer, BaseHTTPRequestHandler
+from datetime import datetime, timezone
 import json
+import math
 import os
+import signal
+import socket
+import threading
+import time
 from urllib.parse import parse_qs, urlparse
 from dotenv import load_dotenv
 
+from admission import SHED_REQUESTS, InFlightLimiter, RateLimiter
+from asset_cache import StaticAssetCache
+from broadcaster import MessageBroadcaster
+from database.db_utils import SEARCH_ORDERS, DatabaseManager, DuplicateMessageError, UnknownCursorError
+from database.init_db import DatabaseInitializer
+from idempotency import MAX_CLIENT_ID_LENGTH, RecentClientIds
+from json_stream import iter_chunks, iter_json_object, iter_ndjson
+from metrics import REGISTRY
+from recent_cache import RecentMessageCache
+from rooms import DEFAULT_ROOM, MAX_ROOM_ID_LENGTH, parse_room_id
+from threaded_server import BoundedThreadingHTTPServer
+
 # Load environment variables from .env file
 load_dotenv()
 
 # Configuration
 HOST = "localhost"
 PORT = 8000
+REPO_URL = os.getenv("REPO_URL", "https://github.com/wpinney/testchat.git")
+# Checkout the sync worker commits to; defaults to this directory
+REPO_PATH = os.getenv("REPO_PATH") or None
+
+# Serving mode: "threaded" (bounded worker pool, HTTP/1.1 keep-alive), "single",
+# or "prefork" (threaded worker processes sharing the port, see prefork.py)
+SERVER_MODE = os.getenv("SERVER_MODE", "threaded")
+PREFORK_WORKERS = int(os.getenv("PREFORK_WORKERS", "0")) or os.cpu_count() or 1
+MAX_WORKERS = int(os.getenv("MAX_WORKERS", "128"))
+MAX_CONNECTIONS = int(os.getenv("MAX_CONNECTIONS", "256"))
+MAX_REQUEST_SIZE = int(os.getenv("MAX_REQUEST_SIZE", str(64 * 1024)))
+KEEPALIVE_TIMEOUT = float(os.getenv("KEEPALIVE_TIMEOUT", "5"))
+# Seconds open requests get to finish on shutdown before the database closes
+SHUTDOWN_GRACE = float(os.getenv("SHUTDOWN_GRACE", "10"))
+
+# Static files, loaded once and reloaded when they change on disk
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+TEMPLATE_ASSETS = StaticAssetCache(os.path.join(BASE_DIR, "templates"))
+STATIC_ASSETS = StaticAssetCache(os.path.join(BASE_DIR, "static"))
+# 0 makes browsers revalidate every time, which costs a 304 at most
+STATIC_MAX_AGE = int(os.getenv("STATIC_MAX_AGE", "0"))
+
+# Message history pages
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+# Newest messages held in memory for history pages (0 disables the cache)
+RECENT_CACHE_SIZE = int(os.getenv("RECENT_CACHE_SIZE", "500"))
+# Rooms the recent-message cache buffers at once; the least recently used goes first
+RECENT_CACHE_ROOMS = int(os.getenv("RECENT_CACHE_ROOMS", "100"))
+# The cache is saved here on shutdown and restored at the next start if the
+# database has not changed in between ("" disables)
+RECENT_SNAPSHOT = os.getenv("RECENT_SNAPSHOT", os.path.join(BASE_DIR, "database", "recent_snapshot.json"))
+
+ROOM_ID_ERROR = (f"room_id must be 1-{MAX_ROOM_ID_LENGTH} lower-case letters, digits, '-' or '_', "
+                 "starting with a letter or digit")
+
+# Recently posted client_ids remembered in memory for deduplicating retries
+CLIENT_ID_CACHE_SIZE = int(os.getenv("CLIENT_ID_CACHE_SIZE", "10000"))
+
+# Server-Sent Events stream
+STREAM_BUFFER_SIZE = int(os.getenv("STREAM_BUFFER_SIZE", "256"))
+STREAM_HEARTBEAT = float(os.getenv("STREAM_HEARTBEAT", "15"))
+STREAM_REPLAY_LIMIT = 500
+# Open streams before more get 503. Each one holds a worker thread for as
+# long as it lasts, so the cap stays below MAX_WORKERS to leave threads for
+# every other request.
+MAX_STREAMS = int(os.getenv("MAX_STREAMS", str(MAX_WORKERS // 2)))
+
+# Admission control. Posts per second, with bursts up to the given size,
+# for each client address and each sender (a rate of 0 disables that limit)
+CLIENT_RATE_LIMIT = float(os.getenv("CLIENT_RATE_LIMIT", "10"))
+CLIENT_RATE_BURST = float(os.getenv("CLIENT_RATE_BURST", "20"))
+SENDER_RATE_LIMIT = float(os.getenv("SENDER_RATE_LIMIT", "5"))
+SENDER_RATE_BURST = float(os.getenv("SENDER_RATE_BURST", "10"))
+# API requests handled at once before more get 503 (0 disables)
+MAX_IN_FLIGHT = int(os.getenv("MAX_IN_FLIGHT", "64"))
+# Routes counted against MAX_IN_FLIGHT: those doing database work on request.
+# Streams are long-lived and bounded by MAX_STREAMS instead.
+ADMITTED_ROUTES = {"/api/messages", "/api/messages/export", "/api/search"}
+
+# Background Git sync
+SYNC_ENABLED = os.getenv("SYNC_ENABLED", "1") == "1"
+SYNC_BATCH_SIZE = int(os.getenv("SYNC_BATCH_SIZE", "100"))
+SYNC_POLL_INTERVAL = float(os.getenv("SYNC_POLL_INTERVAL", "5"))
+SYNC_MAX_BACKLOG = int(os.getenv("SYNC_MAX_BACKLOG", "10000"))
+
+# Requests slower than this many milliseconds are logged (0 disables)
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "0"))
+# Per-request access log lines on stderr
+ACCESS_LOG = os.getenv("ACCESS_LOG", "1") == "1"
+
+# Request metrics; routes outside this set share one label to bound cardinality
+KNOWN_ROUTES = {"/", "/api/messages", "/api/messages/export", "/api/search", "/api/stream", "/api/sync/status",
+                "/metrics", "/healthz", "/readyz"}
+HTTP_REQUESTS = REGISTRY.counter(
+    "chat_http_requests_total", "HTTP requests by method, route and status", ["method", "route", "status"])
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "chat_http_request_duration_seconds", "HTTP request latency by method and route", ["method", "route"])
+SYNC_QUEUE_DEPTH = REGISTRY.gauge("chat_sync_queue_depth", "Messages waiting to be pushed to Git")
+STREAM_SUBSCRIBERS = REGISTRY.gauge("chat_stream_subscribers", "Open /api/stream connections")
+ACTIVE_CONNECTIONS = REGISTRY.gauge("chat_http_active_connections", "Connections held by worker threads")
+DUPLICATE_POSTS = REGISTRY.counter(
+    "chat_duplicate_posts_total", "Posts repeating a stored client_id, by where they were caught", ["caught_by"])
+
+def route_label(path):
+    """Collapse a request path into a bounded set of metric labels"""
+    if path in KNOWN_ROUTES:
+        return path
+    if path.startswith("/static/"):
+        return "/static/*"
+    return "other"
 
 class ChatRequestHandler(BaseHTTPRequestHandler):
     """Custom request handler for our chat application"""
 
+    def parse_request(self):
+        """Start the request timer once the request line has arrived"""
+        self._request_started = time.perf_counter()
+        self._status = None
+        return super().parse_request()
+
+    def handle_one_request(self):
+        """Handle a request and record its metrics"""
+        self._request_started = None
+        super().handle_one_request()
+        if self._request_started is not None and self.command:
+            self.record_request(time.perf_counter() - self._request_started)
+
+    def send_response(self, code, message=None):
+        self._status = code
+        super().send_response(code, message)
+
+    def record_request(self, duration):
+        route = route_label(urlparse(self.path).path)
+        HTTP_REQUESTS.inc(self.command, route, self._status or 0)
+        HTTP_REQUEST_SECONDS.observe(duration, self.command, route)
+        if SLOW_REQUEST_MS and duration * 1000 >= SLOW_REQUEST_MS:
+            print(f"Slow request: {self.command} {self.path} -> {self._status} in {duration * 1000:.1f}ms")
+
+    def log_request(self, code="-", size="-"):
+        if ACCESS_LOG:
+            super().log_request(code, size)
+
     def do_GET(self):
         """Handle GET requests"""
         # Parse the URL path
@@ -22,35 +159,42 @@ class ChatRequestHandler(BaseHTTPRequestHandler):
         
         if parsed_path.path == "/":
             # Serve the main page
-            try:
-                with open("templates/index.html", "rb") as f:
-                    content = f.read()
-                self.send_response(200)
-                self.send_header("Content-type", "text/html")
-                self.end_headers()
-                self.wfile.write(content)
-            except FileNotFoundError:
-                self.send_error(404, "File not found")
+            self.serve_asset(TEMPLATE_ASSETS, "index.html")
         
         elif parsed_path.path.startswith("/static/"):
             # Serve static files (CSS, JS)
-            try:
-                with open(parsed_path.path[1:], "rb") as f:
-                    content = f.read()
-                self.send_response(200)
-                # Set content type based on file extension
-                if parsed_path.path.endswith(".css"):
-                    content_type = "text/css"
-                elif parsed_path.path.endswith(".js"):
-                    content_type = "text/javascript"
-                else:
-                    content_type = "text/plain"
-                self.send_header("Content-type", content_type)
-                self.end_headers()
-                self.wfile.write(content)
-            except FileNotFoundError:
-                self.send_error(404, "File not found")
+            self.serve_asset(STATIC_ASSETS, parsed_path.path[len("/static/"):])
         
+        elif parsed_path.path == "/api/messages":
+            self.run_admitted(self.handle_get_messages, parse_qs(parsed_path.query))
+
+        elif parsed_path.path == "/api/messages/export":
+            self.run_admitted(self.handle_export_messages, parse_qs(parsed_path.query))
+
+        elif parsed_path.path == "/api/search":
+            self.run_admitted(self.handle_search, parse_qs(parsed_path.query))
+
+        elif parsed_path.path == "/api/stream":
+            self.handle_stream(parse_qs(parsed_path.query))
+
+        elif parsed_path.path == "/metrics":
+            self.handle_metrics()
+
+        elif parsed_path.path == "/healthz":
+            # Liveness: the process is up and answering
+            self.send_json_response(200, {"status": "ok"})
+
+        elif parsed_path.path == "/readyz":
+            self.handle_readyz()
+
+        elif parsed_path.path == "/api/sync/status":
+            # Report the background sync queue
+            sync_worker = self.server.sync_worker
+            if sync_worker is None:
+                self.send_json_response(200, {"status": "success", "sync": {"running": False}})
+            else:
+                self.send_json_response(200, {"status": "success", "sync": sync_worker.stats()})
+
         else:
             # Handle 404 for unknown paths
             self.send_error(404, "Path not found")
@@ -58,7 +202,19 @@ class ChatRequestHandler(BaseHTTPRequestHandler):
     def do_POST(self):
         """Handle POST requests"""
         # Get the size of the POST data
-        content_length = int(self.headers.get("Content-Length", 0))
+        try:
+            content_length = int(self.headers.get("Content-Length", 0))
+        except ValueError:
+            self.close_connection = True
+            self.send_json_response(400, {"status": "error", "message": "Invalid Content-Length"})
+            return
+
+        # Refuse oversized bodies without reading them
+        if content_length < 0 or content_length > MAX_REQUEST_SIZE:
+            self.close_connection = True
+            SHED_REQUESTS.inc("too_large")
+            self.send_json_response(413, {"status": "error", "message": "Request body too large"})
+            return
         
         # Read and parse the POST data
         post_data = self.rfile.read(content_length)
@@ -69,9 +225,7 @@ class ChatRequestHandler(BaseHTTPRequestHandler):
             
             # Handle different POST endpoints
             if self.path == "/api/messages":
-                # Handle new message
-                response_data = {"status": "success", "message": "Message received"}
-                self.send_json_response(200, response_data)
+                self.run_admitted(self.handle_new_message, data)
             else:
                 # Handle unknown endpoints
                 self.send_json_response(404, {"status": "error", "message": "Endpoint not found"})
@@ -80,23 +234,521 @@ class ChatRequestHandler(BaseHTTPRequestHandler):
             # Handle invalid JSON
             self.send_json_response(400, {"status": "error", "message": "Invalid JSON"})
 
-    def send_json_response(self, status_code, data):
+    def run_admitted(self, handler, *args):
+        """Run handler within the in-flight cap, or refuse the request with 503"""
+        in_flight = self.server.in_flight
+        if not in_flight.try_acquire():
+            self.send_shed_response(503, "in_flight", "Server busy, retry later", 1)
+            return
+        try:
+            handler(*args)
+        finally:
+            in_flight.release()
+
+    def send_shed_response(self, status_code, reason, message, retry_after):
+        """Refuse a request that would overload the server, saying when to retry"""
+        SHED_REQUESTS.inc(reason)
+        self.send_json_response(status_code, {"status": "error", "message": message},
+                                headers={"Retry-After": str(max(1, math.ceil(retry_after)))})
+
+    def do_HEAD(self):
+        """Handle HEAD requests for pages and static files"""
+        parsed_path = urlparse(self.path)
+        if parsed_path.path == "/":
+            self.serve_asset(TEMPLATE_ASSETS, "index.html", include_body=False)
+        elif parsed_path.path.startswith("/static/"):
+            self.serve_asset(STATIC_ASSETS, parsed_path.path[len("/static/"):], include_body=False)
+        else:
+            self.send_error(404, "Path not found")
+
+    def serve_asset(self, cache, relative_path, include_body=True):
+        """Serve a cached file with ETag revalidation and precompressed variants"""
+        asset = cache.get(relative_path)
+        if asset is None:
+            self.send_error(404, "File not found")
+            return
+
+        cache_control = f"public, max-age={STATIC_MAX_AGE}" if STATIC_MAX_AGE else "no-cache"
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match and (if_none_match.strip() == "*" or
+                              asset.etag in [tag.strip() for tag in if_none_match.split(",")]):
+            self.send_response(304)
+            self.send_header("ETag", asset.etag)
+            self.send_header("Cache-Control", cache_control)
+            if asset.has_variants:
+                self.send_header("Vary", "Accept-Encoding")
+            self.end_headers()
+            return
+
+        body, encoding = asset.negotiate(self.headers.get("Accept-Encoding", ""))
+
+        self.send_response(200)
+        self.send_header("Content-type", asset.content_type)
+        self.send_header("Content-Length", str(len(body) if body is not None else asset.size))
+        self.send_header("ETag", asset.etag)
+        self.send_header("Last-Modified", asset.last_modified)
+        self.send_header("Cache-Control", cache_control)
+        if asset.has_variants:
+            self.send_header("Vary", "Accept-Encoding")
+        if encoding:
+            self.send_header("Content-Encoding", encoding)
+        self.end_headers()
+        if not include_body:
+            return
+
+        if body is not None:
+            self.wfile.write(body)
+        else:
+            # Large file: let the kernel copy it straight to the socket
+            with open(asset.path, "rb") as f:
+                self.connection.sendfile(f, count=asset.size)
+
+    def handle_metrics(self):
+        """Expose all metrics in the Prometheus text format"""
+        # Gauges describe current state, so they are read at scrape time
+        if self.server.sync_worker is not None:
+            SYNC_QUEUE_DEPTH.set(self.server.sync_worker.queue_depth)
+        if self.server.broadcaster is not None:
+            STREAM_SUBSCRIBERS.set(self.server.broadcaster.stats()["subscribers"])
+        if hasattr(self.server, "active_connections"):
+            ACTIVE_CONNECTIONS.set(self.server.active_connections)
+
+        body = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def handle_readyz(self):
+        """Readiness: 200 while this server should get traffic, 503 while draining or without its database"""
+        checks = {"accepting": self.server.ready, "database": self.server.db.ping()}
+        cache = self.server.db.recent_cache
+        body = {"status": "ready" if all(checks.values()) else "unavailable", "checks": checks,
+                "recent_cache": cache.source if cache is not None else None}
+        self.send_json_response(200 if body["status"] == "ready" else 503, body)
+
+    def handle_get_messages(self, query):
+        """Return one page of a room's history, newest first, before an optional cursor"""
+        try:
+            limit = int(query.get("limit", [DEFAULT_PAGE_SIZE])[0])
+            before = query.get("before", [None])[0]
+            before_id = int(before) if before else None
+        except ValueError:
+            self.send_json_response(400, {"status": "error", "message": "limit and before must be integers"})
+            return
+        room_id = self.parse_room(query)
+        if room_id is None:
+            return
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+        try:
+            messages = self.server.db.get_messages(limit=limit, before_id=before_id, room_id=room_id)
+        except UnknownCursorError as e:
+            self.send_json_response(400, {"status": "error", "message": str(e)})
+            return
+        # Clients pass next_before back as ?before= to fetch the next older page
+        next_before = messages[-1]["id"] if len(messages) == limit else None
+        self.send_json_response(200, {"status": "success", "messages": messages, "next_before": next_before})
+
+    def handle_export_messages(self, query):
+        """Stream every message after an optional id cursor, oldest first
+
+        ?format=ndjson (or Accept: application/x-ndjson) gives one message per
+        line; otherwise the body matches /api/messages without next_before.
+        """
+        try:
+            after = query.get("after", [None])[0]
+            after_id = int(after) if after else 0
+        except ValueError:
+            self.send_json_response(400, {"status": "error", "message": "after must be an integer"})
+            return
+        output = query.get("format", [None])[0]
+        if output is None:
+            output = "ndjson" if "application/x-ndjson" in self.headers.get("Accept", "") else "json"
+        if output not in ("json", "ndjson"):
+            self.send_json_response(400, {"status": "error", "message": "format must be json or ndjson"})
+            return
+
+        messages = self.server.db.iter_messages(after_id=after_id)
+        try:
+            if output == "ndjson":
+                self.send_chunked_response(200, "application/x-ndjson", iter_ndjson(messages))
+            else:
+                self.send_chunked_response(200, "application/json",
+                                           iter_json_object({"status": "success"}, "messages", messages))
+        finally:
+            # Ends the read transaction even if the client went away mid-stream
+            messages.close()
+
+    def handle_search(self, query):
+        """Full-text search over message content, best matches first
+
+        Searches one room. Optional filters: sender, since and until
+        (timestamps, until exclusive). order=recent returns newest matches
+        first instead. Clients pass next_cursor back as ?cursor= to fetch the
+        next page.
+        """
+        text = query.get("q", [""])[0].strip()
+        if not text:
+            self.send_json_response(400, {"status": "error", "message": "q is required"})
+            return
+        order = query.get("order", ["rank"])[0]
+        if order not in SEARCH_ORDERS:
+            self.send_json_response(400, {"status": "error", "message": "order must be rank or recent"})
+            return
+        try:
+            limit = int(query.get("limit", [DEFAULT_PAGE_SIZE])[0])
+            after = parse_search_cursor(query.get("cursor", [None])[0], order)
+        except ValueError:
+            self.send_json_response(400, {"status": "error", "message": "limit and cursor are invalid"})
+            return
+        room_id = self.parse_room(query)
+        if room_id is None:
+            return
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        # Stored timestamps look like "2024-01-01 12:00:00"; accept ISO 8601 too
+        since, until = (query.get(name, [None])[0] for name in ("since", "until"))
+        since = since.replace("T", " ") if since else None
+        until = until.replace("T", " ") if until else None
+
+        results = self.server.db.search_messages(text, limit=limit, sender=query.get("sender", [None])[0],
+                                                 since=since, until=until, order=order, after=after,
+                                                 room_id=room_id)
+        next_cursor = None
+        if len(results) == limit:
+            last = results[-1]
+            next_cursor = f"{last['rank']!r}:{last['id']}" if order == "rank" else str(last["id"])
+        for result in results:
+            del result["rank"]
+        self.send_json_response(200, {"status": "success", "messages": results, "next_cursor": next_cursor})
+
+    def send_chunked_response(self, status_code, content_type, pieces):
+        """Send a body of unknown length as it is produced
+
+        HTTP/1.1 clients get chunked transfer encoding and keep their
+        connection; HTTP/1.0 clients get a body ended by closing it.
+        """
+        chunked = self.request_version == "HTTP/1.1" and self.protocol_version == "HTTP/1.1"
+        self.send_response(status_code)
+        self.send_header("Content-type", content_type)
+        if chunked:
+            self.send_header("Transfer-Encoding", "chunked")
+        else:
+            self.close_connection = True
+        self.end_headers()
+
+        try:
+            for chunk in iter_chunks(pieces):
+                if chunked:
+                    chunk = b"%x\r\n%s\r\n" % (len(chunk), chunk)
+                self.wfile.write(chunk)
+            if chunked:
+                self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+        except Exception as e:
+            # Too late for an error status; leave the body unterminated so
+            # the client can tell it is incomplete
+            print(f"Error streaming response: {e}")
+            self.close_connection = True
+
+    def parse_room(self, query):
+        """The ?room= of a request, DEFAULT_ROOM if absent; sends a 400 and returns None if invalid"""
+        try:
+            return parse_room_id(query.get("room", [None])[0])
+        except ValueError:
+            self.send_json_response(400, {"status": "error", "message": ROOM_ID_ERROR})
+            return None
+
+    def handle_stream(self, query):
+        """Stream a room's new messages as Server-Sent Events, resuming after a since cursor"""
+        broadcaster = self.server.broadcaster
+        if broadcaster is None:
+            self.send_json_response(501, {"status": "error", "message": "Streaming requires SERVER_MODE=threaded"})
+            return
+        try:
+            since = query.get("since", [None])[0] or self.headers.get("Last-Event-ID")
+            last_id = int(since) if since else None
+        except ValueError:
+            self.send_json_response(400, {"status": "error", "message": "since must be an integer"})
+            return
+        room_id = self.parse_room(query)
+        if room_id is None:
+            return
+        if not self.server.streams.try_acquire():
+            self.send_shed_response(503, "streams", "Too many open streams, retry later", 1)
+            return
+
+        # Subscribe before replaying so nothing posted in between is missed
+        subscription = broadcaster.subscribe()
+        try:
+            self.send_response(200)
+            self.send_header("Content-type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+            # The stream has no length, so the connection ends with it
+            self.close_connection = True
+
+            # Catch up on everything after the cursor, a page at a time
+            while last_id is not None:
+                missed = self.server.db.get_messages_after(last_id, limit=STREAM_REPLAY_LIMIT, room_id=room_id)
+                for message in missed:
+                    self.write_event(message)
+                    last_id = message["id"]
+                if len(missed) < STREAM_REPLAY_LIMIT:
+                    break
+            # Events published during the replay may repeat what it sent.
+            # Later ones are all new, whatever order concurrent posts arrive in.
+            replayed_to = last_id
+
+            while True:
+                message = subscription.get(timeout=STREAM_HEARTBEAT)
+                if message is None:
+                    # Comment line: keeps proxies from timing out and finds dead clients
+                    self.wfile.write(b": keepalive\n\n")
+                    self.wfile.flush()
+                elif message.get("room_id", DEFAULT_ROOM) != room_id:
+                    continue
+                elif replayed_to is None or message["id"] > replayed_to:
+                    self.write_event(message)
+        except (ConnectionAbortedError, BrokenPipeError, ConnectionResetError, TimeoutError):
+            pass
+        finally:
+            subscription.close()
+            self.server.streams.release()
+
+    def write_event(self, message):
+        """Write one message as an SSE event"""
+        event = f"id: {message['id']}\nevent: message\ndata: {json.dumps(message)}\n\n"
+        self.wfile.write(event.encode("utf-8"))
+        self.wfile.flush()
+
+    def handle_new_message(self, data):
+        """Store a new message locally; the sync worker pushes it to Git later"""
+        content = data.get("content") if isinstance(data, dict) else None
+        sender = data.get("sender") if isinstance(data, dict) else None
+        if not isinstance(content, str) or not content or not isinstance(sender, str) or not sender:
+            self.send_json_response(400, {"status": "error", "message": "content and sender are required"})
+            return
+        try:
+            room_id = parse_room_id(data.get("room_id"))
+        except ValueError:
+            self.send_json_response(400, {"status": "error", "message": ROOM_ID_ERROR})
+            return
+        client_id = data.get("client_id")
+        if client_id is not None and (not isinstance(client_id, str) or not client_id
+                                      or len(client_id) > MAX_CLIENT_ID_LENGTH):
+            self.send_json_response(400, {"status": "error",
+                                          "message": f"client_id must be 1-{MAX_CLIENT_ID_LENGTH} characters"})
+            return
+
+        # A retry of a post already stored is answered before any other work,
+        # backpressure included: it adds nothing to the backlog
+        client_ids = self.server.client_ids
+        if client_id is not None:
+            message_id = client_ids.get(client_id)
+            if message_id is not None:
+                self.send_duplicate_response("memory", message_id)
+                return
+
+        # Per-client and per-sender token buckets; a retry answered above
+        # costs no token
+        for limiter, key, reason in ((self.server.client_limiter, self.client_address[0], "client_rate"),
+                                     (self.server.sender_limiter, sender, "sender_rate")):
+            wait = limiter.check(key)
+            if wait:
+                self.send_shed_response(429, reason, "Too many messages, slow down", wait)
+                return
+
+        # Apply backpressure rather than growing the unsynced backlog forever
+        sync_worker = self.server.sync_worker
+        if sync_worker is not None and sync_worker.is_backlogged():
+            self.send_shed_response(503, "sync_backlog", "Sync backlog full, retry later",
+                                    sync_worker.poll_interval)
+            return
+
+        # Same format as SQLite's CURRENT_TIMESTAMP, so streamed and stored copies match
+        timestamp = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+        try:
+            message_id = self.server.db.add_message(content, sender, timestamp=timestamp, client_id=client_id,
+                                                    room_id=room_id)
+        except DuplicateMessageError as e:
+            client_ids.add(client_id, e.message_id)
+            self.send_duplicate_response("database", e.message_id)
+            return
+        if client_id is not None:
+            client_ids.add(client_id, message_id)
+        if sync_worker is not None:
+            sync_worker.notify()
+        # With a message feed, posts from every process are published from
+        # SQLite in id order instead
+        if self.server.broadcaster is not None and self.server.message_feed is None:
+            self.server.broadcaster.publish(
+                {"id": message_id, "content": content, "sender": sender, "timestamp": timestamp,
+                 "room_id": room_id})
+
+        response_data = {"status": "success", "message": "Message received", "id": message_id}
+        self.send_json_response(200, response_data)
+
+    def send_duplicate_response(self, caught_by, message_id):
+        """Answer a repeated client_id with the message it was first stored as"""
+        DUPLICATE_POSTS.inc(caught_by)
+        self.send_json_response(200, {"status": "success", "message": "Message already received",
+                                      "id": message_id, "duplicate": True})
+
+    def send_json_response(self, status_code, data, headers=None):
         """Helper method to send JSON responses"""
+        body = json.dumps(data).encode("utf-8")
         self.send_response(status_code)
         self.send_header("Content-type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
         self.end_headers()
-        self.wfile.write(json.dumps(data).encode("utf-8"))
+        self.wfile.write(body)
+
+def parse_search_cursor(cursor, order):
+    """(rank, id) from a next_cursor value; raises ValueError if malformed"""
+    if not cursor:
+        return None
+    if order == "rank":
+        rank, message_id = cursor.split(":")
+        return float(rank), int(message_id)
+    return None, int(cursor)
+
+class KeepAliveChatRequestHandler(ChatRequestHandler):
+    """Chat handler speaking HTTP/1.1 with persistent connections"""
+
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out as separate writes; without TCP_NODELAY every
+    # keep-alive response stalls on Nagle plus the client's delayed ACK
+    disable_nagle_algorithm = True
+    # Idle keep-alive connections give their worker back after this long
+    timeout = KEEPALIVE_TIMEOUT
+
+def create_sync_worker(db):
+    """Build the background Git sync worker, or None if sync is unavailable"""
+    if not SYNC_ENABLED:
+        return None
+    # Imported here so the server still starts without Git sync configured
+    from git_manager import GitManager
+    from sync_worker import SyncWorker
+    try:
+        git_manager = GitManager(REPO_URL, base_path=REPO_PATH)
+    except ValueError as e:
+        print(f"Git sync disabled: {e}")
+        return None
+    return SyncWorker(db, git_manager, batch_size=SYNC_BATCH_SIZE,
+                      poll_interval=SYNC_POLL_INTERVAL, max_backlog=SYNC_MAX_BACKLOG)
+
+def create_server(host=HOST, port=PORT, db=None, sync_worker=None, mode=None,
+                  reuse_port=False, recent_cache_size=None, recent_snapshot=None):
+    """Create the HTTP server with its shared application state
+
+    reuse_port lets several processes listen on the same address, with the
+    kernel spreading connections across them (prefork mode). recent_snapshot
+    is a file saved by DatabaseManager.save_recent_snapshot to restore the
+    recent-message cache from instead of warming it.
+    """
+    mode = mode or SERVER_MODE
+    if mode == "threaded":
+        httpd = BoundedThreadingHTTPServer((host, port), KeepAliveChatRequestHandler,
+                                           max_workers=MAX_WORKERS, max_connections=MAX_CONNECTIONS,
+                                           bind_and_activate=False)
+        httpd.broadcaster = MessageBroadcaster(max_buffer=STREAM_BUFFER_SIZE)
+    elif mode == "single":
+        httpd = HTTPServer((host, port), ChatRequestHandler, bind_and_activate=False)
+        # A stream would hold the only request thread forever
+        httpd.broadcaster = None
+    else:
+        raise ValueError(f"Unknown server mode: {mode}")
+    try:
+        if reuse_port:
+            httpd.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        httpd.server_bind()
+        httpd.server_activate()
+    except OSError:
+        httpd.server_close()
+        raise
+
+    httpd.db = db or DatabaseManager()
+    httpd.sync_worker = sync_worker
+    httpd.client_ids = RecentClientIds(CLIENT_ID_CACHE_SIZE)
+    httpd.client_limiter = RateLimiter(CLIENT_RATE_LIMIT, CLIENT_RATE_BURST)
+    httpd.sender_limiter = RateLimiter(SENDER_RATE_LIMIT, SENDER_RATE_BURST)
+    httpd.in_flight = InFlightLimiter(MAX_IN_FLIGHT)
+    # Never 0, which would disable the cap
+    httpd.streams = InFlightLimiter(max(1, min(MAX_STREAMS, MAX_WORKERS - 1)))
+    # Set when posts reach the broadcaster from SQLite rather than the handler
+    httpd.message_feed = None
+    # Latest history pages are then answered from memory, written through on post
+    recent_cache_size = RECENT_CACHE_SIZE if recent_cache_size is None else recent_cache_size
+    if recent_cache_size > 0 and httpd.db.recent_cache is None:
+        httpd.db.attach_recent_cache(RecentMessageCache(recent_cache_size, RECENT_CACHE_ROOMS),
+                                     snapshot_path=recent_snapshot)
+    # Cleared on shutdown so /readyz sends traffic elsewhere while requests drain
+    httpd.ready = True
+    return httpd
 
 def run_server():
     """Initialize and run the HTTP server"""
-    server_address = (HOST, PORT)
-    httpd = HTTPServer(server_address, ChatRequestHandler)
-    print(f"Server running at http://{HOST}:{PORT}")
+    db = DatabaseManager()
+    initializer = DatabaseInitializer(db.db_path)
+    if db.db_path.exists():
+        initializer.migrate_database()
+    else:
+        initializer.init_database()
+
+    if SERVER_MODE == "prefork":
+        # Worker processes open their own connections
+        db.close()
+        from prefork import PreforkServer
+        server = PreforkServer(HOST, PORT, workers=PREFORK_WORKERS, sync_enabled=SYNC_ENABLED,
+                               db_path=db.db_path)
+        print(f"Server running at http://{HOST}:{server.port} "
+              f"(prefork mode, {server.workers} workers, pid {os.getpid()})")
+        server.serve_forever()
+        return
+
+    sync_worker = create_sync_worker(db)
+    if sync_worker is not None:
+        sync_worker.start()
+
+    httpd = create_server(HOST, PORT, db=db, sync_worker=sync_worker, recent_snapshot=RECENT_SNAPSHOT or None)
+    cache = db.recent_cache
+    print(f"Server running at http://{HOST}:{PORT} ({SERVER_MODE} mode"
+          + (f", recent cache from {cache.source})" if cache is not None else ")"))
+
+    def stop(signum, frame):
+        # /readyz fails from here on, while the accept loop winds down
+        httpd.ready = False
+        threading.Thread(target=httpd.shutdown).start()
+
+    # A supervisor stopping the server gets the same clean shutdown as Ctrl+C
+    signal.signal(signal.SIGTERM, stop)
     try:
         httpd.serve_forever()
     except KeyboardInterrupt:
-        print("\nShutting down server...")
-        httpd.server_close()
+        httpd.ready = False
+    print("\nShutting down server...")
+    if httpd.broadcaster is not None:
+        httpd.broadcaster.close()
+    # Stop accepting, then let open requests finish before their database
+    # and sync worker go away
+    httpd.socket.close()
+    if isinstance(httpd, BoundedThreadingHTTPServer) and not httpd.drain(SHUTDOWN_GRACE):
+        print(f"{httpd.active_connections} connections still open after {SHUTDOWN_GRACE}s, closing anyway")
+    httpd.server_close()
+    if sync_worker is not None:
+        sync_worker.stop()
+    # Saved last, once nothing else will write, so the next start can use it
+    if RECENT_SNAPSHOT:
+        try:
+            db.save_recent_snapshot(RECENT_SNAPSHOT)
+        except OSError as e:
+            print(f"Could not save the recent-message snapshot: {e}")
+    db.close()
 
 if __name__ == "__main__":
     run_server()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+import gzip
+import hashlib
+import mimetypes
+import threading
+from email.utils import formatdate
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+try:
+    import brotli  # Optional: adds "br" variants when installed
+except ImportError:
+    brotli = None
+
+# Files above this size are not held in memory; they are streamed with sendfile
+MAX_CACHED_SIZE = 1024 * 1024
+# Below this, compression costs more than it saves
+MIN_COMPRESS_SIZE = 256
+
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+
+
+class Asset:
+    """A static file with its precomputed response variants"""
+
+    __slots__ = ('path', 'content_type', 'mtime_ns', 'size', 'etag', 'last_modified',
+                 'body', 'gzip_body', 'brotli_body')
+
+    def __init__(self, path: Path, content_type: str, mtime_ns: int, size: int, etag: str,
+                 body: Optional[bytes], gzip_body: Optional[bytes], brotli_body: Optional[bytes]):
+        self.path = path
+        self.content_type = content_type
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.etag = etag
+        self.last_modified = formatdate(mtime_ns / 1e9, usegmt=True)
+        self.body = body  # None for large files served with sendfile
+        self.gzip_body = gzip_body
+        self.brotli_body = brotli_body
+
+    @property
+    def has_variants(self) -> bool:
+        """Whether responses depend on Accept-Encoding"""
+        return self.gzip_body is not None or self.brotli_body is not None
+
+    def negotiate(self, accept_encoding: str) -> Tuple[Optional[bytes], Optional[str]]:
+        """Body and Content-Encoding for an Accept-Encoding header; brotli wins ties"""
+        accepted = parse_accept_encoding(accept_encoding)
+        best, best_q = (self.body, None), 0.0
+        for body, encoding in ((self.brotli_body, 'br'), (self.gzip_body, 'gzip')):
+            q = accepted.get(encoding, accepted.get('*', 0.0))
+            if body is not None and q > best_q:
+                best, best_q = (body, encoding), q
+        return best
+
+
+class StaticAssetCache:
+    """Loads files under root once and reloads them when their mtime changes"""
+
+    def __init__(self, root: Path, max_cached_size: int = MAX_CACHED_SIZE):
+        self.root = Path(root).resolve()
+        self.max_cached_size = max_cached_size
+        self._assets: Dict[Path, Asset] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.loads = 0
+
+    def get(self, relative_path: str) -> Optional[Asset]:
+        """Return the asset for a path below root, or None if there is no such file"""
+        path = (self.root / relative_path.lstrip('/')).resolve()
+        # Refuse anything that escapes the root, e.g. /static/../app.py
+        if not path.is_relative_to(self.root):
+            return None
+        try:
+            stat = path.stat()
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        if not path.is_file():
+            return None
+
+        with self._lock:
+            asset = self._assets.get(path)
+            if asset is not None and asset.mtime_ns == stat.st_mtime_ns and asset.size == stat.st_size:
+                self.hits += 1
+                return asset
+
+        asset = self._load(path, stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            self._assets[path] = asset
+            self.loads += 1
+        return asset
+
+    def _load(self, path: Path, mtime_ns: int, size: int) -> Asset:
+        content_type = guess_content_type(path)
+        if size > self.max_cached_size:
+            # Hash in chunks; the body itself stays on disk
+            digest = hashlib.sha256()
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    digest.update(chunk)
+            return Asset(path, content_type, mtime_ns, size, _etag(digest), None, None, None)
+
+        with open(path, 'rb') as f:
+            body = f.read()
+        gzip_body = brotli_body = None
+        if len(body) >= MIN_COMPRESS_SIZE and content_type.startswith(COMPRESSIBLE_TYPES):
+            gzip_body = _smaller(gzip.compress(body, compresslevel=9, mtime=0), body)
+            if brotli is not None:
+                brotli_body = _smaller(brotli.compress(body), body)
+        # The file may have changed since stat(); describe what was actually read
+        return Asset(path, content_type, mtime_ns, len(body), _etag(hashlib.sha256(body)),
+                     body, gzip_body, brotli_body)
+
+
+def parse_accept_encoding(header: str) -> Dict[str, float]:
+    """Content codings mapped to their q-values; q=0 means refused"""
+    accepted = {}
+    for item in header.split(','):
+        coding, *params = [part.strip() for part in item.split(';')]
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding.lower()] = q
+    return accepted
+
+
+def guess_content_type(path: Path) -> str:
+    content_type = mimetypes.guess_type(path.name)[0] or 'application/octet-stream'
+    if content_type.startswith('text/') or content_type == 'application/javascript':
+        content_type += '; charset=utf-8'
+    return content_type
+
+
+def _etag(digest) -> str:
+    return f'"{digest.hexdigest()[:32]}"'
+
+
+def _smaller(compressed: bytes, body: bytes) -> Optional[bytes]:
+    return compressed if len(compressed) < len(body) else None
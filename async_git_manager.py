@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+import asyncio
+import contextlib
+import os
+import shutil
+import signal
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+from git_manager import GIT_COMMAND_FAILURES, GIT_COMMAND_SECONDS, GitManager, commit_message
+from history_index import TimeBound
+from metrics import REGISTRY, timed
+from rooms import DEFAULT_ROOM
+
+# Git subprocesses one manager runs at once
+GIT_MAX_CONCURRENCY = int(os.getenv('GIT_MAX_CONCURRENCY', '4'))
+# Seconds a network git command (clone, push) may take before it is killed
+GIT_NETWORK_TIMEOUT = float(os.getenv('GIT_NETWORK_TIMEOUT', '120'))
+# Seconds for commands that only touch the local repository
+GIT_LOCAL_TIMEOUT = float(os.getenv('GIT_LOCAL_TIMEOUT', '30'))
+
+GIT_COMMAND_TIMEOUTS = REGISTRY.counter(
+    'chat_git_command_timeouts_total', 'Git subprocesses killed for running past their timeout', ['command'])
+
+# Lock files a killed git process can leave behind, relative to .git
+_LOCK_FILES = ('index.lock', 'HEAD.lock')
+
+
+class GitTimeoutError(Exception):
+    """Raised when a git command runs past its timeout and is killed"""
+
+
+class AsyncGitManager:
+    """Awaitable front end to a GitManager for event-loop request handlers
+
+    Git runs through asyncio subprocesses, so a push waiting on the network
+    holds no thread. At most max_concurrency git processes run at once, and
+    add/commit/push sequences are serialized, since they share one index.
+
+    Every command has a timeout. When one expires, or the awaiting task is
+    cancelled, the git process is killed and the half-made commit undone:
+    lock files that appeared while it ran are removed and its paths
+    unstaged. The sequence holds the wrapped GitManager's write_lock, so no
+    other writer in the process can own those locks. A commit that
+    completed stays, and the next push_messages call pushes it. This is the
+    same retry path GitManager takes after a failed push.
+
+    Commits always go through the git CLI and are pushed straight away: the
+    wrapped manager's commit_mode and push_interval only apply to its own
+    push_messages. As with GitManager, the caller settles the segment logs
+    once it has recorded the commit.
+
+    File writes and history queries run on one helper thread: they are
+    local and short, but the history index holds a SQLite connection that
+    must stay on one thread.
+    """
+
+    def __init__(self, git_manager: GitManager, max_concurrency: int = GIT_MAX_CONCURRENCY,
+                 network_timeout: float = GIT_NETWORK_TIMEOUT, local_timeout: float = GIT_LOCAL_TIMEOUT):
+        self.git_manager = git_manager
+        self.base_path = git_manager.base_path
+        self.branch = git_manager.branch
+        self.network_timeout = network_timeout
+        self.local_timeout = local_timeout
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._write_lock = asyncio.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='async-git')
+        # Lock files left by git processes this manager killed
+        self._orphaned_locks: Set[Path] = set()
+
+    async def clone_repository(self) -> bool:
+        """Clone the repository if it doesn't exist"""
+        git_dir = self.base_path / '.git'
+        if git_dir.exists():
+            print("Repository already exists locally")
+            return True
+
+        clone_url = (f"https://{self.git_manager.github_token}@github.com/"
+                     f"{self.git_manager.repo_url.split('github.com/')[1]}")
+        try:
+            await self._run_git(['clone', clone_url, '.'], "Error cloning repository", self.network_timeout)
+            return True
+        except asyncio.CancelledError:
+            # A partial clone would pass the exists() check above next time
+            shutil.rmtree(git_dir, ignore_errors=True)
+            raise
+        except Exception as e:
+            shutil.rmtree(git_dir, ignore_errors=True)
+            print(f"Error in clone_repository: {e}")
+            return False
+
+    async def create_message_file(self, content: str, sender: str,
+                                  timestamp: Optional[datetime] = None,
+                                  message_id: Optional[int] = None,
+                                  room_id: str = DEFAULT_ROOM) -> Optional[str]:
+        """Create a new file containing the message, in its room's directory"""
+        return await self._in_thread(self.git_manager.create_message_file, content, sender,
+                                     timestamp, message_id, room_id)
+
+    async def push_message(self, filepath: str) -> Optional[str]:
+        """Push a message file and return the commit hash"""
+        return await self.push_messages([filepath])
+
+    async def push_messages(self, filepaths: List[str]) -> Optional[str]:
+        """Push several message files as a single commit and return the commit hash"""
+        if not filepaths:
+            print("Error in push_message: No message files to push")
+            return None
+        unique_paths = list(dict.fromkeys(filepaths))
+        async with self._write_lock, self._repo_lock():
+            try:
+                await self._run_git(['add', '--'] + unique_paths, "Git add failed", self.local_timeout)
+                # An earlier attempt may have committed these and failed only to push
+                staged = await self._run_git(['diff', '--cached', '--name-only', '--'] + unique_paths,
+                                             "Git diff failed", self.local_timeout)
+                if staged.strip():
+                    await self._run_git(['commit', '-m', commit_message(filepaths)], "Git commit failed",
+                                        self.local_timeout)
+                await self._run_git(['push', 'origin', self.branch], "Git push failed", self.network_timeout)
+                return (await self._run_git(['rev-parse', 'HEAD'], "Failed to get commit hash",
+                                            self.local_timeout)).strip()
+            except asyncio.CancelledError:
+                # Shielded so that a second cancel cannot interrupt the cleanup
+                await asyncio.shield(self._abandon_commit(unique_paths))
+                raise
+            except Exception as e:
+                await self._abandon_commit(unique_paths)
+                print(f"Error in push_message: {e}")
+                return None
+
+    async def get_message_history(self, limit: Optional[int] = None, offset: int = 0,
+                                  since: TimeBound = None, until: TimeBound = None,
+                                  room_id: str = DEFAULT_ROOM) -> List[Dict]:
+        """Get the history of one room's messages from the repository"""
+        return await self._in_thread(self.git_manager.get_message_history, limit, offset, since, until,
+                                     room_id)
+
+    async def close(self) -> None:
+        """Release the wrapped GitManager and the helper thread"""
+        async with self._write_lock:
+            await self._in_thread(self.git_manager.close)
+        self._executor.shutdown(wait=True)
+
+    async def _in_thread(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    @contextlib.asynccontextmanager
+    async def _repo_lock(self):
+        """Hold the wrapped manager's write_lock, waiting for it off the event loop"""
+        lock = self.git_manager.write_lock
+        acquired = asyncio.get_running_loop().run_in_executor(None, lock.acquire)
+        try:
+            await asyncio.shield(acquired)
+        except asyncio.CancelledError:
+            # The acquire still completes; give the lock straight back
+            acquired.add_done_callback(lambda _: lock.release())
+            raise
+        try:
+            yield
+        finally:
+            lock.release()
+
+    def _git_locks(self) -> Set[Path]:
+        """Lock files a git process can leave behind that exist right now"""
+        git_dir = self.base_path / '.git'
+        candidates = [git_dir / name for name in _LOCK_FILES] + [git_dir / 'refs' / 'heads' / f"{self.branch}.lock"]
+        return {lock for lock in candidates if lock.exists()}
+
+    async def _run_git(self, args: List[str], error_label: str, timeout: float) -> str:
+        """Run a git command and return its stdout, killing it on timeout or cancellation"""
+        async with self._slots:
+            locks_before = self._git_locks()
+            with timed(GIT_COMMAND_SECONDS, args[0]):
+                process = await asyncio.create_subprocess_exec(
+                    'git', *args,
+                    cwd=str(self.base_path),
+                    stdin=asyncio.subprocess.DEVNULL,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE,
+                    # Its own process group, so a kill reaches hooks and remote helpers too
+                    start_new_session=True
+                )
+                try:
+                    stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+                except asyncio.TimeoutError:
+                    GIT_COMMAND_TIMEOUTS.inc(args[0])
+                    await self._kill(process)
+                    self._orphaned_locks |= self._git_locks() - locks_before
+                    raise GitTimeoutError(f"git {args[0]} timed out after {timeout}s")
+                except asyncio.CancelledError:
+                    await asyncio.shield(self._kill(process))
+                    self._orphaned_locks |= self._git_locks() - locks_before
+                    raise
+        if process.returncode != 0:
+            GIT_COMMAND_FAILURES.inc(args[0])
+            raise Exception(f"{error_label}: {stderr.decode('utf-8', errors='replace')}")
+        return stdout.decode('utf-8')
+
+    @staticmethod
+    async def _kill(process: asyncio.subprocess.Process) -> None:
+        if process.returncode is None:
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        # Reap it, so no zombie is left and its lock files are final
+        await process.wait()
+
+    async def _abandon_commit(self, paths: List[str]) -> None:
+        """Undo what a failed or cancelled add/commit left in the index"""
+        # Only locks a killed process created; any other belongs to a writer
+        # that is still running
+        locks, self._orphaned_locks = self._orphaned_locks, set()
+        for lock in locks:
+            try:
+                lock.unlink()
+            except FileNotFoundError:
+                pass
+        try:
+            await self._run_git(['reset', '-q', '--'] + paths, "Git reset failed", self.local_timeout)
+        except Exception as e:
+            print(f"Error unstaging abandoned commit: {e}")
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List, Optional, Tuple
+
+from git_manager import GitManager
+
+# Called with (filepath, commit_hash) once the batch holding the file is pushed.
+# commit_hash is None when the batch failed, mirroring GitManager.push_message.
+BatchCallback = Callable[[str, Optional[str]], None]
+
+
+class BatchSyncEngine:
+    """Group-commit engine that pushes pending message files as one commit"""
+
+    def __init__(self, git_manager: GitManager, max_batch_size: int = 100,
+                 max_batch_delay: float = 0.5):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self.git_manager = git_manager
+        self.max_batch_size = max_batch_size
+        self.max_batch_delay = max_batch_delay
+
+        self._pending: List[Tuple[str, Future, Optional[BatchCallback]]] = []
+        self._oldest_pending: Optional[float] = None
+        self._flush_requested = False
+        self._running = False
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+        # Counters for monitoring and benchmarks
+        self.batches_committed = 0
+        self.batches_failed = 0
+        self.messages_committed = 0
+
+    def start(self) -> None:
+        """Start the background flush thread"""
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name="batch-sync", daemon=True)
+        self._thread.start()
+
+    def stop(self, flush: bool = True) -> None:
+        """Stop the flush thread, committing pending files unless flush is False"""
+        with self._cond:
+            self._running = False
+            if not flush:
+                for _, future, _ in self._pending:
+                    future.cancel()
+                self._pending = []
+                self._oldest_pending = None
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def submit(self, filepath: str, callback: Optional[BatchCallback] = None) -> Future:
+        """Queue a message file; the future resolves to the commit hash"""
+        future: Future = Future()
+        with self._cond:
+            if not self._running:
+                raise RuntimeError("BatchSyncEngine is not running")
+            if not self._pending:
+                self._oldest_pending = time.monotonic()
+            self._pending.append((filepath, future, callback))
+            # Wake the flusher to start the batch timer or to commit a full batch
+            if len(self._pending) == 1 or len(self._pending) >= self.max_batch_size:
+                self._cond.notify_all()
+        return future
+
+    def flush(self) -> None:
+        """Commit whatever is pending without waiting for the size or time limit"""
+        with self._cond:
+            # With nothing pending there is nothing to flush; a stale request
+            # would commit the next single submit at once
+            if self._pending:
+                self._flush_requested = True
+                self._cond.notify_all()
+
+    @property
+    def pending_count(self) -> int:
+        with self._cond:
+            return len(self._pending)
+
+    def _batch_ready(self) -> bool:
+        """Check the size and time limits (caller holds the lock)"""
+        if not self._pending:
+            return False
+        if self._flush_requested or len(self._pending) >= self.max_batch_size:
+            return True
+        return time.monotonic() - self._oldest_pending >= self.max_batch_delay
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while self._running and not self._batch_ready():
+                    timeout = None
+                    if self._pending:
+                        timeout = max(0.0, self._oldest_pending + self.max_batch_delay - time.monotonic())
+                    self._cond.wait(timeout)
+
+                if not self._pending:
+                    # Only reachable once stopped with nothing left to commit
+                    return
+
+                batch = self._pending[:self.max_batch_size]
+                self._pending = self._pending[self.max_batch_size:]
+                if not self._pending:
+                    self._oldest_pending = None
+                    self._flush_requested = False
+
+            self._commit_batch(batch)
+
+    def _commit_batch(self, batch: List[Tuple[str, Future, Optional[BatchCallback]]]) -> None:
+        """Push one batch and resolve every future in it"""
+        commit_hash = self.git_manager.push_messages([filepath for filepath, _, _ in batch])
+        if commit_hash:
+            self.batches_committed += 1
+            self.messages_committed += len(batch)
+        else:
+            self.batches_failed += 1
+
+        recorded = commit_hash is not None
+        for filepath, future, callback in batch:
+            future.set_result(commit_hash)
+            if callback:
+                try:
+                    callback(filepath, commit_hash)
+                except Exception as e:
+                    recorded = False
+                    print(f"Error in batch sync callback for {filepath}: {e}")
+        # A callback that failed to record the commit may see the message again
+        if recorded:
+            self.git_manager.settle_segments()
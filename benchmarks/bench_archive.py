@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""Storage size and read cost of message files, segments and archive blocks"""
+import argparse
+import json
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List
+
+from benchmarks.common import Timer, rate, report
+from git_manager import GitManager
+from history_archive import archive_history, read_archive
+from message_codec import available_compressions, decode_block, encode_block
+
+
+def synthetic_messages(count: int) -> List[Dict]:
+    """Short chat lines from a handful of senders, one minute apart, ids ascending"""
+    start = datetime(2024, 1, 1)
+    return [{'content': f"message {i} ok", 'sender': f"user{i % 20}",
+             'timestamp': (start + timedelta(minutes=i, microseconds=i * 7919 % 1000000)).isoformat(),
+             'id': i + 1}
+            for i in range(count)]
+
+
+def dir_bytes(path: Path) -> int:
+    return sum(p.stat().st_size for p in path.rglob('*') if p.is_file())
+
+
+def run(messages: int = 100_000) -> Dict:
+    data = synthetic_messages(messages)
+    content_bytes = sum(len(m['content'].encode('utf-8')) for m in data)
+    results: Dict = {'messages': messages, 'content_bytes': content_bytes, 'bytes': {}, 'decode': {}}
+
+    # Encoding alone, for every compression available here
+    json_lines = ''.join(json.dumps(m, separators=(',', ':')) + '\n' for m in data).encode('utf-8')
+    results['bytes']['json_lines'] = len(json_lines)
+    with Timer() as t:
+        for line in json_lines.splitlines():
+            json.loads(line)
+    results['decode']['json_lines_per_sec'] = rate(messages, t.elapsed)
+    for compression in available_compressions():
+        block = encode_block(data, compression)
+        results['bytes'][f"block_{compression}"] = len(block)
+        with Timer() as t:
+            decode_block(block)
+        results['decode'][f"block_{compression}_per_sec"] = rate(messages, t.elapsed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        manager = GitManager('local', base_path=Path(tmp))
+        for message in data:
+            manager.create_message_file(message['content'], message['sender'],
+                                        timestamp=datetime.fromisoformat(message['timestamp']),
+                                        message_id=message['id'])
+        results['bytes']['message_files'] = dir_bytes(manager.messages_dir)
+        with Timer() as t:
+            history = manager.get_message_history()
+        results['cold_history_from_files_seconds'] = round(t.elapsed, 3)
+
+        with Timer() as t:
+            archived = archive_history(manager.messages_dir, timedelta(0), now=datetime(2100, 1, 1))
+        results['archive_seconds'] = round(t.elapsed, 3)
+        results['bytes']['archive_blocks'] = archived['bytes_after']
+        results['archive_blocks'] = archived['archives']
+
+        # A fresh index has to decode every block
+        manager.close()
+        manager.history_index_path.unlink()
+        for suffix in ('-wal', '-shm'):
+            Path(str(manager.history_index_path) + suffix).unlink(missing_ok=True)
+        with Timer() as t:
+            assert manager.get_message_history() == history
+        results['cold_history_from_archive_seconds'] = round(t.elapsed, 3)
+
+        block = next((manager.messages_dir / 'archive').iterdir())
+        with Timer() as t:
+            read_archive(block)
+        results['read_one_block_ms'] = round(t.elapsed * 1000, 3)
+        manager.close()
+
+    results['bytes_per_message'] = {name: round(size / messages, 2) for name, size in results['bytes'].items()}
+    results['archive_savings'] = round(1 - results['bytes']['archive_blocks'] / results['bytes']['message_files'], 4)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--messages', type=int, default=100_000)
+    args = parser.parse_args()
+    report(run(args.messages))
+
+
+if __name__ == '__main__':
+    main()
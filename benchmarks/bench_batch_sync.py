@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""Compare per-message pushes with group-commit batching against a local bare repo"""
+import argparse
+import tempfile
+from pathlib import Path
+from typing import Dict
+
+from benchmarks.common import Timer, make_local_remote, rate, report
+from batch_sync import BatchSyncEngine
+from git_manager import GitManager
+
+
+def run(messages: int = 200, batch_size: int = 50, batch_delay: float = 0.05) -> Dict:
+    """Push the same number of messages through both paths"""
+    results = {'messages': messages, 'batch_size': batch_size}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        work = make_local_remote(Path(tmp))
+        manager = GitManager('local', base_path=work)
+
+        # Per-message path: add, commit, push, rev-parse for every file
+        with Timer() as t:
+            for i in range(messages):
+                filepath = manager.create_message_file(f"per-message {i}", "bench")
+                if not manager.push_message(filepath):
+                    raise RuntimeError("per-message push failed")
+        results['per_message_seconds'] = round(t.elapsed, 3)
+        results['per_message_msgs_per_sec'] = rate(messages, t.elapsed)
+
+        # Batched path: the same work folded into one commit per batch
+        engine = BatchSyncEngine(manager, max_batch_size=batch_size, max_batch_delay=batch_delay)
+        engine.start()
+        with Timer() as t:
+            futures = [
+                engine.submit(manager.create_message_file(f"batched {i}", "bench"))
+                for i in range(messages)
+            ]
+            engine.flush()
+            if not all(future.result() for future in futures):
+                raise RuntimeError("batched push failed")
+        engine.stop()
+        results['batched_seconds'] = round(t.elapsed, 3)
+        results['batched_msgs_per_sec'] = rate(messages, t.elapsed)
+        results['batched_commits'] = engine.batches_committed
+
+    results['speedup'] = round(results['batched_msgs_per_sec'] / results['per_message_msgs_per_sec'], 2)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--messages', type=int, default=200)
+    parser.add_argument('--batch-size', type=int, default=50)
+    parser.add_argument('--batch-delay', type=float, default=0.05)
+    args = parser.parse_args()
+    report(run(args.messages, args.batch_size, args.batch_delay))
+
+
+if __name__ == '__main__':
+    main()
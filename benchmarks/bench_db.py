@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""Compare connection-per-call SQLite access with the pooled WAL connections"""
+import argparse
+import tempfile
+from pathlib import Path
+from typing import Dict
+
+from benchmarks.common import Timer, init_database, rate, report
+from database.db_utils import DatabaseManager
+
+
+def _measure(db: DatabaseManager, inserts: int, reads: int, batch_size: int) -> Dict:
+    results = {}
+    with Timer() as t:
+        for i in range(inserts):
+            db.add_message(f"message {i}", "bench")
+    results['inserts_per_sec'] = rate(inserts, t.elapsed)
+
+    with Timer() as t:
+        for start in range(0, inserts, batch_size):
+            count = min(batch_size, inserts - start)
+            db.add_messages((f"batched {start + i}", "bench") for i in range(count))
+    results['batched_inserts_per_sec'] = rate(inserts, t.elapsed)
+
+    with Timer() as t:
+        for _ in range(reads):
+            db.get_messages(limit=50)
+    results['reads_per_sec'] = rate(reads, t.elapsed)
+    return results
+
+
+def run(inserts: int = 2000, reads: int = 2000, batch_size: int = 500) -> Dict:
+    """Run the same workload against both connection strategies"""
+    results = {'inserts': inserts, 'reads': reads, 'batch_size': batch_size}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, pooled in (('per_call', False), ('pooled', True)):
+            db_path = Path(tmp) / f"{name}.sqlite"
+            init_database(db_path)
+            db = DatabaseManager(db_path, pooled=pooled)
+            results[name] = _measure(db, inserts, reads, batch_size)
+            db.close()
+
+    results['insert_speedup'] = round(
+        results['pooled']['inserts_per_sec'] / results['per_call']['inserts_per_sec'], 2)
+    results['read_speedup'] = round(
+        results['pooled']['reads_per_sec'] / results['per_call']['reads_per_sec'], 2)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--inserts', type=int, default=2000)
+    parser.add_argument('--reads', type=int, default=2000)
+    parser.add_argument('--batch-size', type=int, default=500)
+    args = parser.parse_args()
+    report(run(args.inserts, args.reads, args.batch_size))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""Peak memory and time-to-first-byte of buffered versus streamed history exports"""
+import argparse
+import json
+import socket
+import tempfile
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Dict
+
+from benchmarks.bench_history_pages import populate
+from benchmarks.common import Timer, init_database, report
+from database.db_utils import DatabaseManager
+from json_stream import iter_chunks, iter_json_object
+
+
+def _peak_mb(func) -> float:
+    tracemalloc.start()
+    try:
+        func()
+        return round(tracemalloc.get_traced_memory()[1] / 1024 / 1024, 2)
+    finally:
+        tracemalloc.stop()
+
+
+def _buffered(db: DatabaseManager) -> bytes:
+    """What send_json_response does: the whole list, then one json.dumps"""
+    with db.get_db() as conn:
+        rows = [dict(row) for row in conn.execute(
+            "SELECT id, content, timestamp, git_hash, sender, is_synced FROM messages ORDER BY id")]
+    return json.dumps({"status": "success", "messages": rows}).encode("utf-8")
+
+
+def _streamed(db: DatabaseManager) -> int:
+    size = 0
+    for chunk in iter_chunks(iter_json_object({"status": "success"}, "messages", db.iter_messages())):
+        size += len(chunk)
+    return size
+
+
+def _http_timings(db: DatabaseManager) -> Dict:
+    """Time to first body byte and to the end of GET /api/messages/export"""
+    import app
+    httpd = app.create_server("127.0.0.1", 0, db=db, mode="threaded")
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    try:
+        sock = socket.create_connection(httpd.server_address)
+        start = time.perf_counter()
+        sock.sendall(b"GET /api/messages/export HTTP/1.1\r\nHost: bench\r\nConnection: close\r\n\r\n")
+        received = b""
+        first_byte = None
+        while True:
+            data = sock.recv(65536)
+            if not data:
+                break
+            received += data if first_byte is None else b""
+            if first_byte is None and b"\r\n\r\n" in received and received.split(b"\r\n\r\n", 1)[1]:
+                first_byte = time.perf_counter() - start
+        total = time.perf_counter() - start
+        sock.close()
+    finally:
+        httpd.broadcaster.close()
+        httpd.shutdown()
+        httpd.server_close()
+    return {'ttfb_ms': round(first_byte * 1000, 2), 'total_ms': round(total * 1000, 2)}
+
+
+def run(rows: int = 200_000) -> Dict:
+    results = {'rows': rows}
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "db.sqlite"
+        init_database(db_path)
+        populate(db_path, rows)
+        db = DatabaseManager(db_path)
+
+        with Timer() as t:
+            size = len(_buffered(db))
+        results['body_mb'] = round(size / 1024 / 1024, 2)
+        results['buffered_seconds'] = round(t.elapsed, 3)
+        results['buffered_peak_mb'] = _peak_mb(lambda: _buffered(db))
+
+        with Timer() as t:
+            _streamed(db)
+        results['streamed_seconds'] = round(t.elapsed, 3)
+        results['streamed_peak_mb'] = _peak_mb(lambda: _streamed(db))
+
+        results['http_streamed'] = _http_timings(db)
+        db.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=200_000)
+    args = parser.parse_args()
+    report(run(args.rows))
+
+
+if __name__ == '__main__':
+    main()
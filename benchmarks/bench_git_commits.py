@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""Compare commits per second of the git CLI path and the in-process object writer"""
+import argparse
+import tempfile
+from pathlib import Path
+from typing import Dict
+
+from benchmarks.common import Timer, make_local_remote, rate, report
+from git_manager import GitManager
+
+
+def run_mode(root: Path, mode: str, commits: int, batch_size: int, push_interval: float) -> Dict:
+    """Make the given number of commits through one GitManager commit mode"""
+    root.mkdir()
+    work = make_local_remote(root)
+    manager = GitManager('local', base_path=work, commit_mode=mode, push_interval=push_interval)
+    try:
+        with Timer() as t:
+            for i in range(commits):
+                filepaths = [manager.create_message_file(f"{mode} {i}.{j}", "bench") for j in range(batch_size)]
+                if not manager.push_messages(filepaths):
+                    raise RuntimeError(f"{mode} commit failed")
+            if not manager.push_pending(force=True):
+                raise RuntimeError(f"{mode} final push failed")
+    finally:
+        manager.close()
+    return {'seconds': round(t.elapsed, 3), 'commits_per_sec': rate(commits, t.elapsed)}
+
+
+def run(commits: int = 200, batch_size: int = 1, push_interval: float = 5.0) -> Dict:
+    """Commit through the CLI path (add, commit, push, rev-parse) and the fast path"""
+    results = {'commits': commits, 'batch_size': batch_size, 'push_interval': push_interval}
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        results['cli'] = run_mode(root / 'cli', 'cli', commits, batch_size, 0)
+        # Same push-per-commit durability as the CLI path, minus add/commit forks
+        fast_push = run_mode(root / 'fast_push', 'fast', commits, batch_size, 0)
+        results['fast_push_every_commit'] = fast_push
+        results['fast'] = run_mode(root / 'fast', 'fast', commits, batch_size, push_interval)
+
+    cli_rate = results['cli']['commits_per_sec']
+    results['speedup_push_every_commit'] = round(fast_push['commits_per_sec'] / cli_rate, 2)
+    results['speedup'] = round(results['fast']['commits_per_sec'] / cli_rate, 2)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--commits', type=int, default=200)
+    parser.add_argument('--batch-size', type=int, default=1, help="message files per commit")
+    parser.add_argument('--push-interval', type=float, default=5.0,
+                        help="seconds between pushes on the fast path")
+    args = parser.parse_args()
+    report(run(args.commits, args.batch_size, args.push_interval))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""Cold and warm get_message_history loads over many message files"""
+import argparse
+import json
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List
+
+from benchmarks.common import Timer, report
+from git_manager import GitManager
+
+
+def write_message_files(messages_dir: Path, count: int, start_index: int = 0) -> None:
+    """Write files in the same layout as GitManager.create_message_file"""
+    start = datetime(2024, 1, 1)
+    for i in range(start_index, start_index + count):
+        timestamp = start + timedelta(seconds=i)
+        filename = f"message_{timestamp.strftime('%Y%m%d_%H%M%S')}_{timestamp.microsecond:06d}.json"
+        with open(messages_dir / filename, 'w') as f:
+            json.dump({'content': f"message {i}", 'sender': f"user{i % 100}",
+                       'timestamp': timestamp.isoformat()}, f, indent=2)
+
+
+def full_rescan(messages_dir: Path) -> List[Dict]:
+    """The previous get_message_history: parse every file, then sort"""
+    messages = []
+    for file in sorted(messages_dir.glob('message_*.json')):
+        with open(file, 'r') as f:
+            messages.append(json.load(f))
+    return sorted(messages, key=lambda x: x['timestamp'])
+
+
+def run(files: int = 100_000, page_size: int = 50, new_files: int = 100) -> Dict:
+    """Time the full rescan against cold, warm and incremental index loads"""
+    results = {'files': files, 'page_size': page_size}
+    with tempfile.TemporaryDirectory() as tmp:
+        manager = GitManager('local', base_path=Path(tmp))
+        write_message_files(manager.messages_dir, files)
+
+        with Timer() as t:
+            full_rescan(manager.messages_dir)
+        results['full_rescan_seconds'] = round(t.elapsed, 3)
+
+        with Timer() as t:
+            history = manager.get_message_history(limit=page_size)
+        results['cold_index_seconds'] = round(t.elapsed, 3)
+        assert len(history) == min(page_size, files)
+
+        with Timer() as t:
+            manager.get_message_history(limit=page_size, offset=files // 2)
+        results['warm_page_ms'] = round(t.elapsed * 1000, 3)
+
+        since = datetime(2024, 1, 1) + timedelta(seconds=files - page_size)
+        with Timer() as t:
+            manager.get_message_history(since=since)
+        results['warm_time_range_ms'] = round(t.elapsed * 1000, 3)
+
+        write_message_files(manager.messages_dir, new_files, start_index=files)
+        with Timer() as t:
+            manager.get_message_history(limit=page_size)
+        results['incremental_seconds'] = round(t.elapsed, 3)
+        results['incremental_new_files'] = new_files
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--files', type=int, default=100_000)
+    parser.add_argument('--page-size', type=int, default=50)
+    parser.add_argument('--new-files', type=int, default=100)
+    args = parser.parse_args()
+    report(run(args.files, args.page_size, args.new_files))
+
+
+if __name__ == '__main__':
+    main()
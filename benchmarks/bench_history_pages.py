@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""Page-fetch latency at increasing depth over a large synthetic history"""
+import argparse
+import sqlite3
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterator, Tuple
+
+from benchmarks.common import Timer, init_database, report
+from database.db_utils import DatabaseManager
+
+
+def synthetic_rows(count: int) -> Iterator[Tuple[str, str, str, int]]:
+    """Rows spread one second apart, every tenth one still unsynced"""
+    start = datetime(2024, 1, 1)
+    for i in range(count):
+        timestamp = (start + timedelta(seconds=i)).strftime('%Y-%m-%d %H:%M:%S')
+        yield (f"synthetic message {i}", timestamp, f"user{i % 100}", 0 if i % 10 == 0 else 1)
+
+
+def populate(db_path: Path, rows: int) -> None:
+    """Bulk-load synthetic history straight through sqlite3"""
+    conn = sqlite3.connect(db_path)
+    conn.executemany(
+        "INSERT INTO messages (content, timestamp, sender, is_synced) VALUES (?, ?, ?, ?)",
+        synthetic_rows(rows)
+    )
+    conn.commit()
+    conn.close()
+
+
+def _time_ms(func, repeat: int) -> float:
+    with Timer() as t:
+        for _ in range(repeat):
+            func()
+    return round(t.elapsed / repeat * 1000, 3)
+
+
+def run(rows: int = 1_000_000, page_size: int = 50, repeat: int = 20) -> Dict:
+    """Fetch pages at several depths with the keyset cursor and with OFFSET"""
+    results = {'rows': rows, 'page_size': page_size, 'keyset_ms': {}, 'offset_ms': {}}
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "db.sqlite"
+        init_database(db_path)
+        with Timer() as t:
+            populate(db_path, rows)
+        results['populate_seconds'] = round(t.elapsed, 2)
+
+        db = DatabaseManager(db_path)
+        for fraction in (0.0, 0.25, 0.5, 0.99):
+            depth = int(rows * fraction)
+            # Newest-first order: the cursor row sits `depth` rows from the top
+            before_id = rows - depth if depth else None
+            label = f"{int(fraction * 100)}%"
+            results['keyset_ms'][label] = _time_ms(
+                lambda: db.get_messages(limit=page_size, before_id=before_id), repeat)
+
+            # What an OFFSET-based API would pay for the same page
+            def offset_page():
+                with db.get_db() as conn:
+                    conn.execute(
+                        "SELECT id, content, timestamp, git_hash, sender, is_synced FROM messages "
+                        "ORDER BY timestamp DESC, id DESC LIMIT ? OFFSET ?",
+                        (page_size, depth)
+                    ).fetchall()
+            results['offset_ms'][label] = _time_ms(offset_page, max(1, repeat // 10))
+
+        results['unsynced_batch_ms'] = _time_ms(lambda: db.get_unsynced_messages(limit=100), repeat)
+        db.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--page-size', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    report(run(args.rows, args.page_size, args.repeat))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""Throughput of prefork mode as the number of worker processes grows"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from benchmarks.common import init_database, offline_environment, rate, report
+from benchmarks.load_test import run_level
+
+
+def _client_process(args) -> Dict:
+    url, concurrency, requests_per_client, method, path = args
+    return run_level(url, concurrency, requests_per_client, method, path)
+
+
+def run_workers(db_path: Path, workers: int, client_processes: int, concurrency: int,
+                requests_per_client: int, method: str, path: str) -> Dict:
+    """Serve with the given worker count and drive it from several client processes"""
+    from prefork import PreforkServer
+
+    server = PreforkServer("127.0.0.1", 0, workers=workers, sync_enabled=False, db_path=db_path)
+    server.start()
+    url = f"http://127.0.0.1:{server.port}"
+    try:
+        # Clients run in their own processes so the load generator is not the bottleneck
+        jobs = [(url, concurrency, requests_per_client, method, path)] * client_processes
+        with multiprocessing.get_context("spawn").Pool(client_processes) as pool:
+            start = time.perf_counter()
+            levels = pool.map(_client_process, jobs)
+            elapsed = time.perf_counter() - start
+    finally:
+        server.stop()
+
+    requests = sum(level['requests'] for level in levels)
+    return {
+        'workers': workers,
+        'requests': requests,
+        'errors': sum(level['errors'] for level in levels),
+        'requests_per_sec': rate(requests, elapsed),
+        'p99_ms': max(level['p99_ms'] for level in levels),
+    }
+
+
+def run(worker_counts: List[int], client_processes: int = 4, concurrency: int = 16,
+        requests_per_client: int = 200, method: str = "GET", path: str = "/api/messages") -> Dict:
+    results = {'cpus': os.cpu_count(), 'method': method, 'path': path, 'runs': []}
+    # Request logging to stderr would dominate the measurement; workers
+    # inherit the environment
+    os.environ['ACCESS_LOG'] = '0'
+    offline_environment()
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "db.sqlite"
+        init_database(db_path)
+        from database.db_utils import DatabaseManager
+        db = DatabaseManager(db_path)
+        db.add_messages((f"Message {i}", "bench") for i in range(200))
+        db.close()
+        for workers in worker_counts:
+            results['runs'].append(run_workers(db_path, workers, client_processes, concurrency,
+                                               requests_per_client, method, path))
+    base = results['runs'][0]['requests_per_sec']
+    for entry in results['runs']:
+        entry['scaling'] = round(entry['requests_per_sec'] / base, 2) if base else None
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    default_counts = sorted({1, 2, 4, os.cpu_count() or 1})
+    parser.add_argument('--workers', default=",".join(str(n) for n in default_counts),
+                        help="comma-separated worker process counts")
+    parser.add_argument('--client-processes', type=int, default=4)
+    parser.add_argument('--concurrency', type=int, default=16, help="connections per client process")
+    parser.add_argument('--requests', type=int, default=200, help="requests per connection")
+    parser.add_argument('--method', choices=['GET', 'POST'], default='GET')
+    parser.add_argument('--path', default='/api/messages')
+    args = parser.parse_args()
+    counts = [int(count) for count in args.workers.split(',')]
+    report(run(counts, args.client_processes, args.concurrency, args.requests, args.method, args.path))
+
+
+if __name__ == '__main__':
+    main()
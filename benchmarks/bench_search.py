@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""Full-text search latency over a large synthetic history, against a LIKE scan"""
+import argparse
+import contextlib
+import io
+import random
+import sqlite3
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+
+from benchmarks.common import Timer, init_database, rate, report
+from database.db_utils import DatabaseManager
+from database.init_db import DatabaseInitializer
+
+# A Zipf-like vocabulary: a few words appear in most messages, most are rare
+VOCABULARY_SIZE = 20000
+WORDS_PER_MESSAGE = 12
+
+
+def _vocabulary() -> List[str]:
+    syllables = ['ka', 'lo', 'mi', 'ne', 'ru', 'sa', 'ti', 'vo', 'ze', 'po', 'da', 'gi']
+    words = []
+    for i in range(VOCABULARY_SIZE):
+        word, n = '', i + 1
+        while n:
+            n, digit = divmod(n, len(syllables))
+            word += syllables[digit]
+        words.append(word)
+    return words
+
+
+def synthetic_rows(count: int, seed: int = 7) -> Iterator[Tuple[str, str, str]]:
+    """(content, timestamp, sender) rows one second apart"""
+    rng = random.Random(seed)
+    words = _vocabulary()
+    cumulative, total = [], 0.0
+    for rank in range(len(words)):
+        total += 1 / (rank + 1)
+        cumulative.append(total)
+    start = datetime(2024, 1, 1)
+    for i in range(count):
+        content = ' '.join(rng.choices(words, cum_weights=cumulative, k=WORDS_PER_MESSAGE))
+        timestamp = (start + timedelta(seconds=i)).strftime('%Y-%m-%d %H:%M:%S')
+        yield (content, timestamp, f"user{i % 100}")
+
+
+def populate(db_path: Path, rows: int, index: bool) -> None:
+    """Bulk-load history; with index=False the triggers are dropped first"""
+    conn = sqlite3.connect(db_path)
+    if not index:
+        conn.executescript("DROP TRIGGER messages_fts_insert;")
+    conn.executemany("INSERT INTO messages (content, timestamp, sender) VALUES (?, ?, ?)",
+                     synthetic_rows(rows))
+    conn.commit()
+    conn.close()
+
+
+def _time_ms(func, repeat: int) -> float:
+    with Timer() as t:
+        for _ in range(repeat):
+            func()
+    return round(t.elapsed / repeat * 1000, 3)
+
+
+def run(rows: int = 1_000_000, repeat: int = 20) -> Dict:
+    words = _vocabulary()
+    # Ranks 0, 100 and 5000: in most messages, in some, in a handful
+    common, medium, rare = words[0], words[100], words[5000]
+    results: Dict = {'rows': rows, 'search_ms': {}}
+    with tempfile.TemporaryDirectory() as tmp:
+        # Indexing live, row by row through the insert trigger
+        live_path = Path(tmp) / "live.sqlite"
+        init_database(live_path)
+        with Timer() as t:
+            populate(live_path, rows, index=True)
+        results['insert_with_triggers_per_sec'] = rate(rows, t.elapsed)
+
+        # Loading first and building the index in one pass, as a migration does
+        db_path = Path(tmp) / "db.sqlite"
+        init_database(db_path)
+        with Timer() as t:
+            populate(db_path, rows, index=False)
+        results['insert_without_index_per_sec'] = rate(rows, t.elapsed)
+        with Timer() as t, contextlib.redirect_stdout(io.StringIO()):
+            DatabaseInitializer(db_path).rebuild_search_index()
+        results['backfill_seconds'] = round(t.elapsed, 2)
+
+        db = DatabaseManager(db_path)
+        cases = {
+            'rare_word': lambda: db.search_messages(rare),
+            'medium_word': lambda: db.search_messages(medium),
+            'common_word': lambda: db.search_messages(common),
+            'common_word_recent': lambda: db.search_messages(common, order='recent'),
+            'two_words': lambda: db.search_messages(f"{common} {medium}"),
+            'prefix': lambda: db.search_messages(medium[:3] + '*', order='recent'),
+            'medium_word_sender': lambda: db.search_messages(medium, sender='user7'),
+            'medium_word_last_day': lambda: db.search_messages(
+                medium, since=(datetime(2024, 1, 1) + timedelta(seconds=rows - 86400)).strftime(
+                    '%Y-%m-%d %H:%M:%S')),
+        }
+        for name, func in cases.items():
+            results['search_ms'][name] = _time_ms(func, repeat)
+
+        first = db.search_messages(medium)
+        results['search_ms']['medium_word_page_2'] = _time_ms(
+            lambda: db.search_messages(medium, after=(first[-1]['rank'], first[-1]['id'])), repeat)
+        results['matches'] = {
+            name: db.search_messages(word, limit=rows, order='recent').__len__()
+            for name, word in (('common', common), ('medium', medium), ('rare', rare))
+        }
+
+        # What the endpoint would cost without the index
+        def like_scan():
+            with db.get_db() as conn:
+                conn.execute("SELECT id FROM messages WHERE content LIKE ? ORDER BY id DESC LIMIT 50",
+                             (f"%{rare}%",)).fetchall()
+        results['like_scan_rare_ms'] = _time_ms(like_scan, max(1, repeat // 10))
+        db.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    report(run(args.rows, args.repeat))
+
+
+if __name__ == '__main__':
+    main()
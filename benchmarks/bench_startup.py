@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""Cold start: time until /readyz answers 200 and the first history page of every room
+
+Each start is a fresh interpreter, so imports are measured too. The first
+start posts once to every room, which puts the room in the recent-message
+cache, and saves the cache snapshot on SIGTERM. The next two starts read the
+first page of every room, one with the snapshot disabled (only the default
+room is warmed, the rest come from SQLite) and one restoring it.
+"""
+import argparse
+import contextlib
+import http.client
+import io
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from benchmarks.common import ROOT_DIR, Timer, init_database, offline_environment, rate, report
+from benchmarks.load_test import percentile
+
+
+def _serve(db_path: str, snapshot: Optional[str]) -> None:
+    """Child process: start the server the way run_server does and report its phases on stdout"""
+    started = time.perf_counter()
+    import app
+    from database.db_utils import DatabaseManager
+    from database.init_db import DatabaseInitializer
+    imported = time.perf_counter()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        DatabaseInitializer(Path(db_path)).migrate_database()
+    migrated = time.perf_counter()
+    db = DatabaseManager(Path(db_path))
+    httpd = app.create_server("127.0.0.1", 0, db=db, mode="threaded", recent_snapshot=snapshot)
+    created = time.perf_counter()
+    print(json.dumps({'port': httpd.server_address[1], 'import_ms': round((imported - started) * 1000, 3),
+                      'migrate_ms': round((migrated - imported) * 1000, 3),
+                      'create_server_ms': round((created - migrated) * 1000, 3),
+                      'recent_cache': db.recent_cache.source}), flush=True)
+
+    def stop(signum, frame):
+        httpd.ready = False
+        threading.Thread(target=httpd.shutdown).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    httpd.serve_forever()
+    httpd.broadcaster.close()
+    httpd.socket.close()
+    httpd.drain(app.SHUTDOWN_GRACE)
+    httpd.server_close()
+    if snapshot:
+        db.save_recent_snapshot(snapshot)
+    db.close()
+
+
+def _request(conn: http.client.HTTPConnection, method: str, path: str, body: Optional[Dict] = None) -> int:
+    conn.request(method, path, body=json.dumps(body) if body is not None else None,
+                 headers={'Content-Type': 'application/json'} if body is not None else {})
+    response = conn.getresponse()
+    response.read()
+    return response.status
+
+
+def start(db_path: Path, snapshot: Optional[Path], rooms: List[str], post: bool = False) -> Dict:
+    """Start a server, wait for /readyz, read every room's first page, then stop it with SIGTERM"""
+    offline_environment()
+    env = dict(os.environ, ACCESS_LOG='0', SYNC_ENABLED='0')
+    command = [sys.executable, '-m', 'benchmarks.bench_startup', '--serve', str(db_path),
+               '--snapshot', str(snapshot) if snapshot else '']
+    begin = time.perf_counter()
+    process = subprocess.Popen(command, cwd=str(ROOT_DIR), env=env, stdout=subprocess.PIPE, text=True)
+    try:
+        phases = json.loads(process.stdout.readline())
+        conn = http.client.HTTPConnection('127.0.0.1', phases['port'], timeout=30)
+        while _request(conn, 'GET', '/readyz') != 200:
+            time.sleep(0.001)
+        ready = time.perf_counter()
+
+        latencies = []
+        for room in rooms:
+            with Timer() as t:
+                if _request(conn, 'GET', f"/api/messages?limit=50&room={room}") != 200:
+                    raise RuntimeError(f"first page of {room} failed")
+            latencies.append(t.elapsed)
+        if post:
+            for room in rooms:
+                _request(conn, 'POST', '/api/messages', {'content': 'warm', 'sender': 'bench', 'room_id': room})
+        conn.close()
+    finally:
+        process.send_signal(signal.SIGTERM)
+        process.wait(timeout=60)
+
+    return dict(phases, ready_ms=round((ready - begin) * 1000, 3),
+                first_pages_ms=round(sum(latencies) * 1000, 3),
+                first_page_p50_ms=round(percentile(latencies, 50) * 1000, 3),
+                first_page_max_ms=round(max(latencies) * 1000, 3))
+
+
+def run(messages: int = 100_000, rooms: int = 20, batch_size: int = 5000) -> Dict:
+    room_ids = ['default'] + [f"room-{i}" for i in range(1, rooms)]
+    results: Dict = {'messages': messages, 'rooms': rooms}
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / 'db.sqlite'
+        snapshot = Path(tmp) / 'recent_snapshot.json'
+        init_database(db_path)
+
+        from database.db_utils import DatabaseManager
+        db = DatabaseManager(db_path)
+        with Timer() as t:
+            for start_row in range(0, messages, batch_size):
+                count = min(batch_size, messages - start_row)
+                room = room_ids[(start_row // batch_size) % rooms]
+                db.add_messages([(f"message {start_row + i}", f"user{i % 50}") for i in range(count)], room_id=room)
+        db.close()
+        results['load_per_sec'] = rate(messages, t.elapsed)
+
+        start(db_path, snapshot, room_ids, post=True)
+        results['snapshot_bytes'] = snapshot.stat().st_size
+        results['cold'] = start(db_path, None, room_ids)
+        results['snapshot'] = start(db_path, snapshot, room_ids)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=100_000)
+    parser.add_argument('--rooms', type=int, default=20)
+    parser.add_argument('--serve', help=argparse.SUPPRESS)
+    parser.add_argument('--snapshot', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve:
+        _serve(args.serve, args.snapshot or None)
+        return
+    report(run(args.messages, args.rooms))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""Shared fixtures for the offline benchmarks, also used by the tests"""
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict
+
+# Make the application modules importable when run as a script
+ROOT_DIR = Path(__file__).resolve().parent.parent
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+
+
+def offline_environment() -> None:
+    """Settings for benchmark servers; call before importing app or spawning a server process
+
+    Load comes from one address posting as one sender, so per-client and
+    per-sender rate limits would measure nothing but the limiter.
+    """
+    os.environ.setdefault('CLIENT_RATE_LIMIT', '0')
+    os.environ.setdefault('SENDER_RATE_LIMIT', '0')
+
+
+def git(args, cwd: Path) -> str:
+    """Run a git command and return its stdout, raising on failure"""
+    result = subprocess.run(['git'] + list(args), cwd=str(cwd), capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"git {' '.join(args)} failed: {result.stderr}")
+    return result.stdout
+
+
+def make_local_remote(root: Path, branch: str = 'master') -> Path:
+    """Create a bare 'origin' and a clone of it, returning the clone's path"""
+    remote = root / 'remote.git'
+    work = root / 'work'
+    git(['init', '--bare', '-q', '-b', branch, str(remote)], cwd=root)
+    git(['clone', '-q', str(remote), str(work)], cwd=root)
+    git(['config', 'user.name', 'Offline'], cwd=work)
+    git(['config', 'user.email', 'offline@localhost'], cwd=work)
+    git(['symbolic-ref', 'HEAD', f'refs/heads/{branch}'], cwd=work)
+    git(['commit', '-q', '--allow-empty', '-m', 'Initial commit'], cwd=work)
+    git(['push', '-q', '-u', 'origin', branch], cwd=work)
+    return work
+
+
+def init_database(db_path: Path) -> None:
+    """Create a database from schema.sql without the initializer's chatter"""
+    from database.init_db import DatabaseInitializer
+    with contextlib.redirect_stdout(io.StringIO()):
+        if not DatabaseInitializer(Path(db_path)).init_database():
+            raise RuntimeError(f"Could not initialize {db_path}")
+
+
+def rate(count: int, seconds: float) -> float:
+    """Operations per second, guarding against a zero duration"""
+    return round(count / seconds, 2) if seconds > 0 else float('inf')
+
+
+class Timer:
+    """Context manager measuring wall-clock time in seconds"""
+
+    def __enter__(self) -> 'Timer':
+        self.start = time.perf_counter()
+        self.elapsed = 0.0
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.elapsed = time.perf_counter() - self.start
+
+
+def report(results: Dict) -> None:
+    """Print benchmark results as JSON"""
+    print(json.dumps(results, indent=2))
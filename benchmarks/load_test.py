@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""Load-test ChatRequestHandler: p50/p99 latency and requests/sec per concurrency level"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+
+from benchmarks.common import init_database, offline_environment, rate, report
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a list of samples"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def _serve(mode: str, db_path: str, ready, git_path: Optional[str] = None) -> None:
+    """Run the chat server in a child process so it has its own GIL"""
+    offline_environment()
+    import app
+    from database.db_utils import DatabaseManager
+
+    # Request logging to stderr would dominate the measurement
+    app.ChatRequestHandler.log_message = lambda *args: None
+    init_database(Path(db_path))
+    db = DatabaseManager(Path(db_path))
+    sync_worker = None
+    if git_path is not None:
+        from git_manager import GitManager
+        from sync_worker import SyncWorker
+        sync_worker = SyncWorker(db, GitManager('local', base_path=Path(git_path)),
+                                 batch_size=app.SYNC_BATCH_SIZE, poll_interval=app.SYNC_POLL_INTERVAL,
+                                 max_backlog=app.SYNC_MAX_BACKLOG)
+        sync_worker.start()
+    httpd = app.create_server("127.0.0.1", 0, db=db, sync_worker=sync_worker, mode=mode)
+    ready.put(httpd.server_address[1])
+    httpd.serve_forever()
+
+
+def start_server(mode: str, db_path: str, git_path: Optional[str] = None):
+    """Start a server process and return (process, base_url)
+
+    With git_path, a clone of a local remote, posts are also synced to Git
+    by a worker in the server process, as in production.
+    """
+    ready = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_serve, args=(mode, db_path, ready, git_path), daemon=True)
+    process.start()
+    port = ready.get(timeout=30)
+    return process, f"http://127.0.0.1:{port}"
+
+
+def _client(base_url: str, method: str, path: str, requests_per_client: int,
+            keep_alive: bool, latencies: List[float], errors: List[int]) -> None:
+    url = urlparse(base_url)
+    body = None
+    headers = {}
+    if method == "POST":
+        body = json.dumps({"content": "load test message", "sender": "loadtest"})
+        headers["Content-Type"] = "application/json"
+
+    conn: Optional[http.client.HTTPConnection] = None
+    for _ in range(requests_per_client):
+        if conn is None:
+            conn = http.client.HTTPConnection(url.hostname, url.port, timeout=30)
+        start = time.perf_counter()
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            latencies.append(time.perf_counter() - start)
+            if response.status >= 400:
+                errors.append(response.status)
+            if not keep_alive or response.will_close:
+                conn.close()
+                conn = None
+        except (OSError, http.client.HTTPException):
+            errors.append(0)
+            if conn is not None:
+                conn.close()
+            conn = None
+    if conn is not None:
+        conn.close()
+
+
+def run_level(base_url: str, concurrency: int, requests_per_client: int, method: str = "GET",
+              path: str = "/", keep_alive: bool = True) -> Dict:
+    """Run one concurrency level and summarise the latencies"""
+    latencies: List[float] = []
+    errors: List[int] = []
+    threads = [
+        threading.Thread(target=_client, args=(base_url, method, path, requests_per_client,
+                                               keep_alive, latencies, errors))
+        for _ in range(concurrency)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    return {
+        'concurrency': concurrency,
+        'requests': len(latencies),
+        'errors': len(errors),
+        'requests_per_sec': rate(len(latencies), elapsed),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+    }
+
+
+def run(mode: str = "threaded", levels=(1, 10, 100), requests_per_client: int = 50,
+        method: str = "GET", path: str = "/", keep_alive: bool = True,
+        url: Optional[str] = None) -> Dict:
+    """Load-test a server, starting a private one unless url is given"""
+    results = {'mode': mode if url is None else url, 'method': method, 'path': path,
+               'keep_alive': keep_alive, 'levels': []}
+    with tempfile.TemporaryDirectory() as tmp:
+        process = None
+        if url is None:
+            process, url = start_server(mode, str(Path(tmp) / "db.sqlite"))
+        try:
+            for concurrency in levels:
+                results['levels'].append(
+                    run_level(url, concurrency, requests_per_client, method, path, keep_alive))
+        finally:
+            if process is not None:
+                process.terminate()
+                process.join()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--mode', choices=['threaded', 'single'], default='threaded')
+    parser.add_argument('--url', help="test an already running server instead of starting one")
+    parser.add_argument('--levels', default="1,10,100", help="comma-separated client counts")
+    parser.add_argument('--requests', type=int, default=50, help="requests per client")
+    parser.add_argument('--method', choices=['GET', 'POST'], default='GET')
+    parser.add_argument('--path', default='/')
+    parser.add_argument('--no-keep-alive', action='store_true')
+    args = parser.parse_args()
+
+    levels = [int(level) for level in args.levels.split(',')]
+    path = "/api/messages" if args.method == "POST" and args.path == "/" else args.path
+    report(run(args.mode, levels, args.requests, args.method, path,
+               not args.no_keep_alive, args.url))
+
+
+if __name__ == '__main__':
+    main()
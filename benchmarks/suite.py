@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""Offline benchmark suite for the write/read pipeline, with regression checks against a baseline
+
+Runs three scenarios against a temporary SQLite database and a local bare
+repository standing in for GitHub:
+
+  database  DatabaseManager batched and single inserts, latest and deep page reads
+  git       GitManager create_message_file, push_message and get_message_history
+  pipeline  concurrent POST /api/messages with the sync worker pushing to Git
+
+Results are printed as JSON and written to --output. Given --baseline, an
+earlier results file, every rate (*_per_sec) that fell and every latency or
+duration (*_ms, *_seconds) that grew by more than --threshold percent is a
+regression, and the suite exits with status 1.
+"""
+import argparse
+import json
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+from benchmarks.common import Timer, git, init_database, make_local_remote, rate, report
+from benchmarks.load_test import percentile, run_level, start_server
+
+SCENARIOS = ('database', 'git', 'pipeline')
+
+# Percent a metric may move in the wrong direction before it is a regression
+DEFAULT_THRESHOLD = 20.0
+
+# Metric name suffixes and whether larger values are better
+_HIGHER_IS_BETTER = ('_per_sec',)
+_LOWER_IS_BETTER = ('_ms', '_seconds', 'errors')
+
+
+def bench_database(root: Path, messages: int, single_inserts: int, reads: int,
+                   batch_size: int = 500) -> Dict:
+    """Load messages rows in batches, then time single inserts and page reads over them"""
+    from database.db_utils import DatabaseManager
+
+    db_path = root / 'database.sqlite'
+    init_database(db_path)
+    db = DatabaseManager(db_path)
+    results: Dict = {}
+    try:
+        with Timer() as t:
+            for start in range(0, messages, batch_size):
+                count = min(batch_size, messages - start)
+                db.add_messages((f"message {start + i}", f"user{(start + i) % 50}") for i in range(count))
+        results['batched_inserts_per_sec'] = rate(messages, t.elapsed)
+
+        latencies = []
+        for i in range(single_inserts):
+            start = time.perf_counter()
+            db.add_message(f"single {i}", "bench")
+            latencies.append(time.perf_counter() - start)
+        results['single_inserts_per_sec'] = rate(single_inserts, sum(latencies))
+        results['single_insert_p99_ms'] = round(percentile(latencies, 99) * 1000, 3)
+
+        with Timer() as t:
+            for _ in range(reads):
+                db.get_messages(limit=50)
+        results['latest_page_reads_per_sec'] = rate(reads, t.elapsed)
+
+        # Keyset pages from random points in the table
+        last_id = db.last_message_id()
+        rng = random.Random(0)
+        with Timer() as t:
+            for _ in range(reads):
+                db.get_messages(limit=50, before_id=rng.randint(1, last_id))
+        results['deep_page_reads_per_sec'] = rate(reads, t.elapsed)
+
+        with Timer() as t:
+            db.count_unsynced_messages()
+        results['count_unsynced_ms'] = round(t.elapsed * 1000, 3)
+    finally:
+        db.close()
+    return results
+
+
+def bench_git(root: Path, messages: int, pushes: int, reads: int) -> Dict:
+    """Write message files, push some one at a time and the rest as one commit, then read history"""
+    from git_manager import GitManager
+
+    (root / 'git').mkdir()
+    work = make_local_remote(root / 'git')
+    manager = GitManager('local', base_path=work)
+    results: Dict = {}
+    try:
+        with Timer() as t:
+            filepaths = [manager.create_message_file(f"message {i}", f"user{i % 50}", message_id=i + 1)
+                         for i in range(messages)]
+        results['create_files_per_sec'] = rate(messages, t.elapsed)
+
+        pushes = min(pushes, messages)
+        latencies = []
+        for filepath in filepaths[:pushes]:
+            start = time.perf_counter()
+            if not manager.push_message(filepath):
+                raise RuntimeError("push_message failed")
+            latencies.append(time.perf_counter() - start)
+        if latencies:
+            results['pushes_per_sec'] = rate(len(latencies), sum(latencies))
+            results['push_p50_ms'] = round(percentile(latencies, 50) * 1000, 3)
+            results['push_p99_ms'] = round(percentile(latencies, 99) * 1000, 3)
+
+        if filepaths[pushes:]:
+            with Timer() as t:
+                if not manager.push_messages(filepaths[pushes:]):
+                    raise RuntimeError("push_messages failed")
+            results['bulk_push_seconds'] = round(t.elapsed, 3)
+
+        # Cold: the history index has to be built from every message file
+        manager.close()
+        for suffix in ('', '-wal', '-shm'):
+            Path(str(manager.history_index_path) + suffix).unlink(missing_ok=True)
+        with Timer() as t:
+            history = manager.get_message_history(limit=50)
+        results['cold_history_seconds'] = round(t.elapsed, 3)
+        if len(history) != min(50, messages):
+            raise RuntimeError(f"history returned {len(history)} messages")
+
+        with Timer() as t:
+            for _ in range(reads):
+                manager.get_message_history(limit=50)
+        results['history_page_reads_per_sec'] = rate(reads, t.elapsed)
+
+        with Timer() as t:
+            manager.get_message_history()
+        results['full_history_seconds'] = round(t.elapsed, 3)
+    finally:
+        manager.close()
+    return results
+
+
+def bench_pipeline(root: Path, levels: Sequence[int], requests_per_client: int,
+                   mode: str = 'threaded', drain_timeout: float = 600.0) -> Dict:
+    """POST messages at each concurrency level while the sync worker pushes them to Git"""
+    from database.db_utils import DatabaseManager
+
+    (root / 'pipeline').mkdir()
+    work = make_local_remote(root / 'pipeline')
+    db_path = root / 'pipeline.sqlite'
+    process, url = start_server(mode, str(db_path), git_path=str(work))
+    results: Dict = {'levels': {}}
+    try:
+        load_started = time.perf_counter()
+        for concurrency in levels:
+            level = run_level(url, concurrency, requests_per_client, 'POST', '/api/messages')
+            results['levels'][f"c{concurrency}"] = {
+                key: level[key] for key in ('requests', 'errors', 'requests_per_sec', 'p50_ms', 'p99_ms')}
+        load_finished = time.perf_counter()
+
+        # Every stored post has to reach the remote before the pipeline is done
+        db = DatabaseManager(db_path)
+        try:
+            while db.count_unsynced_messages():
+                if time.perf_counter() - load_finished > drain_timeout:
+                    raise RuntimeError(f"sync did not drain within {drain_timeout}s")
+                time.sleep(0.05)
+            posted = db.last_message_id()
+        finally:
+            db.close()
+        drained = time.perf_counter()
+    finally:
+        process.terminate()
+        process.join()
+
+    results['sync_drain_seconds'] = round(drained - load_finished, 3)
+    results['end_to_end_per_sec'] = rate(posted, drained - load_started)
+    results['remote_commits'] = int(git(['rev-list', '--count', 'master'], cwd=work.parent / 'remote.git'))
+    return results
+
+
+def run(scenarios: Sequence[str] = SCENARIOS, messages: int = 100_000, single_inserts: int = 2000,
+        reads: int = 2000, git_messages: int = 2000, pushes: int = 50, levels: Sequence[int] = (1, 10, 50),
+        requests_per_client: int = 50) -> Dict:
+    """Run the selected scenarios and return their results with the configuration used"""
+    config = {'scenarios': list(scenarios), 'messages': messages, 'single_inserts': single_inserts,
+              'reads': reads, 'git_messages': git_messages, 'pushes': pushes, 'levels': list(levels),
+              'requests_per_client': requests_per_client}
+    results: Dict = {'config': config}
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        if 'database' in scenarios:
+            results['database'] = bench_database(root, messages, single_inserts, reads)
+        if 'git' in scenarios:
+            results['git'] = bench_git(root, git_messages, pushes, reads)
+        if 'pipeline' in scenarios:
+            results['pipeline'] = bench_pipeline(root, levels, requests_per_client)
+    return results
+
+
+def flatten(results: Dict, prefix: str = '') -> Dict[str, float]:
+    """Numeric leaves of nested results, keyed by dotted path"""
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{name}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(results: Dict, baseline: Dict, threshold: float = DEFAULT_THRESHOLD) -> List[Dict]:
+    """Metrics that moved the wrong way by more than threshold percent
+
+    Only metrics present in both runs are compared, and only rates,
+    latencies, durations and error counts; the rest are sizes and counts.
+    A metric that was zero in the baseline regresses on any increase.
+    """
+    if results.get('config') != baseline.get('config'):
+        raise ValueError("Results and baseline were run with different configurations")
+    current = flatten({k: v for k, v in results.items() if k != 'config'})
+    previous = flatten({k: v for k, v in baseline.items() if k != 'config'})
+    regressions = []
+    for name in sorted(current.keys() & previous.keys()):
+        now, before = current[name], previous[name]
+        if name.endswith(_HIGHER_IS_BETTER):
+            regressed = now < before * (1 - threshold / 100)
+        elif name.endswith(_LOWER_IS_BETTER):
+            regressed = now > before * (1 + threshold / 100) and now > before
+        else:
+            continue
+        if regressed:
+            change = round((now - before) / before * 100, 1) if before else None
+            regressions.append({'metric': name, 'baseline': before, 'current': now, 'change_pct': change})
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                        help="comma-separated subset of: " + ', '.join(SCENARIOS))
+    parser.add_argument('--messages', type=int, default=100_000, help="rows loaded into the database")
+    parser.add_argument('--single-inserts', type=int, default=2000)
+    parser.add_argument('--reads', type=int, default=2000, help="page reads per read benchmark")
+    parser.add_argument('--git-messages', type=int, default=2000, help="message files written to the repository")
+    parser.add_argument('--pushes', type=int, default=50, help="files pushed one commit each")
+    parser.add_argument('--levels', default="1,10,50", help="comma-separated POST client counts")
+    parser.add_argument('--requests', type=int, default=50, help="POSTs per client")
+    parser.add_argument('--output', help="write the results JSON here")
+    parser.add_argument('--baseline', help="results JSON of an earlier run to check for regressions")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="percent a metric may worsen before it fails the run")
+    args = parser.parse_args(argv)
+
+    scenarios = [name for name in args.scenarios.split(',') if name]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    results = run(scenarios, args.messages, args.single_inserts, args.reads, args.git_messages,
+                  args.pushes, [int(level) for level in args.levels.split(',')], args.requests)
+
+    status = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        try:
+            results['regressions'] = compare(results, baseline, args.threshold)
+        except ValueError as e:
+            print(f"Cannot compare with {args.baseline}: {e}", file=sys.stderr)
+            return 2
+        for regression in results['regressions']:
+            print(f"REGRESSION {regression['metric']}: {regression['baseline']} -> {regression['current']}",
+                  file=sys.stderr)
+        status = 1 if results['regressions'] else 0
+
+    report(results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
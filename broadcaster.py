@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+import queue
+import threading
+from typing import Any, Dict, List, Optional
+
+# Put in a subscriber's queue when it is cut off for falling behind
+DROPPED = object()
+
+
+class Subscription:
+    """One listener's bounded buffer of published events"""
+
+    def __init__(self, broadcaster: 'MessageBroadcaster', max_buffer: int):
+        self._broadcaster = broadcaster
+        self._queue: queue.Queue = queue.Queue(maxsize=max_buffer)
+        self.dropped = False
+
+    def get(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Next event, or None on timeout; raises ConnectionAbortedError once dropped"""
+        try:
+            event = self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        if event is DROPPED:
+            raise ConnectionAbortedError("Subscriber fell behind and was dropped")
+        return event
+
+    def close(self) -> None:
+        self._broadcaster.unsubscribe(self)
+
+    def _offer(self, event: Dict[str, Any]) -> bool:
+        """Queue an event without blocking; False when the buffer is full"""
+        try:
+            self._queue.put_nowait(event)
+            return True
+        except queue.Full:
+            return False
+
+    def _drop(self) -> None:
+        """Discard the backlog and wake the reader with the DROPPED marker"""
+        self.dropped = True
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+        try:
+            self._queue.put_nowait(DROPPED)
+        except queue.Full:
+            pass
+
+
+class MessageBroadcaster:
+    """In-memory fan-out of new messages to every live subscriber
+
+    publish() never blocks: a subscriber whose buffer is full is dropped
+    rather than slowing the writer or the other subscribers down.
+    """
+
+    def __init__(self, max_buffer: int = 256):
+        self.max_buffer = max_buffer
+        self._subscribers: List[Subscription] = []
+        self._lock = threading.Lock()
+        self.published = 0
+        self.dropped_subscribers = 0
+
+    def subscribe(self) -> Subscription:
+        subscription = Subscription(self, self.max_buffer)
+        with self._lock:
+            self._subscribers.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            if subscription in self._subscribers:
+                self._subscribers.remove(subscription)
+
+    def publish(self, event: Dict[str, Any]) -> int:
+        """Deliver an event to every subscriber and return how many received it"""
+        with self._lock:
+            subscribers = list(self._subscribers)
+            self.published += 1
+
+        delivered = 0
+        slow = []
+        for subscription in subscribers:
+            if subscription._offer(event):
+                delivered += 1
+            else:
+                slow.append(subscription)
+
+        for subscription in slow:
+            self.unsubscribe(subscription)
+            subscription._drop()
+        if slow:
+            with self._lock:
+                self.dropped_subscribers += len(slow)
+        return delivered
+
+    def close(self) -> None:
+        """Disconnect every subscriber so open streams end, e.g. on shutdown"""
+        with self._lock:
+            subscribers, self._subscribers = self._subscribers, []
+        for subscription in subscribers:
+            subscription._drop()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'subscribers': len(self._subscribers),
+                'published': self.published,
+                'dropped_subscribers': self.dropped_subscribers,
+            }
+
+
+class DatabaseFeed:
+    """Publishes messages committed by any process, read back from SQLite
+
+    When several processes serve requests, a post handled by one of them
+    never reaches the broadcasters of the others. The feed polls for rows
+    newer than the last one it published, so every process streams every
+    message, in id order.
+    """
+
+    def __init__(self, db, broadcaster: MessageBroadcaster, interval: float = 0.1,
+                 batch_size: int = 500):
+        self.db = db
+        self.broadcaster = broadcaster
+        self.interval = interval
+        self.batch_size = batch_size
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.last_id = 0
+
+    def start(self) -> None:
+        # Streams replay older messages themselves; only new ones are fed
+        self.last_id = self.db.last_message_id()
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="message-feed", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def poll(self) -> int:
+        """Publish everything committed since the last poll and return how many"""
+        published = 0
+        while True:
+            rows = self.db.get_messages_after(self.last_id, limit=self.batch_size)
+            for row in rows:
+                # Same fields as a post publishes; streams route on room_id
+                self.broadcaster.publish({key: row[key] for key in ('id', 'content', 'sender', 'timestamp',
+                                                                    'room_id')})
+                self.last_id = row['id']
+            published += len(rows)
+            if len(rows) < self.batch_size:
+                return published
+
+    def _run(self) -> None:
+        while not self._stopping.wait(self.interval):
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"Error in message feed: {e}")
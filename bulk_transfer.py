@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+import argparse
+import bisect
+import json
+import os
+import subprocess
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from database.db_utils import DatabaseManager
+from database.init_db import DatabaseInitializer
+from git_manager import message_filename
+from history_archive import is_archive, read_archive
+from rooms import room_dir, room_dirs, room_of_source, room_prefix
+from segment_log import DEFAULT_SEGMENT_BYTES, SegmentLog, is_segment, read_records
+
+# Rows written per import transaction
+IMPORT_BATCH_SIZE = 10000
+# Message files parsed per worker task
+FILES_PER_TASK = 500
+# Rows read per export batch
+EXPORT_BATCH_SIZE = 5000
+
+PROGRESS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS bulk_import_progress (
+    source TEXT PRIMARY KEY,    -- File, segments/<name> or archive/<name>, relative to messages/
+    offset INTEGER NOT NULL     -- Bytes of the source already imported
+);
+
+CREATE TABLE IF NOT EXISTS bulk_export_progress (
+    target TEXT PRIMARY KEY,    -- Resolved output directory and storage format
+    last_id INTEGER NOT NULL    -- Highest message id already written
+);
+"""
+
+# (id, content, sender, timestamp, end offset of the record in its source)
+ParsedRow = Tuple[Optional[int], str, str, str, int]
+# (source, offset reached, rows)
+ParsedSource = Tuple[str, int, List[ParsedRow]]
+
+
+def _parsed_row(message_data: Dict[str, Any], end: int) -> ParsedRow:
+    # Files hold ISO timestamps; the database uses a space separator, and
+    # the two must sort together
+    timestamp = str(message_data['timestamp']).replace('T', ' ', 1)
+    return (message_data.get('id'), message_data['content'], message_data['sender'], timestamp, end)
+
+
+def parse_message_files(messages_dir: str, names: List[str]) -> List[ParsedSource]:
+    """Parse a chunk of per-message JSON files (runs in a worker process)"""
+    parsed = []
+    for name in names:
+        try:
+            with open(os.path.join(messages_dir, name), 'rb') as f:
+                raw = f.read()
+            row = _parsed_row(json.loads(raw), len(raw))
+        except (json.JSONDecodeError, KeyError, TypeError, IOError) as e:
+            print(f"Skipping unreadable message file {name}: {e}")
+            continue
+        parsed.append((name, len(raw), [row]))
+    return parsed
+
+
+def parse_segment(messages_dir: str, name: str, offset: int) -> List[ParsedSource]:
+    """Parse one segment from a byte offset (runs in a worker process)"""
+    rows = []
+    end = offset
+    for _, next_offset, message_data in read_records(Path(messages_dir) / name, offset):
+        rows.append(_parsed_row(message_data, next_offset))
+        end = next_offset
+    return [(name, end, rows)]
+
+
+def parse_archive(messages_dir: str, name: str) -> List[ParsedSource]:
+    """Decode one archive block (runs in a worker process)"""
+    path = Path(messages_dir) / name
+    size = path.stat().st_size
+    # A block is added to Git whole, so all its records share one commit
+    return [(name, size, [_parsed_row(message_data, size) for message_data in read_archive(path)])]
+
+
+_PARSERS = {'files': parse_message_files, 'segment': parse_segment, 'archive': parse_archive}
+
+
+def _run_task(task: Tuple) -> List[ParsedSource]:
+    kind, *args = task
+    return _PARSERS[kind](*args)
+
+
+class CommitLookup:
+    """Maps message files, archive blocks and segment records to the commit that added them
+
+    Built from a single `git log --raw` over messages/ plus one
+    `git cat-file --batch-check` for segment blob sizes: a segment record
+    belongs to the first commit whose copy of the segment reaches its end.
+    """
+
+    def __init__(self, messages_dir: Path):
+        self.files: Dict[str, str] = {}
+        self.segments: Dict[str, Tuple[List[int], List[str]]] = {}
+        self._load(Path(messages_dir))
+
+    def commit_for(self, source: str, end: int) -> Optional[str]:
+        if source in self.files:
+            return self.files[source]
+        sizes, commits = self.segments.get(source, ([], []))
+        position = bisect.bisect_left(sizes, end)
+        return commits[position] if position < len(commits) else None
+
+    def _load(self, messages_dir: Path) -> None:
+        result = subprocess.run(
+            ['git', 'log', '--reverse', '--raw', '--no-abbrev', '--no-renames', '--relative',
+             '--format=commit %H', '--', '.'],
+            cwd=str(messages_dir), capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            print(f"No git history found, importing every message as unsynced: {result.stderr.strip()}")
+            return
+
+        segment_blobs: Dict[str, List[Tuple[str, str]]] = {}
+        commit = None
+        for line in result.stdout.splitlines():
+            if line.startswith('commit '):
+                commit = line[7:]
+            elif line.startswith(':') and commit:
+                meta, path = line.split('\t', 1)
+                fields = meta.split()
+                status, blob = fields[4], fields[3]
+                if status not in ('A', 'M'):
+                    continue
+                if Path(path).parent.name == 'segments':
+                    segment_blobs.setdefault(path, []).append((blob, commit))
+                else:
+                    self.files.setdefault(path, commit)
+
+        blobs = {blob for entries in segment_blobs.values() for blob, _ in entries}
+        sizes = self._blob_sizes(messages_dir, blobs)
+        for path, entries in segment_blobs.items():
+            # Keep growing sizes only; a rewrite that shrank the segment
+            # cannot have added records
+            points: List[Tuple[int, str]] = []
+            for blob, blob_commit in entries:
+                size = sizes.get(blob)
+                if size is not None and (not points or size > points[-1][0]):
+                    points.append((size, blob_commit))
+            self.segments[path] = ([size for size, _ in points], [c for _, c in points])
+
+    @staticmethod
+    def _blob_sizes(messages_dir: Path, blobs) -> Dict[str, int]:
+        if not blobs:
+            return {}
+        result = subprocess.run(
+            ['git', 'cat-file', '--batch-check'],
+            cwd=str(messages_dir), input='\n'.join(blobs) + '\n', capture_output=True, text=True
+        )
+        sizes = {}
+        for line in result.stdout.splitlines():
+            fields = line.split()
+            if len(fields) == 3:
+                sizes[fields[0]] = int(fields[2])
+        return sizes
+
+
+def _import_tasks(messages_dir: Path, done: Dict[str, int]) -> Iterator[Tuple]:
+    """Worker tasks for every source not yet fully imported, in every room
+
+    Sources are named relative to messages_dir, so a source in another
+    room carries its rooms/<room_id>/ prefix and with it the room.
+    """
+    for room_id, directory in room_dirs(messages_dir):
+        prefix = room_prefix(room_id)
+        with os.scandir(directory) as entries:
+            names = sorted(
+                prefix + entry.name for entry in entries
+                if entry.name.startswith('message_') and entry.name.endswith('.json')
+                and prefix + entry.name not in done
+            )
+        for start in range(0, len(names), FILES_PER_TASK):
+            yield ('files', str(messages_dir), names[start:start + FILES_PER_TASK])
+
+        segments_dir = directory / 'segments'
+        if segments_dir.is_dir():
+            for path in sorted(segments_dir.iterdir()):
+                name = f"{prefix}segments/{path.name}"
+                if is_segment(path.name) and path.stat().st_size > done.get(name, 0):
+                    yield ('segment', str(messages_dir), name, done.get(name, 0))
+
+        archive_dir = directory / 'archive'
+        if archive_dir.is_dir():
+            for path in sorted(archive_dir.iterdir()):
+                name = f"{prefix}archive/{path.name}"
+                if is_archive(path.name) and name not in done:
+                    yield ('archive', str(messages_dir), name)
+
+
+def import_messages(db_path: Path, messages_dir: Path, workers: Optional[int] = None,
+                    batch_size: int = IMPORT_BATCH_SIZE) -> Dict[str, Any]:
+    """Load message files, segments and archive blocks into SQLite, resuming where the last run stopped
+
+    Messages keep the id they were synced with; an upsert keyed on the id
+    plus the per-source progress table, committed in the same transaction
+    as the rows, make an interrupted import safe to run again.
+
+    A source's progress stops at its first record with no commit yet, e.g.
+    one written but not pushed. The next run reads it again and fills in
+    the git_hash of rows it imported unsynced; 'rows' counts those too.
+
+    The search index is not updated row by row: its insert trigger is
+    dropped for the import and the index rebuilt in one pass afterwards.
+    """
+    db_path = Path(db_path)
+    messages_dir = Path(messages_dir)
+    initializer = DatabaseInitializer(db_path)
+    if not db_path.exists() and not initializer.init_database():
+        raise RuntimeError(f"Could not initialize {db_path}")
+
+    db = DatabaseManager(db_path)
+    start = time.perf_counter()
+    imported = synced = sources = 0
+    try:
+        with db.get_db() as conn:
+            conn.executescript(PROGRESS_SCHEMA + "DROP TRIGGER IF EXISTS messages_fts_insert;")
+            done = dict(conn.execute("SELECT source, offset FROM bulk_import_progress"))
+            commits = CommitLookup(messages_dir)
+
+            rows: List[Tuple] = []
+            progress: List[Tuple[str, int]] = []
+
+            def flush():
+                nonlocal imported
+                with conn:
+                    cursor = conn.executemany(
+                        """
+                        INSERT INTO messages (id, content, sender, timestamp, git_hash, is_synced, room_id)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)
+                        ON CONFLICT (id) DO UPDATE SET git_hash = excluded.git_hash, is_synced = 1
+                        WHERE messages.git_hash IS NULL AND excluded.git_hash IS NOT NULL
+                        """,
+                        rows
+                    )
+                    imported += cursor.rowcount
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO bulk_import_progress (source, offset) VALUES (?, ?)",
+                        progress
+                    )
+                rows.clear()
+                progress.clear()
+
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                for parsed in pool.map(_run_task, _import_tasks(messages_dir, done)):
+                    for source, offset, source_rows in parsed:
+                        room_id = room_of_source(source)
+                        resume_from = previous_end = done.get(source, 0)
+                        unresolved_at = None
+                        for message_id, content, sender, timestamp, end in source_rows:
+                            git_hash = commits.commit_for(source, end)
+                            synced += git_hash is not None
+                            rows.append((message_id, content, sender, timestamp, git_hash,
+                                         int(git_hash is not None), room_id))
+                            # A row without an id cannot be matched up later
+                            if git_hash is None and message_id is not None and unresolved_at is None:
+                                unresolved_at = previous_end
+                            previous_end = end
+                        if unresolved_at is None:
+                            progress.append((source, offset))
+                        elif unresolved_at > resume_from:
+                            progress.append((source, unresolved_at))
+                        sources += 1
+                    if len(rows) >= batch_size:
+                        flush()
+            flush()
+    finally:
+        db.close()
+        # Puts the trigger back and, finding it was missing, rebuilds the index
+        initializer.migrate_database()
+
+    elapsed = time.perf_counter() - start
+    return {
+        'sources': sources,
+        'rows': imported,
+        'synced': synced,
+        'seconds': round(elapsed, 3),
+        'rows_per_sec': round(imported / elapsed, 2) if elapsed > 0 else 0,
+    }
+
+
+def export_messages(db_path: Path, messages_dir: Path, storage_format: str = 'files',
+                    batch_size: int = EXPORT_BATCH_SIZE,
+                    segment_bytes: int = DEFAULT_SEGMENT_BYTES) -> Dict[str, Any]:
+    """Write SQLite rows out as message files or segments, oldest id first
+
+    Each message goes to its room's directory. Rows are read in id-keyed
+    batches, and the last id written is recorded after each batch so an
+    interrupted export continues from there.
+    """
+    if storage_format not in ('files', 'segments'):
+        raise ValueError(f"Unknown message storage format: {storage_format}")
+    messages_dir = Path(messages_dir)
+    messages_dir.mkdir(parents=True, exist_ok=True)
+    target = f"{messages_dir.resolve()}:{storage_format}"
+
+    db = DatabaseManager(db_path)
+    # One segment log per room, opened on the room's first message
+    logs: Optional[Dict[str, SegmentLog]] = {} if storage_format == 'segments' else None
+    start = time.perf_counter()
+    exported = 0
+    try:
+        with db.get_db() as conn:
+            conn.executescript(PROGRESS_SCHEMA)
+            row = conn.execute(
+                "SELECT last_id FROM bulk_export_progress WHERE target = ?", (target,)).fetchone()
+            last_id = row[0] if row else 0
+
+            while True:
+                batch = conn.execute(
+                    """
+                    SELECT id, content, timestamp, sender, room_id
+                    FROM messages
+                    WHERE id > ?
+                    ORDER BY id ASC
+                    LIMIT ?
+                    """,
+                    (last_id, batch_size)
+                ).fetchall()
+                if not batch:
+                    break
+                for message in batch:
+                    _export_message(messages_dir, logs, message, segment_bytes)
+                last_id = batch[-1]['id']
+                exported += len(batch)
+                with conn:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO bulk_export_progress (target, last_id) VALUES (?, ?)",
+                        (target, last_id)
+                    )
+                # A resumed export replays at most the batch after this point,
+                # which the segment logs then skip
+                for log in (logs or {}).values():
+                    log.settle()
+    finally:
+        for log in (logs or {}).values():
+            log.close()
+        db.close()
+
+    elapsed = time.perf_counter() - start
+    return {
+        'rows': exported,
+        'seconds': round(elapsed, 3),
+        'rows_per_sec': round(exported / elapsed, 2) if elapsed > 0 else 0,
+    }
+
+
+def _export_message(messages_dir: Path, logs: Optional[Dict[str, SegmentLog]], message,
+                    segment_bytes: int) -> None:
+    try:
+        timestamp = datetime.fromisoformat(message['timestamp'])
+    except (TypeError, ValueError):
+        timestamp = datetime.now()
+    message_data = {
+        'content': message['content'],
+        'sender': message['sender'],
+        'timestamp': timestamp.isoformat(),
+        'id': message['id'],
+    }
+    directory = room_dir(messages_dir, message['room_id'])
+    if logs is not None:
+        log = logs.get(message['room_id'])
+        if log is None:
+            log = logs[message['room_id']] = SegmentLog(directory / 'segments', max_segment_bytes=segment_bytes)
+        log.append(message_data)
+        return
+    directory.mkdir(parents=True, exist_ok=True)
+    with open(directory / message_filename(timestamp, message['id']), 'w') as f:
+        json.dump(message_data, f, indent=2)
+
+
+def main():
+    base_dir = Path(__file__).parent
+    parser = argparse.ArgumentParser(description="Bulk import and export between Git message files and SQLite")
+    parser.add_argument('--db', default=str(base_dir / 'database' / 'db.sqlite'))
+    parser.add_argument('--messages-dir', default=str(base_dir / 'messages'))
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    import_parser = subparsers.add_parser('import', help="rebuild the database from messages/")
+    import_parser.add_argument('--workers', type=int, default=None, help="parser processes (default: CPU count)")
+    import_parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE)
+
+    export_parser = subparsers.add_parser('export', help="write database rows out to messages/")
+    export_parser.add_argument('--format', choices=('files', 'segments'), default='files')
+    export_parser.add_argument('--batch-size', type=int, default=EXPORT_BATCH_SIZE)
+    export_parser.add_argument('--segment-bytes', type=int, default=DEFAULT_SEGMENT_BYTES)
+    args = parser.parse_args()
+
+    if args.command == 'import':
+        result = import_messages(Path(args.db), Path(args.messages_dir), args.workers, args.batch_size)
+        print(f"Imported {result['rows']} messages ({result['synced']} synced) from "
+              f"{result['sources']} source(s) in {result['seconds']}s: {result['rows_per_sec']} rows/sec")
+    else:
+        result = export_messages(Path(args.db), Path(args.messages_dir), args.format,
+                                 args.batch_size, args.segment_bytes)
+        print(f"Exported {result['rows']} messages in {result['seconds']}s: {result['rows_per_sec']} rows/sec")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -1,52 +1,444 @@
 #!/usr/bin/env python3
+import re
 import sqlite3
+import threading
 from pathlib import Path
 from contextlib import contextmanager
-from typing import List, Dict, Any, Generator
+from typing import List, Dict, Any, Generator, Iterable, Iterator, Optional, Tuple
+
+from metrics import REGISTRY, timed_function
+from rooms import DEFAULT_ROOM
+
+DB_QUERY_SECONDS = REGISTRY.histogram(
+    'chat_db_query_duration_seconds', 'Latency of DatabaseManager calls', ['method'])
+RECENT_CACHE_LOOKUPS = REGISTRY.counter(
+    'chat_recent_cache_lookups_total', 'get_messages calls answered from the recent-message cache', ['result'])
+
+# Applied to every pooled connection. WAL lets readers run alongside the
+# writer, and synchronous=NORMAL only fsyncs at checkpoints, which is still
+# crash-safe in WAL mode.
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -16000",   # 16 MB page cache
+    "PRAGMA mmap_size = 268435456", # 256 MB memory-mapped reads
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA busy_timeout = 5000",
+)
+
+# Prepared statements kept per connection; sqlite3 reuses one whenever the
+# same SQL text runs again on that connection
+STATEMENT_CACHE_SIZE = 256
+
+class UnknownCursorError(LookupError):
+    """Raised by get_messages when before_id names no stored message"""
+
+    def __init__(self, before_id: int):
+        super().__init__(f"No message with id {before_id}")
+        self.before_id = before_id
+
+
+class DuplicateMessageError(Exception):
+    """Raised by add_message when its client_id is already stored"""
+
+    def __init__(self, client_id: str, message_id: int):
+        super().__init__(f"client_id {client_id!r} is already message {message_id}")
+        self.client_id = client_id
+        self.message_id = message_id
+
+# Search result orders: best match first (bm25) or newest first
+SEARCH_ORDERS = ("rank", "recent")
+
+_SEARCH_TERM = re.compile(r'[^\s"]+\*?')
+
+
+def search_query(text: str) -> Optional[str]:
+    """Turn free text into an FTS5 MATCH expression, or None if it has no terms
+
+    Every word must match; a trailing * makes it a prefix search. Words are
+    quoted, so FTS5 operators and punctuation in user input are never parsed
+    as query syntax.
+    """
+    terms = []
+    for term in _SEARCH_TERM.findall(text):
+        prefix = term.endswith('*')
+        word = term.rstrip('*')
+        if word:
+            terms.append(f'"{word}"*' if prefix else f'"{word}"')
+    return ' '.join(terms) or None
+
 
 class DatabaseManager:
-    def __init__(self):
-        self.db_path = Path(__file__).parent / "db.sqlite"
+    def __init__(self, db_path: Optional[Path] = None, pooled: bool = True):
+        self.db_path = Path(db_path) if db_path else Path(__file__).parent / "db.sqlite"
+        # pooled=False keeps the original connection-per-call behaviour
+        self.pooled = pooled
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        # Optional in-memory copy of the newest messages; see attach_recent_cache
+        self.recent_cache = None
+        self._cache_lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open a tuned connection for the calling thread's pool slot"""
+        conn = sqlite3.connect(
+            self.db_path,
+            check_same_thread=False,  # close() may run on another thread
+            cached_statements=STATEMENT_CACHE_SIZE
+        )
+        conn.row_factory = sqlite3.Row
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        with self._connections_lock:
+            self._connections.append(conn)
+        return conn
 
     @contextmanager
     def get_db(self) -> Generator[sqlite3.Connection, None, None]:
         """Context manager for database connections"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row  # This enables column access by name
+        if not self.pooled:
+            conn = sqlite3.connect(self.db_path)
+            conn.row_factory = sqlite3.Row  # This enables column access by name
+            try:
+                yield conn
+            finally:
+                conn.close()
+            return
+
+        # One persistent connection per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
         try:
             yield conn
-        finally:
+        except Exception:
+            # Never hand a half-finished transaction to the next caller
+            conn.rollback()
+            raise
+
+    def close(self) -> None:
+        """Close every pooled connection"""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
             conn.close()
+        self._local = threading.local()
+
+    def attach_recent_cache(self, cache, snapshot_path: Optional[Path] = None) -> int:
+        """Serve the newest pages of get_messages from cache and keep it written through
+
+        Every write goes through this manager, so the cache never needs
+        invalidating. If snapshot_path holds a snapshot saved by
+        save_recent_snapshot against this exact database state, every room
+        it covered is restored from it; otherwise the default room is warmed
+        now and other rooms on their first post. Returns the number of
+        messages the cache starts with.
+        """
+        with self._cache_lock:
+            self.recent_cache = None
+            restored = cache.load(snapshot_path, self.data_fingerprint()) if snapshot_path else None
+            if restored is None:
+                cache.source = 'database'
+                warmed = cache.warm(self.get_messages(limit=cache.capacity))
+            else:
+                cache.source = 'snapshot'
+                warmed = restored
+            self.recent_cache = cache
+        return warmed
 
-    def add_message(self, content: str, sender: str) -> int:
-        """Add a new message to the database"""
+    def save_recent_snapshot(self, snapshot_path: Path) -> Optional[int]:
+        """Save the recent cache for the next start to restore; None if there is no cache
+
+        Call once nothing else writes to the database (on shutdown, after
+        the sync worker has stopped), or the snapshot will not validate.
+        """
+        with self._cache_lock:
+            if self.recent_cache is None:
+                return None
+            return self.recent_cache.save(snapshot_path, self.data_fingerprint())
+
+    @timed_function(DB_QUERY_SECONDS, 'data_fingerprint')
+    def data_fingerprint(self) -> Dict[str, Any]:
+        """Cheap summary of the messages table that changes with every insert and every sync
+
+        Each part is a B-tree endpoint lookup rather than a scan: the highest id
+        changes on every insert, and the oldest unsynced message (from the
+        partial unsynced index) and the highest synced id change whenever a
+        sync batch lands. Finding the highest synced id steps back over the
+        unsynced rows after it, so it costs at most the sync backlog. Rows
+        inserted with an explicit id below the highest, as bulk imports can,
+        go unnoticed.
+        """
+        with self.get_db() as conn:
+            # Separate statements: MAX(id) alone is a single b-tree seek
+            last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM messages").fetchone()[0]
+            synced = conn.execute(
+                "SELECT id FROM messages WHERE is_synced = 1 ORDER BY id DESC LIMIT 1").fetchone()
+            row = conn.execute(
+                "SELECT id FROM messages WHERE is_synced = 0 ORDER BY timestamp ASC, id ASC LIMIT 1").fetchone()
+        return {'last_id': last_id, 'last_synced_id': synced[0] if synced else None,
+                'oldest_unsynced_id': row[0] if row else None}
+
+    @timed_function(DB_QUERY_SECONDS, 'add_message')
+    def add_message(self, content: str, sender: str, timestamp: Optional[str] = None,
+                    client_id: Optional[str] = None, room_id: str = DEFAULT_ROOM) -> int:
+        """Add a new message to a room
+
+        Raises DuplicateMessageError if client_id was already used, in any room.
+        """
         with self.get_db() as conn:
             cursor = conn.cursor()
-            cursor.execute(
+            try:
+                cursor.execute(
+                    """
+                    INSERT INTO messages (content, sender, timestamp, client_id, room_id)
+                    VALUES (?, ?, COALESCE(?, CURRENT_TIMESTAMP), ?, ?)
+                    """,
+                    (content, sender, timestamp, client_id, room_id)
+                )
+            except sqlite3.IntegrityError:
+                existing = self.find_client_message(client_id) if client_id is not None else None
+                if existing is None:
+                    raise
+                raise DuplicateMessageError(client_id, existing)
+            message_id = cursor.lastrowid
+            if self.recent_cache is None:
+                conn.commit()
+                return message_id
+
+            if timestamp is None:
+                timestamp = conn.execute(
+                    "SELECT timestamp FROM messages WHERE id = ?", (message_id,)).fetchone()[0]
+            # Commit and cache under one lock so the cache sees writes in commit order
+            with self._cache_lock:
+                conn.commit()
+                if self.recent_cache.has_room(room_id):
+                    self.recent_cache.add({'id': message_id, 'content': content, 'timestamp': timestamp,
+                                           'git_hash': None, 'sender': sender, 'is_synced': 0,
+                                           'room_id': room_id}, room_id)
+                else:
+                    # First post to this room since startup; its older history is in SQLite
+                    self.recent_cache.warm(
+                        self._query_messages(conn, self.recent_cache.capacity, None, room_id), room_id)
+            return message_id
+
+    @timed_function(DB_QUERY_SECONDS, 'find_client_message')
+    def find_client_message(self, client_id: str) -> Optional[int]:
+        """Id of the message stored with client_id, if any"""
+        with self.get_db() as conn:
+            row = conn.execute("SELECT id FROM messages WHERE client_id = ?", (client_id,)).fetchone()
+            return row[0] if row else None
+
+    @timed_function(DB_QUERY_SECONDS, 'add_messages')
+    def add_messages(self, messages: Iterable[Tuple[str, str]], room_id: str = DEFAULT_ROOM) -> int:
+        """Add many (content, sender) messages to one room in one transaction"""
+        with self.get_db() as conn:
+            cursor = conn.cursor()
+            cursor.executemany(
                 """
-                INSERT INTO messages (content, sender)
-                VALUES (?, ?)
+                INSERT INTO messages (content, sender, room_id)
+                VALUES (?, ?, ?)
                 """,
-                (content, sender)
+                ((content, sender, room_id) for content, sender in messages)
             )
-            conn.commit()
-            return cursor.lastrowid
+            if self.recent_cache is None:
+                conn.commit()
+                return cursor.rowcount
+
+            # Bulk inserts do not report their ids; reload the newest rows instead
+            with self._cache_lock:
+                conn.commit()
+                self.recent_cache.warm(self._query_messages(conn, self.recent_cache.capacity, None, room_id),
+                                       room_id)
+            return cursor.rowcount
 
-    def get_messages(self, limit: int = 50) -> List[Dict[str, Any]]:
-        """Retrieve recent messages"""
+    @timed_function(DB_QUERY_SECONDS, 'get_messages')
+    def get_messages(self, limit: int = 50, before_id: Optional[int] = None,
+                     room_id: str = DEFAULT_ROOM) -> List[Dict[str, Any]]:
+        """Retrieve a room's recent messages, newest first, older than before_id if given
+
+        Raises UnknownCursorError if before_id is not a stored message.
+        """
+        cache = self.recent_cache
+        if cache is not None:
+            page = cache.get_page(limit, before_id, room_id)
+            RECENT_CACHE_LOOKUPS.inc('hit' if page is not None else 'miss')
+            if page is not None:
+                return page
+        with self.get_db() as conn:
+            if cache is not None and before_id is None and limit <= cache.capacity \
+                    and not cache.has_room(room_id):
+                # A room not buffered (never seen, or dropped as least recently
+                # used) is warmed by its first read, under the lock posts
+                # commit under so no write slips in between
+                with self._cache_lock:
+                    newest = self._query_messages(conn, cache.capacity, None, room_id)
+                    cache.warm(newest, room_id)
+                return newest[:limit]
+            return self._query_messages(conn, limit, before_id, room_id)
+
+    @staticmethod
+    def _query_messages(conn: sqlite3.Connection, limit: int, before_id: Optional[int],
+                        room_id: str = DEFAULT_ROOM) -> List[Dict[str, Any]]:
+        # Keyset pagination on (timestamp, id) is served straight from the
+        # room's range of idx_messages_room_timestamp_id, so deep pages cost
+        # the same as the first and other rooms are never read
+        columns = "SELECT id, content, timestamp, git_hash, sender, is_synced, room_id FROM messages"
+        if before_id is None:
+            rows = conn.execute(f"{columns} WHERE room_id = ? ORDER BY timestamp DESC, id DESC LIMIT ?",
+                                (room_id, limit)).fetchall()
+            return [dict(row) for row in rows]
+
+        cursor_row = conn.execute("SELECT timestamp FROM messages WHERE id = ?", (before_id,)).fetchone()
+        if cursor_row is None:
+            raise UnknownCursorError(before_id)
+        timestamp = cursor_row[0]
+        # Two seeks rather than one (timestamp, id) < (?, ?) bound, which
+        # SQLite only applies to timestamp: a page deep inside a run of equal
+        # timestamps would otherwise scan the whole run. Rows sharing the
+        # cursor's timestamp come first, then strictly older ones.
+        rows = conn.execute(f"{columns} WHERE room_id = ? AND timestamp = ? AND id < ? ORDER BY id DESC LIMIT ?",
+                            (room_id, timestamp, before_id, limit)).fetchall()
+        if len(rows) < limit:
+            rows += conn.execute(
+                f"{columns} WHERE room_id = ? AND timestamp < ? ORDER BY timestamp DESC, id DESC LIMIT ?",
+                (room_id, timestamp, limit - len(rows))).fetchall()
+        return [dict(row) for row in rows]
+
+    @timed_function(DB_QUERY_SECONDS, 'search_messages')
+    def search_messages(self, query: str, limit: int = 50, sender: Optional[str] = None,
+                        since: Optional[str] = None, until: Optional[str] = None, order: str = "rank",
+                        after: Optional[Tuple[float, int]] = None,
+                        room_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Messages matching query through the full-text index
+
+        order="rank" returns the best matches first (bm25, ties newest first),
+        order="recent" newest first. Each row carries its rank (None for
+        recent); pass the (rank, id) of the last row of a page as after to
+        get the next one. since and until bound the timestamp, inclusive and
+        exclusive; room_id limits the search to one room.
+        """
+        match = search_query(query)
+        if match is None:
+            return []
+        if order not in SEARCH_ORDERS:
+            raise ValueError(f"order must be one of {SEARCH_ORDERS}")
+
+        conditions = []
+        params: List[Any] = []
+        if room_id is not None:
+            conditions.append("m.room_id = ?")
+            params.append(room_id)
+        if sender is not None:
+            conditions.append("m.sender = ?")
+            params.append(sender)
+        if since is not None:
+            conditions.append("m.timestamp >= ?")
+            params.append(since)
+        if until is not None:
+            conditions.append("m.timestamp < ?")
+            params.append(until)
+
+        if order == "rank":
+            # bm25 needs every match scored before the best can be picked;
+            # FTS5 only provides rank on its own cursor, hence the subquery
+            if after is not None:
+                conditions.append("(f.rank > ? OR (f.rank = ? AND m.id < ?))")
+                params.extend((after[0], after[0], after[1]))
+            sql = f"""
+                SELECT m.id, m.content, m.timestamp, m.git_hash, m.sender, m.is_synced, m.room_id, f.rank
+                FROM (SELECT rowid, rank FROM messages_fts WHERE messages_fts MATCH ?) AS f
+                JOIN messages AS m ON m.id = f.rowid
+                {"WHERE " + " AND ".join(conditions) if conditions else ""}
+                ORDER BY f.rank ASC, m.id DESC
+                LIMIT ?
+                """
+        else:
+            # FTS5 walks its doclists in descending rowid order itself, so the
+            # scan stops as soon as the page is full
+            if after is not None:
+                conditions.append("messages_fts.rowid < ?")
+                params.append(after[1])
+            sql = f"""
+                SELECT m.id, m.content, m.timestamp, m.git_hash, m.sender, m.is_synced, m.room_id, NULL AS rank
+                FROM messages_fts
+                JOIN messages AS m ON m.id = messages_fts.rowid
+                WHERE {" AND ".join(["messages_fts MATCH ?"] + conditions)}
+                ORDER BY messages_fts.rowid DESC
+                LIMIT ?
+                """
+        with self.get_db() as conn:
+            cursor = conn.execute(sql, [match] + params + [limit])
+            return [dict(row) for row in cursor.fetchall()]
+
+    @timed_function(DB_QUERY_SECONDS, 'get_messages_after')
+    def get_messages_after(self, after_id: int, limit: int = 100,
+                           room_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Retrieve messages newer than after_id, oldest first, from one room or all of them"""
         with self.get_db() as conn:
             cursor = conn.cursor()
             cursor.execute(
-                """
-                SELECT id, content, timestamp, git_hash, sender, is_synced
+                f"""
+                SELECT id, content, timestamp, git_hash, sender, is_synced, room_id
                 FROM messages
-                ORDER BY timestamp DESC
+                WHERE id > ?{" AND room_id = ?" if room_id is not None else ""}
+                ORDER BY id ASC
                 LIMIT ?
                 """,
-                (limit,)
+                (after_id, limit) if room_id is None else (after_id, room_id, limit)
             )
             return [dict(row) for row in cursor.fetchall()]
 
+    def iter_messages(self, after_id: int = 0, batch_size: int = 500) -> Iterator[Dict[str, Any]]:
+        """Yield every message newer than after_id, oldest first, straight off the cursor
+
+        Rows are fetched batch_size at a time, so memory stays flat however
+        many there are. The generator keeps a read transaction open until it
+        is exhausted or closed, so consume it promptly.
+        """
+        # A connection of its own: the pooled one may be committed by other
+        # calls on this thread while the generator is suspended
+        conn = sqlite3.connect(self.db_path, cached_statements=STATEMENT_CACHE_SIZE)
+        conn.row_factory = sqlite3.Row
+        try:
+            for pragma in CONNECTION_PRAGMAS:
+                conn.execute(pragma)
+            cursor = conn.execute(
+                """
+                SELECT id, content, timestamp, git_hash, sender, is_synced, room_id
+                FROM messages
+                WHERE id > ?
+                ORDER BY id ASC
+                """,
+                (after_id,)
+            )
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield dict(row)
+        finally:
+            conn.close()
+
+    def ping(self) -> bool:
+        """True if the messages table can be read"""
+        try:
+            with self.get_db() as conn:
+                conn.execute("SELECT 1 FROM messages LIMIT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    @timed_function(DB_QUERY_SECONDS, 'last_message_id')
+    def last_message_id(self) -> int:
+        """Highest message id stored so far, 0 for an empty table"""
+        with self.get_db() as conn:
+            return conn.execute("SELECT COALESCE(MAX(id), 0) FROM messages").fetchone()[0]
+
+    @timed_function(DB_QUERY_SECONDS, 'update_git_hash')
     def update_git_hash(self, message_id: int, git_hash: str) -> bool:
         """Update the git hash for a message after syncing"""
         with self.get_db() as conn:
@@ -60,18 +452,49 @@ class DatabaseManager:
                 (git_hash, message_id)
             )
             conn.commit()
+            if self.recent_cache is not None:
+                self.recent_cache.mark_synced([message_id], git_hash)
             return cursor.rowcount > 0
 
-    def get_unsynced_messages(self) -> List[Dict[str, Any]]:
-        """Get messages that haven't been synced to Git"""
+    @timed_function(DB_QUERY_SECONDS, 'update_git_hashes')
+    def update_git_hashes(self, message_ids: List[int], git_hash: str) -> int:
+        """Mark a batch of messages as synced to one commit in a single transaction"""
+        with self.get_db() as conn:
+            cursor = conn.cursor()
+            cursor.executemany(
+                """
+                UPDATE messages
+                SET git_hash = ?, is_synced = 1
+                WHERE id = ?
+                """,
+                [(git_hash, message_id) for message_id in message_ids]
+            )
+            conn.commit()
+            if self.recent_cache is not None:
+                self.recent_cache.mark_synced(message_ids, git_hash)
+            return cursor.rowcount
+
+    @timed_function(DB_QUERY_SECONDS, 'get_unsynced_messages')
+    def get_unsynced_messages(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Get messages that haven't been synced to Git, oldest first"""
         with self.get_db() as conn:
             cursor = conn.cursor()
             cursor.execute(
                 """
-                SELECT id, content, timestamp, sender
+                SELECT id, content, timestamp, sender, room_id
                 FROM messages
                 WHERE is_synced = 0
-                ORDER BY timestamp ASC
-                """
+                ORDER BY timestamp ASC, id ASC
+                LIMIT ?
+                """,
+                (limit if limit is not None else -1,)
             )
             return [dict(row) for row in cursor.fetchall()]
+
+    @timed_function(DB_QUERY_SECONDS, 'count_unsynced_messages')
+    def count_unsynced_messages(self) -> int:
+        """Count messages still waiting to be synced to Git"""
+        with self.get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT COUNT(*) FROM messages WHERE is_synced = 0")
+            return cursor.fetchone()[0]
@@ -2,15 +2,24 @@
 import sqlite3
 import os
 from pathlib import Path
+from typing import Optional
+
+# Columns added to tables after their first release. CREATE TABLE IF NOT
+# EXISTS leaves an older table as it is, so migration adds these before
+# schema.sql runs (its indexes may refer to them).
+ADDED_COLUMNS = (
+    ("messages", "client_id", "TEXT"),
+    ("messages", "room_id", "TEXT NOT NULL DEFAULT 'default'"),
+)
 
 class DatabaseInitializer:
-    def __init__(self):
+    def __init__(self, db_path: Optional[Path] = None):
         # Ensure database directory exists
         self.db_dir = Path(__file__).parent
         self.db_dir.mkdir(exist_ok=True)
         
         # Database file path
-        self.db_path = self.db_dir / "db.sqlite"
+        self.db_path = Path(db_path) if db_path else self.db_dir / "db.sqlite"
         
         # Schema file path
         self.schema_path = self.db_dir / "schema.sql"
@@ -46,6 +55,70 @@ class DatabaseInitializer:
             print(f"Database error: {e}")
             return False
         
+    def migrate_database(self):
+        """Bring an existing database up to date with the schema"""
+        print(f"Migrating database at {self.db_path}")
+        # Every statement in schema.sql is idempotent, so re-running it adds
+        # whatever tables and indexes an older database is missing
+        try:
+            with open(self.schema_path, 'r') as f:
+                schema = f.read()
+        except FileNotFoundError:
+            print("Error: schema.sql not found!")
+            return False
+
+        try:
+            conn = sqlite3.connect(self.db_path)
+            # An index without its insert trigger (bulk imports drop it) is stale too
+            had_search_index = (self._exists(conn, "table", "messages_fts")
+                                and self._exists(conn, "trigger", "messages_fts_insert"))
+            self._add_columns(conn)
+            conn.executescript(schema)
+            conn.commit()
+            conn.close()
+        except sqlite3.Error as e:
+            print(f"Database error: {e}")
+            return False
+
+        # A search index created just now is empty; fill it from existing history
+        if not had_search_index and not self.rebuild_search_index():
+            return False
+        print("Database migrated successfully!")
+        return True
+
+    def rebuild_search_index(self):
+        """Rebuild the full-text index from the messages table in one pass
+
+        Much faster than indexing a large history row by row: FTS5 reads the
+        whole content table, then the index is merged into a single segment.
+        """
+        print(f"Rebuilding search index at {self.db_path}")
+        try:
+            conn = sqlite3.connect(self.db_path)
+            conn.execute("INSERT INTO messages_fts (messages_fts) VALUES ('rebuild')")
+            conn.execute("INSERT INTO messages_fts (messages_fts) VALUES ('optimize')")
+            conn.commit()
+            conn.close()
+            return True
+        except sqlite3.Error as e:
+            print(f"Database error: {e}")
+            return False
+
+    @staticmethod
+    def _add_columns(conn):
+        for table, column, definition in ADDED_COLUMNS:
+            columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+            # No columns means no table yet; schema.sql creates it complete
+            if columns and column not in columns:
+                print(f"Adding {table}.{column}")
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+    @staticmethod
+    def _exists(conn, kind, name):
+        return conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = ? AND name = ?", (kind, name)
+        ).fetchone() is not None
+
     def reset_database(self):
         """Reset the database by removing it and reinitializing"""
         try:
@@ -66,8 +139,7 @@ def main():
         if response.lower() == 'y':
             success = initializer.reset_database()
         else:
-            print("Database initialization cancelled.")
-            success = True
+            success = initializer.migrate_database()
     else:
         success = initializer.init_database()
     
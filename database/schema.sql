@@ -5,5 +5,50 @@ CREATE TABLE IF NOT EXISTS messages (
     timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
     git_hash TEXT,  -- Store the Git commit hash for version tracking
     sender TEXT NOT NULL,
-    is_synced BOOLEAN DEFAULT 0  -- Track if message has been synced to Git
+    is_synced BOOLEAN DEFAULT 0,  -- Track if message has been synced to Git
+    client_id TEXT,  -- Idempotency key chosen by the posting client, if any
+    room_id TEXT NOT NULL DEFAULT 'default'  -- Room the message was posted to (rooms.DEFAULT_ROOM)
 );
+
+-- Newest-first history pages of one room: WHERE room_id = ? ORDER BY
+-- timestamp DESC, id DESC with a (timestamp, id) keyset cursor. A page
+-- only ever reads its own room's part of the index.
+CREATE INDEX IF NOT EXISTS idx_messages_room_timestamp_id ON messages (room_id, timestamp, id);
+
+-- Superseded by idx_messages_room_timestamp_id: history is always read per room
+DROP INDEX IF EXISTS idx_messages_timestamp_id;
+
+-- Stream replay of one room: WHERE room_id = ? AND id > ? ORDER BY id,
+-- reading only that room's rows instead of every newer row
+CREATE INDEX IF NOT EXISTS idx_messages_room_id ON messages (room_id, id);
+
+-- Sync queue: partial index holding only rows still waiting for Git
+CREATE INDEX IF NOT EXISTS idx_messages_unsynced ON messages (timestamp, id) WHERE is_synced = 0;
+
+-- A client retrying a post with the same client_id never creates a second row
+CREATE UNIQUE INDEX IF NOT EXISTS idx_messages_client_id ON messages (client_id) WHERE client_id IS NOT NULL;
+
+-- Full-text search over message content. External-content FTS5 table: it
+-- stores only the index and reads rows back from messages by id.
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+    content,
+    content = 'messages',
+    content_rowid = 'id',
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+);
+
+-- Keep the index in step with messages. Sync only touches git_hash and
+-- is_synced, so the update trigger is limited to content changes.
+CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts (rowid, content) VALUES (new.id, new.content);
+END;
+
+CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+END;
+
+CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF content ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+    INSERT INTO messages_fts (rowid, content) VALUES (new.id, new.content);
+END;
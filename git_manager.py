@@ -2,27 +2,154 @@
 import os
 import json
 import subprocess
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime
 from pathlib import Path
 from typing import Optional, Dict, List
-import requests
 from dotenv import load_dotenv
 
+from git_objects import FastCommitWriter
+from history_index import HistoryIndex, TimeBound
+from metrics import REGISTRY, timed
+from rooms import DEFAULT_ROOM, room_dir
+from segment_log import DEFAULT_SEGMENT_BYTES, SegmentLog
+
 # Load environment variables
 load_dotenv()
 
+# How new messages are stored: "files" (one JSON file each) or "segments"
+# (rolling append-only JSON Lines segments under messages/segments/)
+MESSAGE_STORAGE = os.getenv('MESSAGE_STORAGE', 'files')
+SEGMENT_BYTES = int(os.getenv('SEGMENT_BYTES', str(DEFAULT_SEGMENT_BYTES)))
+
+# How commits are made: "cli" (git add + git commit) or "fast" (objects
+# written in process, index untouched)
+GIT_COMMIT_MODE = os.getenv('GIT_COMMIT_MODE', 'cli')
+# Seconds between pushes in fast mode; 0 pushes after every commit
+GIT_PUSH_INTERVAL = float(os.getenv('GIT_PUSH_INTERVAL', '0'))
+# Rooms whose segment log and history index are kept open at once; the least
+# recently used is closed past this and reopened on its next use
+MAX_OPEN_ROOMS = int(os.getenv('MAX_OPEN_ROOMS', '64'))
+
+GIT_COMMAND_SECONDS = REGISTRY.histogram(
+    'chat_git_command_duration_seconds', 'Latency of git subprocesses by stage', ['command'])
+GIT_COMMAND_FAILURES = REGISTRY.counter(
+    'chat_git_command_failures_total', 'Git subprocesses that exited non-zero', ['command'])
+
+def message_filename(timestamp: datetime, message_id: Optional[int] = None) -> str:
+    """File name for one message in the per-file storage format"""
+    base_filename = timestamp.strftime('%Y%m%d_%H%M%S')
+
+    # Add microseconds to ensure unique filenames
+    filename = f"message_{base_filename}_{timestamp.microsecond:06d}"
+    # Database messages carry their id so a retried sync rewrites the
+    # same file instead of creating a duplicate
+    if message_id is not None:
+        filename += f"_{message_id}"
+    return f"{filename}.json"
+
+def commit_message(filepaths: List[str]) -> str:
+    """Commit message for a batch of message files (several may share a segment)"""
+    if len(filepaths) == 1:
+        return f"Add message: {Path(filepaths[0]).name}"
+    file_list = "\n".join(Path(path).name for path in dict.fromkeys(filepaths))
+    return f"Add {len(filepaths)} messages\n\n{file_list}"
+
 class GitManager:
-    def __init__(self, repo_url: str):
+    def __init__(self, repo_url: str, base_path: Optional[Path] = None, branch: str = 'master',
+                 storage_format: Optional[str] = None, segment_bytes: int = SEGMENT_BYTES,
+                 commit_mode: Optional[str] = None, push_interval: Optional[float] = None,
+                 max_open_rooms: int = MAX_OPEN_ROOMS):
         self.repo_url = repo_url
+        self.branch = branch
+        self.storage_format = storage_format or MESSAGE_STORAGE
+        if self.storage_format not in ('files', 'segments'):
+            raise ValueError(f"Unknown message storage format: {self.storage_format}")
+        self.segment_bytes = segment_bytes
+        self.commit_mode = commit_mode or GIT_COMMIT_MODE
+        if self.commit_mode not in ('cli', 'fast'):
+            raise ValueError(f"Unknown git commit mode: {self.commit_mode}")
+        self.push_interval = GIT_PUSH_INTERVAL if push_interval is None else push_interval
         self.github_token = os.getenv('GITHUB_TOKEN')
-        if not self.github_token:
+        # Only GitHub remotes are cloned with the token; a repository with a
+        # local origin (tests, benchmarks) works without one
+        if not self.github_token and 'github.com/' in repo_url:
             raise ValueError("GitHub token not found in environment variables")
         
         # Setup repository paths
-        self.base_path = Path(__file__).parent
+        self.base_path = Path(base_path) if base_path else Path(__file__).parent
         self.messages_dir = self.base_path / 'messages'
         self.messages_dir.mkdir(exist_ok=True)
 
+        # Incremental index of parsed message files, kept out of messages/;
+        # other rooms each have their own under .history_index_rooms/
+        self.history_index_path = self.base_path / '.history_index.sqlite'
+        # Both least recently used first, each bounded by max_open_rooms
+        self.max_open_rooms = max(1, max_open_rooms)
+        self._history_indexes: 'OrderedDict[str, HistoryIndex]' = OrderedDict()
+        self._segment_logs: 'OrderedDict[str, SegmentLog]' = OrderedDict()
+
+        # Fast commit path state; pushes trail commits by up to push_interval
+        self._commit_writer: Optional[FastCommitWriter] = None
+        # None until the first push_pending() compares the branch with origin,
+        # since commits a previous run held back exist only in the repository
+        self._unpushed: Optional[bool] = None
+        # The interval runs from startup, so the first commit waits like any other
+        self._last_push = time.monotonic()
+        # Held while git writes the index or moves the branch. AsyncGitManager
+        # takes it too, so a git lock file appearing while either runs a
+        # command belongs to that command.
+        self.write_lock = threading.Lock()
+
+    @property
+    def segment_log(self) -> SegmentLog:
+        """The default room's segment log, opened on first use"""
+        return self.room_segment_log(DEFAULT_ROOM)
+
+    def room_dir(self, room_id: str) -> Path:
+        """Directory of a room's messages: messages/ for the default room, messages/rooms/<room_id>/ otherwise"""
+        return room_dir(self.messages_dir, room_id)
+
+    def room_segment_log(self, room_id: str) -> SegmentLog:
+        """A room's segment log, opened on first use"""
+        log = self._segment_logs.get(room_id)
+        if log is None:
+            # An evicted log reloads its unsettled ids when reopened, so a
+            # retried batch is still skipped
+            log = SegmentLog(self.room_dir(room_id) / 'segments', max_segment_bytes=self.segment_bytes)
+            self._keep_open(self._segment_logs, room_id, log)
+        else:
+            self._segment_logs.move_to_end(room_id)
+        return log
+
+    def _room_history_index(self, room_id: str) -> HistoryIndex:
+        index = self._history_indexes.get(room_id)
+        if index is None:
+            index_path = self.history_index_path if room_id == DEFAULT_ROOM else \
+                self.base_path / '.history_index_rooms' / f"{room_id}.sqlite"
+            index_path.parent.mkdir(exist_ok=True)
+            index = HistoryIndex(self.room_dir(room_id), index_path)
+            self._keep_open(self._history_indexes, room_id, index)
+        else:
+            self._history_indexes.move_to_end(room_id)
+        return index
+
+    def _keep_open(self, open_rooms: 'OrderedDict', room_id: str, handle) -> None:
+        """Add a room's log or index as most recent, closing the least recent past max_open_rooms"""
+        open_rooms[room_id] = handle
+        while len(open_rooms) > self.max_open_rooms:
+            _, evicted = open_rooms.popitem(last=False)
+            evicted.close()
+
+    @property
+    def commit_writer(self) -> FastCommitWriter:
+        """The in-process commit writer, created on first use"""
+        if self._commit_writer is None:
+            self._commit_writer = FastCommitWriter(self.base_path, self.branch)
+        return self._commit_writer
+
     def clone_repository(self) -> bool:
         """Clone the repository if it doesn't exist"""
         try:
@@ -35,14 +162,16 @@ class GitManager:
             clone_url = f"https://{self.github_token}@github.com/{self.repo_url.split('github.com/')[1]}"
             
             # Clone the repository
-            result = subprocess.run(
-                ['git', 'clone', clone_url, '.'],
-                cwd=str(self.base_path),
-                capture_output=True,
-                text=True
-            )
+            with timed(GIT_COMMAND_SECONDS, 'clone'):
+                result = subprocess.run(
+                    ['git', 'clone', clone_url, '.'],
+                    cwd=str(self.base_path),
+                    capture_output=True,
+                    text=True
+                )
             
             if result.returncode != 0:
+                GIT_COMMAND_FAILURES.inc('clone')
                 print(f"Error cloning repository: {result.stderr}")
                 return False
                 
@@ -52,16 +181,17 @@ class GitManager:
             print(f"Error in clone_repository: {e}")
             return False
 
-    def create_message_file(self, content: str, sender: str) -> Optional[str]:
-        """Create a new file containing the message"""
+    def create_message_file(self, content: str, sender: str,
+                            timestamp: Optional[datetime] = None,
+                            message_id: Optional[int] = None,
+                            room_id: str = DEFAULT_ROOM) -> Optional[str]:
+        """Create a new file containing the message, in its room's directory"""
         try:
             # Create timestamp and filename
-            timestamp = datetime.now()
-            base_filename = timestamp.strftime('%Y%m%d_%H%M%S')
-            
-            # Add microseconds to ensure unique filenames
-            filename = f"message_{base_filename}_{timestamp.microsecond:06d}.json"
-            filepath = self.messages_dir / filename
+            timestamp = timestamp or datetime.now()
+            directory = self.room_dir(room_id)
+            directory.mkdir(parents=True, exist_ok=True)
+            filepath = directory / message_filename(timestamp, message_id)
 
             # Create message data
             message_data = {
@@ -69,6 +199,13 @@ class GitManager:
                 'sender': sender,
                 'timestamp': timestamp.isoformat()
             }
+            if message_id is not None:
+                message_data['id'] = message_id
+
+            # Segment storage appends to the active segment; that segment is
+            # the file to push
+            if self.storage_format == 'segments':
+                return self.room_segment_log(room_id).append(message_data)
 
             # Write message to file
             with open(filepath, 'w') as f:
@@ -80,76 +217,153 @@ class GitManager:
             print(f"Error creating message file: {e}")
             return None
 
-    def push_message(self, filepath: str) -> Optional[str]:
-        """Push a message file to GitHub and return the commit hash"""
-        try:
-            # Add the file
-            add_result = subprocess.run(
-                ['git', 'add', filepath],
+    def _run_git(self, args: List[str], error_label: str) -> str:
+        """Run a git command in the repository and return its stdout"""
+        with timed(GIT_COMMAND_SECONDS, args[0]):
+            result = subprocess.run(
+                ['git'] + args,
                 cwd=str(self.base_path),
                 capture_output=True,
                 text=True
             )
-            if add_result.returncode != 0:
-                raise Exception(f"Git add failed: {add_result.stderr}")
+        if result.returncode != 0:
+            GIT_COMMAND_FAILURES.inc(args[0])
+            raise Exception(f"{error_label}: {result.stderr}")
+        return result.stdout
 
-            # Create commit
-            commit_result = subprocess.run(
-                ['git', 'commit', '-m', f"Add message: {Path(filepath).name}"],
+    def _has_staged_changes(self, filepaths: List[str]) -> bool:
+        """Check whether any of the given files differ from HEAD in the index"""
+        with timed(GIT_COMMAND_SECONDS, 'diff'):
+            result = subprocess.run(
+                ['git', 'diff', '--cached', '--quiet', '--'] + list(filepaths),
                 cwd=str(self.base_path),
                 capture_output=True,
                 text=True
             )
-            if commit_result.returncode != 0:
-                raise Exception(f"Git commit failed: {commit_result.stderr}")
+        return result.returncode != 0
 
-            # Push changes
-            push_result = subprocess.run(
-                ['git', 'push', 'origin', 'master'],
-                cwd=str(self.base_path),
-                capture_output=True,
-                text=True
-            )
-            if push_result.returncode != 0:
-                raise Exception(f"Git push failed: {push_result.stderr}")
+    def push_message(self, filepath: str) -> Optional[str]:
+        """Push a message file to GitHub and return the commit hash"""
+        return self.push_messages([filepath])
 
-            # Get commit hash
-            hash_result = subprocess.run(
-                ['git', 'rev-parse', 'HEAD'],
-                cwd=str(self.base_path),
-                capture_output=True,
-                text=True
-            )
-            if hash_result.returncode != 0:
-                raise Exception(f"Failed to get commit hash: {hash_result.stderr}")
+    def push_messages(self, filepaths: List[str]) -> Optional[str]:
+        """Push several message files as a single commit and return the commit hash"""
+        with self.write_lock:
+            try:
+                if not filepaths:
+                    raise Exception("No message files to push")
+
+                # Add the files; with segment storage many messages share one file
+                unique_paths = list(dict.fromkeys(filepaths))
+                if self.commit_mode == 'fast':
+                    return self._fast_commit(filepaths, unique_paths)
+
+                self._run_git(['add', '--'] + unique_paths, "Git add failed")
 
-            return hash_result.stdout.strip()
+                # Create commit, unless an earlier attempt already committed these
+                # files and only its push failed
+                if self._has_staged_changes(unique_paths):
+                    self._run_git(['commit', '-m', commit_message(filepaths)], "Git commit failed")
+
+                # Push changes
+                self._run_git(['push', 'origin', self.branch], "Git push failed")
+
+                # Get commit hash
+                return self._run_git(['rev-parse', 'HEAD'], "Failed to get commit hash").strip()
+
+            except Exception as e:
+                print(f"Error in push_message: {e}")
+                return None
+
+    def push_pending(self, force: bool = False) -> bool:
+        """Push fast-path commits not yet on the remote once push_interval has passed
+
+        Returns False only when a push was attempted and failed. The first
+        call also pushes any commits left behind by a previous run, at once.
+        """
+        with self.write_lock:
+            return self._push_pending(force)
+
+    def _push_pending(self, force: bool) -> bool:
+        if self._unpushed is None:
+            self._unpushed = self._ahead_of_origin()
+            force = force or self._unpushed
+        if not self._unpushed:
+            return True
+        if not force and time.monotonic() - self._last_push < self.push_interval:
+            return True
+        try:
+            self._run_git(['push', 'origin', self.branch], "Git push failed")
+            # Bring the index level with HEAD so `git status` and the CLI
+            # commit path see the files the fast path committed
+            self._run_git(['reset', '-q'], "Git reset failed")
+        except Exception as e:
+            print(f"Error in push_pending: {e}")
+            return False
+        self._unpushed = False
+        self._last_push = time.monotonic()
+        return True
 
+    def _ahead_of_origin(self) -> bool:
+        """Whether the branch has commits origin has not seen, as of the last push or fetch"""
+        try:
+            ahead = self._run_git(['rev-list', '--count', f"origin/{self.branch}..{self.branch}"],
+                                  "Failed to compare with origin")
         except Exception as e:
-            print(f"Error in push_message: {e}")
+            print(f"Error in push_pending: {e}")
+            return False
+        return int(ahead.strip() or 0) > 0
+
+    def _fast_commit(self, filepaths: List[str], unique_paths: List[str]) -> Optional[str]:
+        """Commit through FastCommitWriter and push according to push_interval"""
+        with timed(GIT_COMMAND_SECONDS, 'fast-commit'):
+            previous = self.commit_writer.read_ref()
+            commit_hash = self.commit_writer.commit_files(unique_paths, commit_message(filepaths))
+        if commit_hash != previous:
+            self._unpushed = True
+
+        # Without an interval the push is part of the commit, as in CLI mode,
+        # and a failed push fails the batch so it is retried
+        if not self._push_pending(False) and self.push_interval <= 0:
             return None
+        return commit_hash
 
-    def get_message_history(self) -> List[Dict]:
-        """Get the history of messages from the repository"""
-        messages = []
+    def settle_segments(self) -> None:
+        """Let the segment logs forget the ids appended so far
+
+        Call it once the commit is recorded wherever the rows come from, not
+        just pushed: until then a retried batch appends nothing twice, even
+        after a roll.
+        """
+        for log in self._segment_logs.values():
+            log.settle()
+
+    def close(self) -> None:
+        """Release the commit writer's reader process and the open log files"""
+        if self._commit_writer is not None:
+            self._commit_writer.close()
+            self._commit_writer = None
+        for log in self._segment_logs.values():
+            log.close()
+        self._segment_logs.clear()
+        for index in self._history_indexes.values():
+            index.close()
+        self._history_indexes.clear()
+
+    def get_message_history(self, limit: Optional[int] = None, offset: int = 0,
+                            since: TimeBound = None, until: TimeBound = None,
+                            room_id: str = DEFAULT_ROOM) -> List[Dict]:
+        """Get the history of one room's messages from the repository"""
         try:
-            # Ensure the messages directory exists
-            self.messages_dir.mkdir(exist_ok=True)
-            
-            # Get all message files
-            message_files = sorted(self.messages_dir.glob('message_*.json'))
-            
-            for file in message_files:
-                try:
-                    with open(file, 'r') as f:
-                        message_data = json.load(f)
-                        messages.append(message_data)
-                except (json.JSONDecodeError, IOError) as e:
-                    print(f"Error reading message file {file}: {e}")
-                    continue
-                    
-            # Sort messages by timestamp
-            return sorted(messages, key=lambda x: x['timestamp'])
+            # Ensure the room's directory exists
+            self.room_dir(room_id).mkdir(parents=True, exist_ok=True)
+
+            # Only the room's files added or changed since the last call get parsed
+            history_index = self._room_history_index(room_id)
+            history_index.refresh()
+
+            # Sorted by timestamp
+            return history_index.query(limit=limit, offset=offset, since=since, until=until)
             
         except Exception as e:
             print(f"Error getting message history: {e}")
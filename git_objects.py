@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+import hashlib
+import os
+import subprocess
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+TREE_MODE = b'40000'
+FILE_MODE = b'100644'
+
+# Parsed trees kept in memory; the root and messages/ trees of the last few
+# commits are all a steady stream of appends ever needs
+TREE_CACHE_SIZE = 32
+
+TreeEntries = Dict[bytes, Tuple[bytes, str]]
+
+
+class GitObjectError(Exception):
+    """Raised when the repository cannot be read or its branch cannot be updated"""
+
+
+class FastCommitWriter:
+    """Commits files by writing git objects directly, without the index
+
+    Blobs, trees and commits are written as loose objects from this process
+    and the branch ref is moved with git's own lock-file protocol. Existing
+    trees are read through one long-lived `git cat-file --batch` process and
+    cached, so a commit costs no forks at all once the cache is warm.
+
+    The working-tree index is left alone: it falls behind HEAD until the
+    caller runs `git reset` (GitManager does so after each push).
+    """
+
+    def __init__(self, repo_path: Path, branch: str = 'master'):
+        self.repo_path = Path(repo_path).resolve()
+        self.branch = branch
+        self.ref = f"refs/heads/{branch}"
+        self.git_dir = self._find_git_dir()
+        self.objects_dir = self.git_dir / 'objects'
+        self._lock = threading.Lock()
+        self._reader: Optional[subprocess.Popen] = None
+        self._trees: 'OrderedDict[str, TreeEntries]' = OrderedDict()
+        self._commit_trees: Dict[str, str] = {}
+        self._author: Optional[bytes] = None
+        self._committer: Optional[bytes] = None
+        self.commits_written = 0
+
+    def commit_files(self, filepaths: Iterable[str], message: str) -> str:
+        """Commit the current contents of the given files on top of the branch
+
+        Returns the new commit hash, or the current one when the files are
+        already committed with the same contents.
+        """
+        with self._lock:
+            updates: Dict[Tuple[str, ...], str] = {}
+            for filepath in filepaths:
+                path = Path(filepath).resolve()
+                try:
+                    parts = path.relative_to(self.repo_path).parts
+                except ValueError:
+                    raise GitObjectError(f"{filepath} is outside the repository")
+                updates[parts] = self.write_object('blob', path.read_bytes())
+            if not updates:
+                raise GitObjectError("No files to commit")
+
+            parent = self.read_ref()
+            parent_tree = self._commit_tree(parent) if parent else None
+            tree = self._update_tree(parent_tree, updates)
+            if tree == parent_tree:
+                return parent
+
+            commit = self.write_object('commit', self._commit_body(tree, parent, message))
+            self._update_ref(parent, commit, message)
+            self._commit_trees = {commit: tree}
+            self.commits_written += 1
+            return commit
+
+    def write_object(self, object_type: str, data: bytes) -> str:
+        """Store data as a loose object and return its hash"""
+        raw = f"{object_type} {len(data)}\0".encode('ascii') + data
+        sha = hashlib.sha1(raw).hexdigest()
+        path = self.objects_dir / sha[:2] / sha[2:]
+        if path.exists():
+            return sha
+        path.parent.mkdir(exist_ok=True)
+        # Write beside the final name and rename, as git does, so readers
+        # never see a partial object
+        tmp = path.parent / f"tmp_obj_{os.getpid()}_{threading.get_ident()}"
+        with open(tmp, 'wb') as f:
+            f.write(zlib.compress(raw))
+        os.replace(tmp, path)
+        return sha
+
+    def read_object(self, sha: str) -> Tuple[str, bytes]:
+        """Return (type, data) of any object, loose or packed"""
+        reader = self._cat_file()
+        try:
+            reader.stdin.write(sha.encode('ascii') + b'\n')
+            reader.stdin.flush()
+            header = reader.stdout.readline().split()
+        except (BrokenPipeError, OSError) as e:
+            self._close_reader()
+            raise GitObjectError(f"git cat-file stopped: {e}")
+        if len(header) != 3:
+            raise GitObjectError(f"Cannot read object {sha}: {b' '.join(header).decode()}")
+        size = int(header[2])
+        data = reader.stdout.read(size + 1)[:size]
+        return header[1].decode('ascii'), data
+
+    def read_ref(self) -> Optional[str]:
+        """Current commit of the branch, from its loose ref or packed-refs"""
+        loose = self.git_dir / self.ref
+        if loose.exists():
+            return loose.read_text().strip() or None
+        packed = self.git_dir / 'packed-refs'
+        if packed.exists():
+            target = self.ref.encode('utf-8')
+            for line in packed.read_bytes().splitlines():
+                fields = line.split(b' ')
+                if len(fields) == 2 and fields[1] == target:
+                    return fields[0].decode('ascii')
+        return None
+
+    def close(self) -> None:
+        with self._lock:
+            self._close_reader()
+
+    def _find_git_dir(self) -> Path:
+        git_dir = self.repo_path / '.git'
+        if git_dir.is_dir():
+            return git_dir
+        # Worktrees and submodules use a .git file; let git resolve it
+        result = subprocess.run(['git', 'rev-parse', '--absolute-git-dir'], cwd=str(self.repo_path),
+                                capture_output=True, text=True)
+        if result.returncode != 0:
+            raise GitObjectError(f"Not a git repository: {self.repo_path}")
+        return Path(result.stdout.strip())
+
+    def _cat_file(self) -> subprocess.Popen:
+        if self._reader is None or self._reader.poll() is not None:
+            self._reader = subprocess.Popen(
+                ['git', 'cat-file', '--batch'],
+                cwd=str(self.repo_path),
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL
+            )
+        return self._reader
+
+    def _close_reader(self) -> None:
+        if self._reader is not None:
+            try:
+                self._reader.stdin.close()
+                self._reader.wait(timeout=5)
+            except (OSError, subprocess.TimeoutExpired):
+                self._reader.kill()
+            self._reader = None
+
+    def _commit_tree(self, commit: str) -> str:
+        tree = self._commit_trees.get(commit)
+        if tree is None:
+            object_type, data = self.read_object(commit)
+            if object_type != 'commit' or not data.startswith(b'tree '):
+                raise GitObjectError(f"{commit} is not a commit")
+            tree = data[5:45].decode('ascii')
+            self._commit_trees = {commit: tree}
+        return tree
+
+    def _read_tree(self, sha: str) -> TreeEntries:
+        entries = self._trees.get(sha)
+        if entries is not None:
+            self._trees.move_to_end(sha)
+            return entries
+        object_type, data = self.read_object(sha)
+        if object_type != 'tree':
+            raise GitObjectError(f"{sha} is not a tree")
+        entries = {}
+        position = 0
+        while position < len(data):
+            space = data.index(b' ', position)
+            nul = data.index(b'\0', space)
+            entries[data[space + 1:nul]] = (data[position:space], data[nul + 1:nul + 21].hex())
+            position = nul + 21
+        self._cache_tree(sha, entries)
+        return entries
+
+    def _update_tree(self, sha: Optional[str], updates: Dict[Tuple[str, ...], str]) -> str:
+        """Write a copy of tree sha with the given paths pointing at new blobs"""
+        entries = dict(self._read_tree(sha)) if sha else {}
+        subtrees: Dict[str, Dict[Tuple[str, ...], str]] = {}
+        for parts, blob in updates.items():
+            if len(parts) == 1:
+                entries[parts[0].encode('utf-8')] = (FILE_MODE, blob)
+            else:
+                subtrees.setdefault(parts[0], {})[parts[1:]] = blob
+
+        for name, child_updates in subtrees.items():
+            key = name.encode('utf-8')
+            existing = entries.get(key)
+            child = existing[1] if existing and existing[0] == TREE_MODE else None
+            entries[key] = (TREE_MODE, self._update_tree(child, child_updates))
+
+        if sha and entries == self._read_tree(sha):
+            return sha
+        new_sha = self.write_object('tree', _serialize_tree(entries))
+        self._cache_tree(new_sha, entries)
+        return new_sha
+
+    def _cache_tree(self, sha: str, entries: TreeEntries) -> None:
+        self._trees[sha] = entries
+        self._trees.move_to_end(sha)
+        while len(self._trees) > TREE_CACHE_SIZE:
+            self._trees.popitem(last=False)
+
+    def _commit_body(self, tree: str, parent: Optional[str], message: str) -> bytes:
+        if self._author is None:
+            self._author = self._identity('GIT_AUTHOR_IDENT')
+            self._committer = self._identity('GIT_COMMITTER_IDENT')
+        stamp = _timestamp()
+        lines = [b'tree ' + tree.encode('ascii')]
+        if parent:
+            lines.append(b'parent ' + parent.encode('ascii'))
+        lines.append(b'author ' + self._author + stamp)
+        lines.append(b'committer ' + self._committer + stamp)
+        return b'\n'.join(lines) + b'\n\n' + message.encode('utf-8').rstrip(b'\n') + b'\n'
+
+    def _identity(self, variable: str) -> bytes:
+        """Name and email as `git commit` would use them, honouring config and env"""
+        result = subprocess.run(['git', 'var', variable], cwd=str(self.repo_path), capture_output=True)
+        if result.returncode != 0:
+            raise GitObjectError(f"No git identity configured: {result.stderr.decode(errors='replace')}")
+        # Drop the "<seconds> <zone>" git appends
+        return result.stdout.strip().rsplit(b' ', 2)[0] + b' '
+
+    def _update_ref(self, old: Optional[str], new: str, message: str) -> None:
+        """Move the branch from old to new, refusing if it moved underneath us"""
+        ref_path = self.git_dir / self.ref
+        ref_path.parent.mkdir(parents=True, exist_ok=True)
+        lock_path = ref_path.with_name(ref_path.name + '.lock')
+        try:
+            fd = os.open(lock_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        except FileExistsError:
+            raise GitObjectError(f"{self.ref} is locked by another git process")
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(new + '\n')
+            if self.read_ref() != old:
+                raise GitObjectError(f"{self.ref} moved while committing")
+            os.replace(lock_path, ref_path)
+        except BaseException:
+            if lock_path.exists():
+                os.remove(lock_path)
+            raise
+        self._append_reflog(old, new, message)
+
+    def _append_reflog(self, old: Optional[str], new: str, message: str) -> None:
+        log_path = self.git_dir / 'logs' / self.ref
+        if not log_path.exists():
+            return
+        summary = message.splitlines()[0] if message else ''
+        line = b'%s %s %s%s\tcommit: %s\n' % (
+            (old or '0' * 40).encode('ascii'), new.encode('ascii'),
+            self._committer, _timestamp(), summary.encode('utf-8'))
+        with open(log_path, 'ab') as f:
+            f.write(line)
+
+
+def _serialize_tree(entries: TreeEntries) -> bytes:
+    # Git orders directories as if their names ended in '/'
+    def sort_key(item):
+        name, (mode, _) = item
+        return name + b'/' if mode == TREE_MODE else name
+    return b''.join(
+        mode + b' ' + name + b'\0' + bytes.fromhex(sha)
+        for name, (mode, sha) in sorted(entries.items(), key=sort_key)
+    )
+
+
+def _timestamp() -> bytes:
+    now = time.time()
+    offset = time.localtime(now).tm_gmtoff // 60
+    sign = '+' if offset >= 0 else '-'
+    hours, minutes = divmod(abs(offset), 60)
+    return f"{int(now)} {sign}{hours:02d}{minutes:02d}".encode('ascii')
+
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import os
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from message_codec import COMPRESSIONS, decode_block, encode_block
+from rooms import DEFAULT_ROOM, parse_room_id, room_dir, room_dirs
+from segment_log import INDEX_SUFFIX, is_segment, read_records
+
+ARCHIVE_PREFIX = 'archive_'
+ARCHIVE_SUFFIX = '.arc'
+
+# Messages older than this many days are moved into archive blocks
+HISTORY_ARCHIVE_DAYS = float(os.getenv('HISTORY_ARCHIVE_DAYS', '30'))
+# zlib always works; zstd needs the optional zstandard package
+ARCHIVE_COMPRESSION = os.getenv('ARCHIVE_COMPRESSION', 'zlib')
+# Messages per archive block. Larger blocks compress better, and a reader
+# always decodes a whole block.
+ARCHIVE_BLOCK_MESSAGES = 4096
+
+# (sort key, source, position, message)
+_ColdMessage = Tuple[datetime, str, int, Dict[str, Any]]
+
+
+def archive_name(number: int) -> str:
+    return f"{ARCHIVE_PREFIX}{number:06d}{ARCHIVE_SUFFIX}"
+
+
+def is_archive(name: str) -> bool:
+    return name.startswith(ARCHIVE_PREFIX) and name.endswith(ARCHIVE_SUFFIX)
+
+
+def read_archive(path: Path) -> List[Dict[str, Any]]:
+    """Every message in one archive block, oldest first"""
+    return decode_block(Path(path).read_bytes())
+
+
+def archive_history(messages_dir: Path, older_than: timedelta = timedelta(days=HISTORY_ARCHIVE_DAYS),
+                    now: Optional[datetime] = None, compression: str = ARCHIVE_COMPRESSION,
+                    block_messages: int = ARCHIVE_BLOCK_MESSAGES) -> Dict[str, Any]:
+    """Move messages older than older_than from files and segments into archive blocks
+
+    A segment is archived only once it is closed and every record in it is
+    old enough. The newest segment is still being appended to and is never
+    moved. Blocks are written in full before any source is removed.
+    """
+    messages_dir = Path(messages_dir)
+    archive_dir = messages_dir / 'archive'
+    cutoff = (now or datetime.now()) - older_than
+
+    cold: List[_ColdMessage] = []
+    sources: List[Path] = []
+    for path in sorted(messages_dir.glob('message_*.json')):
+        try:
+            with open(path, 'r') as f:
+                message_data = json.load(f)
+        except (json.JSONDecodeError, IOError) as e:
+            print(f"Skipping unreadable message file {path}: {e}")
+            continue
+        when = _message_time(message_data)
+        if when is not None and when < cutoff:
+            cold.append((when, path.name, 0, message_data))
+            sources.append(path)
+
+    segments_dir = messages_dir / 'segments'
+    segments = sorted(p for p in segments_dir.iterdir() if is_segment(p.name)) if segments_dir.is_dir() else []
+    for segment in segments[:-1]:
+        records = [(position, message_data) for position, _, message_data in read_records(segment)]
+        times = [_message_time(message_data) for _, message_data in records]
+        if not records or any(when is None or when >= cutoff for when in times):
+            continue
+        name = f"segments/{segment.name}"
+        cold.extend((when, name, position, message_data)
+                    for when, (position, message_data) in zip(times, records))
+        sources.append(segment)
+
+    result = {'messages': len(cold), 'sources': len(sources), 'archives': 0,
+              'bytes_before': sum(path.stat().st_size for path in sources), 'bytes_after': 0}
+    if not cold:
+        return result
+
+    # The order history is read in: time, then where the message came from
+    cold.sort(key=lambda item: item[:3])
+    archive_dir.mkdir(exist_ok=True)
+    existing = [int(p.name[len(ARCHIVE_PREFIX):-len(ARCHIVE_SUFFIX)]) for p in archive_dir.iterdir()
+                if is_archive(p.name)]
+    number = max(existing, default=0)
+    for start in range(0, len(cold), block_messages):
+        number += 1
+        block = encode_block((item[3] for item in cold[start:start + block_messages]), compression)
+        path = archive_dir / archive_name(number)
+        tmp = path.with_suffix('.tmp')
+        tmp.write_bytes(block)
+        os.replace(tmp, path)
+        result['archives'] += 1
+        result['bytes_after'] += len(block)
+
+    for path in sources:
+        os.remove(path)
+        index_path = path.with_suffix(INDEX_SUFFIX)
+        if is_segment(path.name) and index_path.exists():
+            os.remove(index_path)
+    return result
+
+
+def storage_stats(messages_dir: Path) -> Dict[str, Any]:
+    """Bytes and message counts per storage format, and what archives cost to decode"""
+    messages_dir = Path(messages_dir)
+    files = list(messages_dir.glob('message_*.json'))
+    segments_dir = messages_dir / 'segments'
+    segments = [p for p in segments_dir.iterdir() if is_segment(p.name)] if segments_dir.is_dir() else []
+    archive_dir = messages_dir / 'archive'
+    archives = [p for p in archive_dir.iterdir() if is_archive(p.name)] if archive_dir.is_dir() else []
+
+    archived = 0
+    start = time.perf_counter()
+    for path in archives:
+        archived += len(read_archive(path))
+    decode_seconds = time.perf_counter() - start
+    return {
+        'files': {'count': len(files), 'messages': len(files),
+                  'bytes': sum(p.stat().st_size for p in files)},
+        'segments': {'count': len(segments), 'messages': sum(1 for p in segments for _ in read_records(p)),
+                     'bytes': sum(p.stat().st_size for p in segments)},
+        'archives': {'count': len(archives), 'messages': archived,
+                     'bytes': sum(p.stat().st_size for p in archives),
+                     'decode_seconds': round(decode_seconds, 4),
+                     'decode_us_per_message': round(decode_seconds / archived * 1e6, 3) if archived else None},
+    }
+
+
+def _message_time(message_data: Dict[str, Any]) -> Optional[datetime]:
+    """Naive timestamp of a message, or None if it cannot be compared to the cutoff"""
+    try:
+        when = datetime.fromisoformat(message_data['timestamp'])
+    except (KeyError, TypeError, ValueError):
+        return None
+    return when if when.tzinfo is None else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive cold message history into compressed blocks")
+    parser.add_argument('--messages-dir', default=str(Path(__file__).parent / 'messages'))
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    archive = subparsers.add_parser('archive', help="move old messages into archive blocks")
+    archive.add_argument('--older-than-days', type=float, default=HISTORY_ARCHIVE_DAYS)
+    archive.add_argument('--compression', choices=list(COMPRESSIONS), default=ARCHIVE_COMPRESSION)
+    stats = subparsers.add_parser('stats', help="report storage used per format and archive decode cost")
+    stats.add_argument('--room', default=DEFAULT_ROOM)
+    args = parser.parse_args()
+
+    messages_dir = Path(args.messages_dir)
+    if args.command == 'stats':
+        print(json.dumps(storage_stats(room_dir(messages_dir, parse_room_id(args.room))), indent=2))
+        return 0
+
+    # Every room is archived separately, into blocks of its own
+    archived = 0
+    for room_id, directory in room_dirs(messages_dir):
+        result = archive_history(directory, timedelta(days=args.older_than_days), compression=args.compression)
+        if not result['messages']:
+            continue
+        archived += result['messages']
+        saved = result['bytes_before'] - result['bytes_after']
+        print(f"Archived {result['messages']} messages of room {room_id} from {result['sources']} source(s) "
+              f"into {result['archives']} block(s): {result['bytes_before']} -> {result['bytes_after']} bytes "
+              f"({saved / result['bytes_before']:.1%} saved)")
+    if not archived:
+        print("Nothing old enough to archive")
+        return 0
+    print("Commit the result with: git add -A messages && git commit")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
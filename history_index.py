@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from history_archive import is_archive, read_archive
+from message_codec import CodecError
+from segment_log import is_segment, read_records
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ingested_files (
+    name TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    offset INTEGER NOT NULL  -- Bytes of the file already parsed
+);
+
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY,
+    file TEXT NOT NULL,
+    position INTEGER NOT NULL,  -- Byte offset of the record within a segment, 0 for files
+    timestamp TEXT NOT NULL,
+    data TEXT NOT NULL          -- The message as parsed from the file
+);
+
+CREATE INDEX IF NOT EXISTS idx_history_timestamp ON history (timestamp, file, position);
+CREATE INDEX IF NOT EXISTS idx_history_file ON history (file);
+
+CREATE TABLE IF NOT EXISTS index_state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+TimeBound = Union[str, datetime, None]
+
+# A directory mtime this close to the scan that read it is not trusted: on
+# filesystems with coarse timestamps (2s on FAT, 1s on ext3) a file created
+# later in the same tick leaves the mtime unchanged
+RACY_MTIME_NS = 2_000_000_000
+# Seconds between refreshes that stat every known message file, catching
+# files rewritten in place, which leaves the directory mtime alone
+DEFAULT_VERIFY_INTERVAL = 300.0
+
+
+class HistoryIndex:
+    """Sidecar SQLite index of the message files already parsed
+
+    Message files are written once and never renamed, so refresh() only
+    stats and parses names it has not seen before, drops names that have
+    disappeared, and skips the directory scan entirely while the directory's
+    mtime is unchanged. Segments under messages/segments/ are append-only,
+    so each one is parsed from the byte offset reached last time. Archive
+    blocks under messages/archive/ never change and are decoded once.
+
+    A directory mtime is only trusted once it is older than the scan by
+    RACY_MTIME_NS, and every verify_interval seconds the message files are
+    stat'ed and any whose size or mtime changed are parsed again.
+    """
+
+    def __init__(self, messages_dir: Path, index_path: Path,
+                 verify_interval: float = DEFAULT_VERIFY_INTERVAL):
+        self.messages_dir = Path(messages_dir)
+        self.verify_interval = verify_interval
+        # The first refresh in a process always verifies
+        self._last_verified: Optional[float] = None
+        self.segments_dir = self.messages_dir / 'segments'
+        self.index_path = Path(index_path)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.index_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.execute("PRAGMA synchronous = NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def refresh(self) -> int:
+        """Ingest files and segment records added since the last refresh
+
+        Returns the number of message files plus segment records parsed.
+        """
+        with self._lock:
+            return self._refresh_files() + self._refresh_segments() + self._refresh_archives()
+
+    def _refresh_files(self) -> int:
+        """Ingest new and rewritten per-message JSON files (caller holds the lock)"""
+        scan_started = time.time_ns()
+        dir_mtime_ns = self.messages_dir.stat().st_mtime_ns
+        verify = (self._last_verified is None
+                  or time.monotonic() - self._last_verified >= self.verify_interval)
+        if not verify and self._get_state('dir_mtime_ns') == str(dir_mtime_ns):
+            return 0
+
+        known = {
+            name: (mtime_ns, size) for name, mtime_ns, size in self._conn.execute(
+                "SELECT name, mtime_ns, size FROM ingested_files "
+                "WHERE name NOT LIKE 'segments/%' AND name NOT LIKE 'archive/%'")
+        }
+        with os.scandir(self.messages_dir) as entries:
+            seen = {
+                entry.name: entry for entry in entries
+                if entry.name.startswith('message_') and entry.name.endswith('.json')
+            }
+
+        changed = seen.keys() - known.keys()
+        if verify:
+            for name in seen.keys() & known.keys():
+                try:
+                    stat = seen[name].stat()
+                except FileNotFoundError:
+                    continue
+                if (stat.st_mtime_ns, stat.st_size) != known[name]:
+                    changed.add(name)
+            self._last_verified = time.monotonic()
+
+        history_rows = []
+        file_rows = []
+        complete = True
+        for name in sorted(changed):
+            parsed = self._parse_file(name)
+            if parsed is None:
+                complete = False
+                continue
+            history_rows.append(parsed[0])
+            file_rows.append(parsed[1])
+
+        with self._conn:
+            for name in known.keys() - seen.keys():
+                self._forget_file(name)
+            for name, _, _, _ in file_rows:
+                if name in known:
+                    self._forget_file(name)
+            self._conn.executemany(
+                "INSERT INTO history (file, position, timestamp, data) VALUES (?, 0, ?, ?)",
+                history_rows
+            )
+            self._conn.executemany(
+                "INSERT INTO ingested_files (name, mtime_ns, size, offset) VALUES (?, ?, ?, ?)",
+                file_rows
+            )
+
+            # A file caught half-written must be looked at again next time,
+            # and so must a directory whose mtime may not yet show every file
+            if complete and dir_mtime_ns < scan_started - RACY_MTIME_NS:
+                self._set_state('dir_mtime_ns', str(dir_mtime_ns))
+            else:
+                self._set_state('dir_mtime_ns', '')
+        return len(file_rows)
+
+    def _refresh_segments(self) -> int:
+        """Ingest records appended to segments since the last refresh (caller holds the lock)"""
+        known = {
+            name: offset for name, offset in self._conn.execute(
+                "SELECT name, offset FROM ingested_files WHERE name LIKE 'segments/%'")
+        }
+        present = set()
+        parsed = 0
+        segments = sorted(self.segments_dir.iterdir()) if self.segments_dir.is_dir() else []
+
+        with self._conn:
+            for path in segments:
+                if not is_segment(path.name):
+                    continue
+                name = f"segments/{path.name}"
+                present.add(name)
+                stat = path.stat()
+                offset = known.get(name, 0)
+                if stat.st_size == offset:
+                    continue
+                if stat.st_size < offset:
+                    # Rewritten rather than appended to; start over
+                    self._forget_file(name)
+                    offset = 0
+
+                rows = []
+                for position, next_offset, message_data in read_records(path, offset):
+                    rows.append((name, position, message_data['timestamp'], json.dumps(message_data)))
+                    offset = next_offset
+                self._conn.executemany(
+                    "INSERT INTO history (file, position, timestamp, data) VALUES (?, ?, ?, ?)",
+                    rows
+                )
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO ingested_files (name, mtime_ns, size, offset) VALUES (?, ?, ?, ?)",
+                    (name, stat.st_mtime_ns, stat.st_size, offset)
+                )
+                parsed += len(rows)
+
+            for name in known.keys() - present:
+                self._forget_file(name)
+        return parsed
+
+    def _refresh_archives(self) -> int:
+        """Ingest archive blocks not seen before (caller holds the lock)"""
+        archive_dir = self.messages_dir / 'archive'
+        scan_started = time.time_ns()
+        dir_mtime = str(archive_dir.stat().st_mtime_ns) if archive_dir.is_dir() else ''
+        if self._get_state('archive_mtime_ns') == dir_mtime:
+            return 0
+
+        known = {
+            name for (name,) in self._conn.execute(
+                "SELECT name FROM ingested_files WHERE name LIKE 'archive/%'")
+        }
+        present = {
+            f"archive/{path.name}": path for path in archive_dir.iterdir() if is_archive(path.name)
+        } if dir_mtime else {}
+
+        parsed = 0
+        complete = True
+        with self._conn:
+            for name in known - present.keys():
+                self._forget_file(name)
+            for name in sorted(present.keys() - known):
+                path = present[name]
+                try:
+                    stat = path.stat()
+                    messages = read_archive(path)
+                except (CodecError, IOError) as e:
+                    print(f"Error reading archive {name}: {e}")
+                    complete = False
+                    continue
+                self._conn.executemany(
+                    "INSERT INTO history (file, position, timestamp, data) VALUES (?, ?, ?, ?)",
+                    [(name, position, str(message_data.get('timestamp', '')), json.dumps(message_data))
+                     for position, message_data in enumerate(messages)]
+                )
+                self._conn.execute(
+                    "INSERT INTO ingested_files (name, mtime_ns, size, offset) VALUES (?, ?, ?, ?)",
+                    (name, stat.st_mtime_ns, stat.st_size, stat.st_size)
+                )
+                parsed += len(messages)
+            if complete and (not dir_mtime or int(dir_mtime) < scan_started - RACY_MTIME_NS):
+                self._set_state('archive_mtime_ns', dir_mtime)
+            else:
+                self._set_state('archive_mtime_ns', 'racy')
+        return parsed
+
+    def query(self, limit: Optional[int] = None, offset: int = 0,
+              since: TimeBound = None, until: TimeBound = None) -> List[Dict[str, Any]]:
+        """Return messages sorted by timestamp, optionally paged and time-ranged"""
+        conditions = []
+        params: List[Any] = []
+        if since is not None:
+            conditions.append("timestamp >= ?")
+            params.append(_time_bound(since))
+        if until is not None:
+            conditions.append("timestamp < ?")
+            params.append(_time_bound(until))
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        params.extend([limit if limit is not None else -1, offset])
+
+        with self._lock:
+            rows = self._conn.execute(
+                f"""
+                SELECT data FROM history
+                {where}
+                ORDER BY timestamp, file, position
+                LIMIT ? OFFSET ?
+                """,
+                params
+            ).fetchall()
+        return [json.loads(data) for (data,) in rows]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM history").fetchone()[0]
+
+    def _parse_file(self, name: str) -> Optional[Tuple[Tuple, Tuple]]:
+        """Parse one message file into (history row, ingested_files row)"""
+        path = self.messages_dir / name
+        try:
+            stat = path.stat()
+            with open(path, 'r') as f:
+                raw = f.read()
+            message_data = json.loads(raw)
+            timestamp = message_data['timestamp']
+        except (json.JSONDecodeError, KeyError, TypeError, IOError) as e:
+            print(f"Error reading message file {name}: {e}")
+            return None
+
+        return (
+            (name, timestamp, json.dumps(message_data)),
+            (name, stat.st_mtime_ns, stat.st_size, len(raw.encode('utf-8')))
+        )
+
+    def _forget_file(self, name: str) -> None:
+        self._conn.execute("DELETE FROM history WHERE file = ?", (name,))
+        self._conn.execute("DELETE FROM ingested_files WHERE name = ?", (name,))
+
+    def _get_state(self, key: str) -> Optional[str]:
+        row = self._conn.execute("SELECT value FROM index_state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_state(self, key: str, value: str) -> None:
+        self._conn.execute(
+            "INSERT OR REPLACE INTO index_state (key, value) VALUES (?, ?)", (key, value))
+
+
+def _time_bound(value: Union[str, datetime]) -> str:
+    """Timestamps are stored as ISO strings, which sort chronologically"""
+    return value.isoformat() if isinstance(value, datetime) else value
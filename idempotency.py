@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+# Longest client_id accepted on a post
+MAX_CLIENT_ID_LENGTH = 128
+
+
+class RecentClientIds:
+    """LRU map of recently posted client_ids to the message ids they were stored as
+
+    Lets a retried post be answered from memory before any database or Git
+    work. A miss proves nothing: the unique index on messages.client_id
+    stays the authority, and catches retries older than the LRU or posted
+    to another process.
+    """
+
+    def __init__(self, capacity: int = 10000):
+        self.capacity = capacity
+        self._ids: 'OrderedDict[str, int]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, client_id: str) -> Optional[int]:
+        with self._lock:
+            message_id = self._ids.get(client_id)
+            if message_id is None:
+                self.misses += 1
+                return None
+            self._ids.move_to_end(client_id)
+            self.hits += 1
+            return message_id
+
+    def add(self, client_id: str, message_id: int) -> None:
+        if self.capacity <= 0:
+            return
+        with self._lock:
+            self._ids[client_id] = message_id
+            self._ids.move_to_end(client_id)
+            while len(self._ids) > self.capacity:
+                self._ids.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'size': len(self._ids),
+                'capacity': self.capacity,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
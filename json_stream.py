@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+import json
+from typing import Any, Dict, Iterable, Iterator
+
+# Bytes gathered before a chunk is written; small enough for a quick first
+# byte, large enough that a big export is not one syscall per row
+CHUNK_SIZE = 16 * 1024
+
+_encoder = json.JSONEncoder(ensure_ascii=True, separators=(', ', ': '))
+
+
+def iter_json_object(fields: Dict[str, Any], array_key: str, items: Iterable[Any]) -> Iterator[str]:
+    """Encode {**fields, array_key: [items...]} one piece at a time
+
+    The output is the same document json.dumps would produce, but only one
+    item is ever held in memory.
+    """
+    head = _encoder.encode(fields)[:-1]
+    yield (head + ', ' if fields else '{') + _encoder.encode(array_key) + ': ['
+    first = True
+    for item in items:
+        yield _encoder.encode(item) if first else ', ' + _encoder.encode(item)
+        first = False
+    yield ']}'
+
+
+def iter_ndjson(items: Iterable[Any]) -> Iterator[str]:
+    """Encode items as newline-delimited JSON, one compact document per line"""
+    for item in items:
+        yield json.dumps(item, separators=(',', ':')) + '\n'
+
+
+def iter_chunks(pieces: Iterable[str], chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """Join encoded pieces into UTF-8 chunks of roughly chunk_size bytes"""
+    buffer = []
+    buffered = 0
+    for piece in pieces:
+        data = piece.encode('utf-8')
+        buffer.append(data)
+        buffered += len(data)
+        if buffered >= chunk_size:
+            yield b''.join(buffer)
+            buffer = []
+            buffered = 0
+    if buffer:
+        yield b''.join(buffer)
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+import json
+import zlib
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Tuple
+
+try:
+    import zstandard
+except ImportError:  # Optional: zlib is always available
+    zstandard = None
+
+# What a damaged compressed body raises, by library
+_DECOMPRESS_ERRORS = (zlib.error, ValueError) + ((zstandard.ZstdError,) if zstandard is not None else ())
+
+BLOCK_MAGIC = b'CHATBLK1'
+COMPRESSIONS = {'none': 0, 'zlib': 1, 'zstd': 2}
+_COMPRESSION_NAMES = {code: name for name, code in COMPRESSIONS.items()}
+
+# Record flags
+_HAS_ID = 0x01
+_COMPACT_TIME = 0x02   # Timestamp stored as a microsecond delta, not text
+_EXTRA = 0x04          # Fields beyond the usual four, as JSON
+_RAW = 0x08            # Not a regular message: the whole record is JSON
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+_FIELDS = ('content', 'sender', 'timestamp', 'id')
+
+
+class CodecError(Exception):
+    """Raised when a block is truncated, corrupt or uses an unavailable compression"""
+
+
+def available_compressions() -> List[str]:
+    return [name for name in COMPRESSIONS if name != 'zstd' or zstandard is not None]
+
+
+def encode_block(messages: Iterable[Dict[str, Any]], compression: str = 'zlib', level: int = 9) -> bytes:
+    """Encode messages into one self-contained, compressed block
+
+    Senders are interned into a table at the head of the block and records
+    refer to them by number. Ids and timestamps are stored as varint deltas
+    from the previous record, which for history in time order are a byte or
+    two each. Messages that do not look like create_message_file output
+    are kept as JSON, so any message round-trips unchanged.
+    """
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown compression: {compression}")
+    senders: Dict[str, int] = {}
+    records = bytearray()
+    count = 0
+    previous_id = 0
+    previous_time = 0
+    for message in messages:
+        count += 1
+        if not _is_regular(message):
+            records.append(_RAW)
+            _write_bytes(records, json.dumps(message, separators=(',', ':')).encode('utf-8'))
+            continue
+
+        flags = 0
+        message_id = message.get('id')
+        micros = _compact_time(message['timestamp'])
+        extra = {key: value for key, value in message.items() if key not in _FIELDS}
+        if message_id is not None:
+            flags |= _HAS_ID
+        if micros is not None:
+            flags |= _COMPACT_TIME
+        if extra:
+            flags |= _EXTRA
+        records.append(flags)
+        if message_id is not None:
+            _write_varint(records, _zigzag(message_id - previous_id))
+            previous_id = message_id
+        if micros is not None:
+            _write_varint(records, _zigzag(micros - previous_time))
+            previous_time = micros
+        else:
+            _write_bytes(records, message['timestamp'].encode('utf-8'))
+        _write_varint(records, senders.setdefault(message['sender'], len(senders)))
+        _write_bytes(records, message['content'].encode('utf-8'))
+        if extra:
+            _write_bytes(records, json.dumps(extra, separators=(',', ':')).encode('utf-8'))
+
+    body = bytearray()
+    _write_varint(body, len(senders))
+    for sender in senders:
+        _write_bytes(body, sender.encode('utf-8'))
+    _write_varint(body, count)
+    body += records
+    return BLOCK_MAGIC + bytes([COMPRESSIONS[compression]]) + _compress(bytes(body), compression, level)
+
+
+def decode_block(data: bytes) -> List[Dict[str, Any]]:
+    """Messages of a block written by encode_block, in their original order"""
+    if data[:len(BLOCK_MAGIC)] != BLOCK_MAGIC or len(data) <= len(BLOCK_MAGIC):
+        raise CodecError("Not a message block")
+    compression = _COMPRESSION_NAMES.get(data[len(BLOCK_MAGIC)])
+    if compression is None:
+        raise CodecError(f"Unknown compression code {data[len(BLOCK_MAGIC)]}")
+    body = _decompress(data[len(BLOCK_MAGIC) + 1:], compression)
+
+    try:
+        position = 0
+        sender_count, position = _read_varint(body, position)
+        senders = []
+        for _ in range(sender_count):
+            raw, position = _read_bytes(body, position)
+            senders.append(raw.decode('utf-8'))
+        count, position = _read_varint(body, position)
+
+        messages = []
+        previous_id = 0
+        previous_time = 0
+        for _ in range(count):
+            flags = body[position]
+            position += 1
+            if flags & _RAW:
+                raw, position = _read_bytes(body, position)
+                messages.append(json.loads(raw))
+                continue
+            message_id = None
+            if flags & _HAS_ID:
+                delta, position = _read_varint(body, position)
+                message_id = previous_id = previous_id + _unzigzag(delta)
+            if flags & _COMPACT_TIME:
+                delta, position = _read_varint(body, position)
+                previous_time += _unzigzag(delta)
+                timestamp = (_EPOCH + previous_time * _MICROSECOND).isoformat()
+            else:
+                raw, position = _read_bytes(body, position)
+                timestamp = raw.decode('utf-8')
+            sender_index, position = _read_varint(body, position)
+            content, position = _read_bytes(body, position)
+
+            # Same key order as create_message_file writes
+            message = {'content': content.decode('utf-8'), 'sender': senders[sender_index],
+                       'timestamp': timestamp}
+            if message_id is not None:
+                message['id'] = message_id
+            if flags & _EXTRA:
+                raw, position = _read_bytes(body, position)
+                message.update(json.loads(raw))
+            messages.append(message)
+    except (IndexError, UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise CodecError(f"Corrupt message block: {e}")
+    return messages
+
+
+def _is_regular(message: Dict[str, Any]) -> bool:
+    # An explicit 'id': None is kept as JSON, since records without an id decode without the key
+    message_id = message.get('id')
+    return (isinstance(message.get('content'), str) and isinstance(message.get('sender'), str)
+            and isinstance(message.get('timestamp'), str)
+            and ('id' not in message or (isinstance(message_id, int) and not isinstance(message_id, bool)))
+            and list(message)[:3] == ['content', 'sender', 'timestamp'])
+
+
+def _compact_time(timestamp: str):
+    """Microseconds since the epoch, if decoding gives back exactly this string"""
+    try:
+        parsed = datetime.fromisoformat(timestamp)
+    except ValueError:
+        return None
+    if parsed.tzinfo is not None or parsed.isoformat() != timestamp:
+        return None
+    return (parsed - _EPOCH) // _MICROSECOND
+
+
+def _compress(body: bytes, compression: str, level: int) -> bytes:
+    if compression == 'zlib':
+        return zlib.compress(body, level)
+    if compression == 'zstd':
+        if zstandard is None:
+            raise CodecError("zstd compression needs the zstandard package")
+        return zstandard.ZstdCompressor(level=level).compress(body)
+    return body
+
+
+def _decompress(data: bytes, compression: str) -> bytes:
+    try:
+        if compression == 'zlib':
+            return zlib.decompress(data)
+        if compression == 'zstd':
+            if zstandard is None:
+                raise CodecError("This block is zstd-compressed; install the zstandard package")
+            return zstandard.ZstdDecompressor().decompress(data)
+    except _DECOMPRESS_ERRORS as e:
+        raise CodecError(f"Corrupt message block: {e}")
+    return data
+
+
+def _zigzag(value: int) -> int:
+    return value * 2 if value >= 0 else -value * 2 - 1
+
+
+def _unzigzag(value: int) -> int:
+    return value // 2 if value % 2 == 0 else -(value + 1) // 2
+
+
+def _write_varint(out: bytearray, value: int) -> None:
+    while value >= 0x80:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data: bytes, position: int) -> Tuple[int, int]:
+    value = 0
+    shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, position
+        shift += 7
+
+
+def _write_bytes(out: bytearray, data: bytes) -> None:
+    _write_varint(out, len(data))
+    out += data
+
+
+def _read_bytes(data: bytes, position: int) -> Tuple[bytes, int]:
+    length, position = _read_varint(data, position)
+    end = position + length
+    if end > len(data):
+        raise IndexError("record runs past the end of the block")
+    return data[position:end], end
@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+from typing import Dict, List, Optional
+
+# Seconds a worker may go without a heartbeat before it is killed and replaced
+HEALTH_TIMEOUT = float(os.getenv("PREFORK_HEALTH_TIMEOUT", "10"))
+# Seconds a stopping worker gets to finish in-flight requests
+SHUTDOWN_GRACE = float(os.getenv("PREFORK_SHUTDOWN_GRACE", "10"))
+# How often the supervisor checks on its children
+SUPERVISE_INTERVAL = 0.5
+# Delay before restarting a child that exited, doubled per crash up to 30s
+RESTART_DELAY = 0.5
+
+# Workers are started fresh rather than forked, so a reload picks up new code
+_context = multiprocessing.get_context("spawn")
+
+
+class SyncSignal:
+    """Stand-in for SyncWorker inside HTTP worker processes
+
+    Posts wake the sync process through a shared event, and backpressure
+    reads the queue depth in shared memory. Each post adds one; the sync
+    process replaces it with the unsynced row count on every poll.
+    """
+
+    def __init__(self, wakeup, queue_depth, max_backlog: int, poll_interval: float):
+        self._wakeup = wakeup
+        self._queue_depth = queue_depth
+        self.max_backlog = max_backlog
+        self.poll_interval = poll_interval
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue_depth.value
+
+    def notify(self) -> None:
+        with self._queue_depth.get_lock():
+            self._queue_depth.value += 1
+        self._wakeup.set()
+
+    def is_backlogged(self) -> bool:
+        return self.queue_depth >= self.max_backlog
+
+    def stats(self) -> Dict:
+        return {
+            'running': True,
+            'process': 'sync',
+            'queue_depth': self.queue_depth,
+            'max_backlog': self.max_backlog,
+            'backlogged': self.is_backlogged(),
+        }
+
+
+def _on_sigterm(callback) -> None:
+    """Run callback on a thread when SIGTERM arrives; serve_forever cannot stop itself"""
+    def handler(signum, frame):
+        threading.Thread(target=callback, daemon=True).start()
+    signal.signal(signal.SIGTERM, handler)
+    # Ctrl+C reaches the whole process group; the supervisor decides what stops
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _serve_worker(host: str, port: int, db_path: Optional[str], slot: int, heartbeats,
+                  wakeup, queue_depth, sync_enabled: bool) -> None:
+    """Entry point of one HTTP worker process"""
+    import app
+    from broadcaster import DatabaseFeed
+    from database.db_utils import DatabaseManager
+
+    db = DatabaseManager(db_path)
+    sync_signal = None
+    if sync_enabled:
+        sync_signal = SyncSignal(wakeup, queue_depth, app.SYNC_MAX_BACKLOG, app.SYNC_POLL_INTERVAL)
+    # The recent-message cache only sees this process's writes, so it stays off
+    httpd = app.create_server(host, port, db=db, sync_worker=sync_signal, mode="threaded",
+                              reuse_port=True, recent_cache_size=0)
+    feed = DatabaseFeed(db, httpd.broadcaster)
+    httpd.message_feed = feed
+    feed.start()
+
+    # serve_forever calls service_actions at least every poll interval, so a
+    # stale heartbeat means the accept loop itself is stuck
+    def service_actions():
+        heartbeats[slot] = time.time()
+    httpd.service_actions = service_actions
+    service_actions()
+
+    _on_sigterm(httpd.shutdown)
+    try:
+        httpd.serve_forever(poll_interval=0.5)
+    finally:
+        # Stop accepting first, then let open requests finish
+        httpd.ready = False
+        httpd.broadcaster.close()
+        httpd.socket.close()
+        deadline = time.time() + SHUTDOWN_GRACE
+        while httpd.active_connections and time.time() < deadline:
+            time.sleep(0.05)
+        feed.stop()
+        db.close()
+        # Idle keep-alive connections past the grace period are dropped
+        os._exit(0)
+
+
+def _serve_sync(db_path: Optional[str], wakeup, queue_depth, heartbeats, slot: int) -> None:
+    """Entry point of the single process that owns the Git repository"""
+    import app
+    from database.db_utils import DatabaseManager
+
+    db = DatabaseManager(db_path)
+    sync_worker = app.create_sync_worker(db)
+    stopping = threading.Event()
+    _on_sigterm(stopping.set)
+    if sync_worker is not None:
+        sync_worker.start()
+    try:
+        while not stopping.is_set():
+            heartbeats[slot] = time.time()
+            if sync_worker is None:
+                stopping.wait(0.5)
+                continue
+            if wakeup.wait(0.5):
+                wakeup.clear()
+                sync_worker.notify()
+            # Counted from SQLite, not taken from the worker, whose count is
+            # only refreshed after a successful sync: while Git is failing
+            # the backlog must still reach the workers
+            depth = db.count_unsynced_messages()
+            with queue_depth.get_lock():
+                queue_depth.value = depth
+    finally:
+        if sync_worker is not None:
+            # Pushes anything still held back by a push interval
+            sync_worker.stop()
+        db.close()
+
+
+class _Child:
+    def __init__(self, name: str, slot: int):
+        self.name = name
+        self.slot = slot
+        self.process: Optional[multiprocessing.Process] = None
+        self.started_at = 0.0
+        self.crashes = 0
+        self.restart_at = 0.0
+
+
+class PreforkServer:
+    """Supervises N HTTP worker processes and one Git sync process
+
+    Workers each listen on host:port with SO_REUSEPORT, so the kernel
+    balances connections across them, and all share the WAL-mode SQLite
+    database. Only the sync process touches the Git repository.
+
+    SIGHUP replaces the workers one generation at a time (new code included)
+    without refusing connections; SIGTERM or SIGINT stops everything.
+    Workers that exit or stop heartbeating are restarted.
+    """
+
+    def __init__(self, host: str, port: int, workers: Optional[int] = None, sync_enabled: bool = True,
+                 db_path: Optional[str] = None):
+        self.host = host
+        self.db_path = str(db_path) if db_path else None
+        self.workers = workers or os.cpu_count() or 1
+        self.sync_enabled = sync_enabled
+        self.restarts = 0
+        self.reloads = 0
+
+        # Held but never listened on: fixes the port (even when port is 0)
+        # while the kernel routes connections only to the workers
+        self._reservation = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._reservation.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._reservation.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        self._reservation.bind((host, port))
+        self.port = self._reservation.getsockname()[1]
+
+        # One heartbeat slot per worker in two generations, plus the sync process
+        self._heartbeats = _context.Array('d', 2 * self.workers + 1, lock=False)
+        self._wakeup = _context.Event()
+        self._queue_depth = _context.Value('i', 0)
+        self._free_slots = list(range(2 * self.workers))
+        self._children: List[_Child] = []
+        self._sync: Optional[_Child] = None
+        self._stopping = threading.Event()
+        self._reload_requested = threading.Event()
+
+    def start(self) -> None:
+        """Start the sync process and a first generation of workers"""
+        if self.sync_enabled:
+            self._sync = _Child("sync", 2 * self.workers)
+            self._spawn(self._sync)
+        self._children = [self._new_worker() for _ in range(self.workers)]
+        self.wait_healthy(self._children)
+
+    def serve_forever(self) -> None:
+        """Supervise until SIGTERM or SIGINT, reloading on SIGHUP"""
+        signal.signal(signal.SIGHUP, lambda *args: self._reload_requested.set())
+        signal.signal(signal.SIGTERM, lambda *args: self._stopping.set())
+        signal.signal(signal.SIGINT, lambda *args: self._stopping.set())
+        if not self._children:
+            self.start()
+        try:
+            while not self._stopping.wait(SUPERVISE_INTERVAL):
+                if self._reload_requested.is_set():
+                    self._reload_requested.clear()
+                    self.reload()
+                self.check_children()
+        finally:
+            self.stop()
+
+    def reload(self) -> None:
+        """Replace every worker; new ones serve before the old ones stop"""
+        old = self._children
+        new = [self._new_worker() for _ in range(self.workers)]
+        self.wait_healthy(new)
+        self._children = new
+        self._terminate(old)
+        if self._sync is not None:
+            # Never two Git writers: the old sync process exits first
+            self._terminate([self._sync])
+            self._spawn(self._sync)
+        self.reloads += 1
+
+    def check_children(self) -> None:
+        """Restart children that exited or whose heartbeat went stale"""
+        now = time.time()
+        children = self._children + ([self._sync] if self._sync is not None else [])
+        for child in children:
+            process = child.process
+            if process is None:
+                if now >= child.restart_at:
+                    self._spawn(child)
+                continue
+            stale = (now - child.started_at > HEALTH_TIMEOUT
+                     and now - self._heartbeats[child.slot] > HEALTH_TIMEOUT)
+            if process.is_alive() and not stale:
+                # Healthy for a while: forget earlier crashes
+                if now - child.started_at > 60:
+                    child.crashes = 0
+                continue
+            if process.is_alive():
+                print(f"{child.name} (pid {process.pid}) missed its heartbeat; restarting")
+                process.kill()
+            else:
+                print(f"{child.name} (pid {process.pid}) exited with {process.exitcode}; restarting")
+            process.join()
+            child.process = None
+            child.crashes += 1
+            child.restart_at = now + min(30.0, RESTART_DELAY * 2 ** (child.crashes - 1))
+            self.restarts += 1
+
+    def wait_healthy(self, children: List[_Child], timeout: float = 30.0) -> bool:
+        """Wait until each child has sent a heartbeat since it started"""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if all(self._heartbeats[child.slot] >= child.started_at for child in children):
+                return True
+            time.sleep(0.05)
+        return False
+
+    def stop(self) -> None:
+        """Stop workers gracefully, then the sync process"""
+        self._terminate(self._children)
+        self._children = []
+        if self._sync is not None:
+            self._terminate([self._sync])
+            self._sync = None
+        self._reservation.close()
+
+    def pids(self) -> List[int]:
+        return [child.process.pid for child in self._children if child.process is not None]
+
+    def _new_worker(self) -> _Child:
+        child = _Child("worker", self._free_slots.pop(0))
+        self._spawn(child)
+        return child
+
+    def _spawn(self, child: _Child) -> None:
+        child.started_at = time.time()
+        if child.name == "sync":
+            target = _serve_sync
+            args = (self.db_path, self._wakeup, self._queue_depth, self._heartbeats, child.slot)
+        else:
+            target = _serve_worker
+            args = (self.host, self.port, self.db_path, child.slot, self._heartbeats, self._wakeup,
+                    self._queue_depth, self.sync_enabled)
+        child.process = _context.Process(target=target, args=args, name=f"chat-{child.name}")
+        child.process.start()
+
+    def _terminate(self, children: List[_Child]) -> None:
+        for child in children:
+            if child.process is not None and child.process.is_alive():
+                child.process.terminate()
+        deadline = time.time() + SHUTDOWN_GRACE + 5
+        for child in children:
+            if child.process is not None:
+                child.process.join(max(0.0, deadline - time.time()))
+                if child.process.is_alive():
+                    child.process.kill()
+                    child.process.join()
+                child.process = None
+            if child.name == "worker":
+                self._free_slots.append(child.slot)
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+import bisect
+import json
+import os
+import threading
+from collections import OrderedDict, deque
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple
+
+from rooms import DEFAULT_ROOM
+
+SortKey = Tuple[str, int]
+
+# Bumped whenever the snapshot layout changes; other versions are ignored
+SNAPSHOT_VERSION = 1
+# Rooms buffered at once before the least recently used one is dropped
+DEFAULT_MAX_ROOMS = 100
+
+
+def _sort_key(message: Dict[str, Any]) -> SortKey:
+    # The order get_messages pages in: (timestamp, id)
+    return (message['timestamp'], message['id'])
+
+
+class _RoomBuffer:
+    """The newest messages of one room, oldest first, at most capacity long"""
+
+    def __init__(self, capacity: int):
+        self.messages: Deque[Dict[str, Any]] = deque(maxlen=capacity)
+        self.by_id: Dict[int, Dict[str, Any]] = {}
+        # True while the buffer holds the room's entire history, so a short
+        # page is an answer rather than a gap
+        self.complete = False
+
+
+class RecentMessageCache:
+    """In-process ring buffers of the newest messages, one per room
+
+    Warmed from the database at startup and written through on every post,
+    so the latest pages of history are served without touching SQLite. Once
+    a buffer is full the oldest message is evicted; pages reaching past what
+    is buffered are misses and fall back to the database.
+
+    At most max_rooms rooms are buffered, so memory stays within capacity x
+    max_rooms however many rooms clients post to. Beyond that the least
+    recently used room is dropped; the database warms it again when it is
+    next read or posted to.
+    """
+
+    def __init__(self, capacity: int = 500, max_rooms: int = DEFAULT_MAX_ROOMS):
+        self.capacity = capacity
+        self.max_rooms = max_rooms
+        # Least recently used first
+        self._rooms: 'OrderedDict[str, _RoomBuffer]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.room_evictions = 0
+        # Where the buffers came from at startup: 'database' or 'snapshot'
+        self.source: Optional[str] = None
+
+    def warm(self, messages: Iterable[Dict[str, Any]], room: str = DEFAULT_ROOM) -> int:
+        """Replace a room's buffer with messages as returned by get_messages (newest first)"""
+        newest = list(messages)[:self.capacity]
+        buffer = _RoomBuffer(self.capacity)
+        for message in sorted(newest, key=_sort_key):
+            buffer.messages.append(message)
+            buffer.by_id[message['id']] = message
+        # Fewer rows than asked for means there is nothing older
+        buffer.complete = len(newest) < self.capacity
+        with self._lock:
+            self._store(room, buffer)
+        return len(newest)
+
+    def add(self, message: Dict[str, Any], room: str = DEFAULT_ROOM) -> None:
+        """Write a newly stored message through to its room's buffer"""
+        with self._lock:
+            buffer = self._rooms.get(room)
+            if buffer is None:
+                # Never warmed: an empty room whose whole history is this post
+                buffer = _RoomBuffer(self.capacity)
+                buffer.complete = True
+                self._store(room, buffer)
+            else:
+                self._rooms.move_to_end(room)
+            if message['id'] in buffer.by_id:
+                return
+            messages = buffer.messages
+            if len(messages) == messages.maxlen:
+                evicted = messages.popleft()
+                del buffer.by_id[evicted['id']]
+                buffer.complete = False
+                self.evictions += 1
+            key = _sort_key(message)
+            if not messages or _sort_key(messages[-1]) <= key:
+                messages.append(message)
+            else:
+                # Concurrent posts can commit out of order; keep the buffer sorted
+                keys = [_sort_key(m) for m in messages]
+                messages.insert(bisect.bisect_left(keys, key), message)
+            buffer.by_id[message['id']] = message
+
+    def has_room(self, room: str) -> bool:
+        """True once room has a buffer, warmed or written through"""
+        with self._lock:
+            return room in self._rooms
+
+    def get_page(self, limit: int, before_id: Optional[int] = None,
+                 room: str = DEFAULT_ROOM) -> Optional[List[Dict[str, Any]]]:
+        """A page newest first, exactly as get_messages would return it, or None on a miss"""
+        with self._lock:
+            buffer = self._rooms.get(room)
+            if buffer is not None:
+                self._rooms.move_to_end(room)
+            page = self._page(buffer, limit, before_id)
+            if page is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return page
+
+    def mark_synced(self, message_ids: List[int], git_hash: str) -> None:
+        """Mirror DatabaseManager.update_git_hashes for buffered messages"""
+        with self._lock:
+            for buffer in self._rooms.values():
+                for message_id in message_ids:
+                    message = buffer.by_id.get(message_id)
+                    if message is not None:
+                        message['git_hash'] = git_hash
+                        message['is_synced'] = 1
+
+    def save(self, path: Path, fingerprint: Dict[str, Any]) -> int:
+        """Write every buffer to path as a snapshot of the database state fingerprint names
+
+        The file is replaced atomically, so a crash mid-write leaves the
+        previous snapshot (which will then fail validation) rather than a
+        torn one. Returns the number of messages written.
+        """
+        with self._lock:
+            rooms = {room: {'complete': buffer.complete, 'messages': list(buffer.messages)}
+                     for room, buffer in self._rooms.items()}
+            # Serialized under the lock: mark_synced edits buffered messages in place
+            data = json.dumps({'version': SNAPSHOT_VERSION, 'capacity': self.capacity,
+                               'fingerprint': fingerprint, 'rooms': rooms}, separators=(',', ':'))
+        path = Path(path)
+        tmp = path.with_name(path.name + '.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(data)
+        os.replace(tmp, path)
+        return sum(len(room['messages']) for room in rooms.values())
+
+    def load(self, path: Path, fingerprint: Dict[str, Any]) -> Optional[int]:
+        """Restore the buffers saved by save if the database still matches fingerprint
+
+        Returns the number of messages restored, or None, leaving the cache
+        untouched, if the snapshot is missing, unreadable, from another
+        capacity or for a database that has changed since.
+        """
+        try:
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if (not isinstance(data, dict) or data.get('version') != SNAPSHOT_VERSION
+                or data.get('capacity') != self.capacity or data.get('fingerprint') != fingerprint):
+            return None
+        rooms: 'OrderedDict[str, _RoomBuffer]' = OrderedDict()
+        try:
+            # Saved least recently used first; keep the most recent max_rooms
+            for room, saved in list(data['rooms'].items())[-self.max_rooms:]:
+                buffer = _RoomBuffer(self.capacity)
+                for message in saved['messages']:
+                    buffer.messages.append(message)
+                    buffer.by_id[message['id']] = message
+                buffer.complete = bool(saved['complete'])
+                rooms[room] = buffer
+        except (KeyError, TypeError, AttributeError):
+            return None
+        with self._lock:
+            self._rooms = rooms
+        return sum(len(buffer.messages) for buffer in rooms.values())
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'rooms': len(self._rooms),
+                'messages': sum(len(buffer.messages) for buffer in self._rooms.values()),
+                'capacity': self.capacity,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'room_evictions': self.room_evictions,
+                'source': self.source,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else None,
+            }
+
+    def _store(self, room: str, buffer: _RoomBuffer) -> None:
+        """Insert or replace a room's buffer as most recent, evicting past max_rooms (caller holds the lock)"""
+        self._rooms[room] = buffer
+        self._rooms.move_to_end(room)
+        while len(self._rooms) > self.max_rooms:
+            self._rooms.popitem(last=False)
+            self.room_evictions += 1
+
+    @staticmethod
+    def _page(buffer: Optional[_RoomBuffer], limit: int,
+              before_id: Optional[int]) -> Optional[List[Dict[str, Any]]]:
+        if buffer is None:
+            return None
+        messages = list(buffer.messages)
+        if before_id is None:
+            end = len(messages)
+        else:
+            cursor = buffer.by_id.get(before_id)
+            if cursor is None:
+                return None
+            end = bisect.bisect_left([_sort_key(m) for m in messages], _sort_key(cursor))
+        if end < limit and not buffer.complete:
+            return None
+        return [dict(message) for message in reversed(messages[max(0, end - limit):end])]
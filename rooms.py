@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+import re
+from pathlib import Path
+from typing import Iterator, Optional, Tuple
+
+# Room of every message posted without one, and of all history from before rooms
+DEFAULT_ROOM = 'default'
+# Longest room_id accepted on a post
+MAX_ROOM_ID_LENGTH = 64
+# Rooms other than the default live under messages/rooms/<room_id>/
+ROOMS_DIR = 'rooms'
+
+# Lower case only: a room id names a directory, and case-insensitive
+# filesystems would merge rooms that differ only in case
+_ROOM_ID = re.compile(r'[a-z0-9][a-z0-9_-]*')
+
+
+def is_valid_room_id(room_id) -> bool:
+    return (isinstance(room_id, str) and len(room_id) <= MAX_ROOM_ID_LENGTH
+            and _ROOM_ID.fullmatch(room_id) is not None)
+
+
+def room_dir(messages_dir: Path, room_id: str) -> Path:
+    """Directory holding one room's message files, segments and archive blocks
+
+    The default room keeps messages/ itself, so history written before
+    rooms existed is that room's history.
+    """
+    if room_id == DEFAULT_ROOM:
+        return Path(messages_dir)
+    if not is_valid_room_id(room_id):
+        raise ValueError(f"Invalid room id: {room_id!r}")
+    return Path(messages_dir) / ROOMS_DIR / room_id
+
+
+def room_dirs(messages_dir: Path) -> Iterator[Tuple[str, Path]]:
+    """(room_id, directory) for every room with a partition, the default room first"""
+    messages_dir = Path(messages_dir)
+    yield DEFAULT_ROOM, messages_dir
+    rooms_dir = messages_dir / ROOMS_DIR
+    if rooms_dir.is_dir():
+        for path in sorted(rooms_dir.iterdir()):
+            if path.is_dir() and is_valid_room_id(path.name) and path.name != DEFAULT_ROOM:
+                yield path.name, path
+
+
+def room_of_source(name: str) -> str:
+    """Room of a source named relative to messages/, e.g. rooms/ops/segments/segment_000001.jsonl"""
+    parts = name.split('/')
+    if len(parts) > 2 and parts[0] == ROOMS_DIR:
+        return parts[1]
+    return DEFAULT_ROOM
+
+
+def room_prefix(room_id: str) -> str:
+    """Prefix naming a room's sources relative to messages/ ('' for the default room)"""
+    return '' if room_id == DEFAULT_ROOM else f"{ROOMS_DIR}/{room_id}/"
+
+
+def parse_room_id(value: Optional[str]) -> str:
+    """Room id from a request parameter, DEFAULT_ROOM if absent; raises ValueError if invalid"""
+    if value is None or value == '':
+        return DEFAULT_ROOM
+    if not is_valid_room_id(value):
+        raise ValueError(f"Invalid room id: {value!r}")
+    return value
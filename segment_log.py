@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+import argparse
+import bisect
+import json
+import mmap
+import os
+import struct
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Tuple
+
+SEGMENT_PREFIX = 'segment_'
+SEGMENT_SUFFIX = '.jsonl'
+INDEX_SUFFIX = '.idx'
+# Where settle() records the end of the settled records: "<segment number> <offset>"
+SETTLED_MARKER = 'settled'
+
+# Sparse index entry: (record number, byte offset), both little-endian u64
+INDEX_ENTRY = struct.Struct('<QQ')
+
+DEFAULT_SEGMENT_BYTES = 4 * 1024 * 1024
+DEFAULT_INDEX_INTERVAL = 64
+
+
+def segment_name(number: int) -> str:
+    return f"{SEGMENT_PREFIX}{number:06d}{SEGMENT_SUFFIX}"
+
+
+def is_segment(name: str) -> bool:
+    return name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX)
+
+
+def segment_number(path: Path) -> int:
+    return int(path.name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)])
+
+
+def read_records(path: Path, offset: int = 0) -> Iterator[Tuple[int, int, Dict[str, Any]]]:
+    """Yield (offset, next_offset, message) for complete records from offset on
+
+    The segment is memory-mapped, so only the pages actually read are loaded.
+    A trailing record without its newline is still being written and is left
+    for the next read.
+    """
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size <= offset:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            end = mm.rfind(b'\n', offset) + 1
+            position = offset
+            while position < end:
+                newline = mm.find(b'\n', position, end)
+                line = mm[position:newline]
+                if line.strip():
+                    yield position, newline + 1, json.loads(line)
+                position = newline + 1
+
+
+class SegmentLog:
+    """Append-only message log split into rolling JSON Lines segments
+
+    Each segment_NNNNNN.jsonl holds one compact JSON message per line and is
+    closed once it reaches max_segment_bytes. A sparse segment_NNNNNN.idx
+    beside it records the byte offset of every index_interval-th record so a
+    reader can seek close to any record without scanning from the start.
+
+    Appending a message id that is already in the log since the last
+    settle() is a no-op, even across a roll, so a retried sync batch or a
+    resumed export does not write the same database row twice. settle()
+    persists its position, and a reopened log rereads only what came after.
+    """
+
+    def __init__(self, segments_dir: Path, max_segment_bytes: int = DEFAULT_SEGMENT_BYTES,
+                 index_interval: int = DEFAULT_INDEX_INTERVAL):
+        self.segments_dir = Path(segments_dir)
+        self.segments_dir.mkdir(parents=True, exist_ok=True)
+        self.max_segment_bytes = max_segment_bytes
+        self.index_interval = index_interval
+        self._lock = threading.Lock()
+        self._file = None
+
+        # Segment holding each message id appended since the last settle()
+        self._unsettled: Dict[int, str] = {}
+
+        segments = self.segments()
+        if segments:
+            self._active_number = segment_number(segments[-1])
+            self._load_active_segment()
+            self._load_unsettled()
+        else:
+            self._active_number = 1
+            self._active_size = 0
+            self._active_records = 0
+
+    def segments(self) -> List[Path]:
+        """All segment files, oldest first"""
+        return sorted(path for path in self.segments_dir.iterdir() if is_segment(path.name))
+
+    @property
+    def active_segment(self) -> Path:
+        return self.segments_dir / segment_name(self._active_number)
+
+    def append(self, message_data: Dict[str, Any]) -> str:
+        """Append one message and return the path of the segment holding it"""
+        record = (json.dumps(message_data, separators=(',', ':')) + '\n').encode('utf-8')
+        message_id = message_data.get('id')
+
+        with self._lock:
+            if message_id is not None and message_id in self._unsettled:
+                return self._unsettled[message_id]
+
+            if self._active_size and self._active_size + len(record) > self.max_segment_bytes:
+                self._roll()
+
+            if self._file is None:
+                self._file = open(self.active_segment, 'ab')
+            if self._active_records % self.index_interval == 0:
+                with open(self.active_segment.with_suffix(INDEX_SUFFIX), 'ab') as index:
+                    index.write(INDEX_ENTRY.pack(self._active_records, self._active_size))
+
+            # Readers stop at the last complete newline, so a record that is
+            # only partly on disk is never returned
+            self._file.write(record)
+            self._file.flush()
+            self._active_size += len(record)
+            self._active_records += 1
+            if message_id is not None:
+                self._unsettled[message_id] = str(self.active_segment)
+            return str(self.active_segment)
+
+    def settle(self) -> None:
+        """Forget the ids appended so far; call once they are committed"""
+        with self._lock:
+            self._unsettled = {}
+            marker = self.segments_dir / SETTLED_MARKER
+            tmp = marker.with_name(SETTLED_MARKER + '.tmp')
+            tmp.write_text(f"{self._active_number} {self._active_size}\n")
+            os.replace(tmp, marker)
+
+    def read_from(self, segment: Path, record_number: int) -> Iterator[Dict[str, Any]]:
+        """Yield messages of one segment starting at the given record number"""
+        record, offset = self._nearest_index_entry(segment, record_number)
+        for _, _, message_data in read_records(segment, offset):
+            if record >= record_number:
+                yield message_data
+            record += 1
+
+    def iter_messages(self) -> Iterator[Dict[str, Any]]:
+        """Yield every message in append order"""
+        for segment in self.segments():
+            for _, _, message_data in read_records(segment):
+                yield message_data
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _roll(self) -> None:
+        """Close the active segment and start the next one (caller holds the lock)"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._active_number += 1
+        self._active_size = 0
+        self._active_records = 0
+
+    def _load_active_segment(self) -> None:
+        """Recover size and record count of the newest segment"""
+        segment = self.active_segment
+        self._active_size = 0
+        self._active_records = 0
+        for _, next_offset, _ in read_records(segment):
+            self._active_size = next_offset
+            self._active_records += 1
+
+        # Drop a torn final record left by a crash mid-write, along with any
+        # index entries pointing past the surviving data
+        if segment.stat().st_size != self._active_size:
+            with open(segment, 'r+b') as f:
+                f.truncate(self._active_size)
+            index_path = segment.with_suffix(INDEX_SUFFIX)
+            if index_path.exists():
+                entries = [entry for entry in self._read_index(index_path)
+                           if entry[1] < self._active_size]
+                index_path.write_bytes(b''.join(INDEX_ENTRY.pack(*entry) for entry in entries))
+
+    def _load_unsettled(self) -> None:
+        """Recover the ids appended after the last settle(), or all of them if it never ran"""
+        number, offset = 0, 0
+        try:
+            number, offset = (int(field) for field in (self.segments_dir / SETTLED_MARKER).read_text().split())
+        except (OSError, ValueError):
+            pass
+        for segment in self.segments():
+            if segment_number(segment) < number:
+                continue
+            start = offset if segment_number(segment) == number else 0
+            for _, _, message_data in read_records(segment, start):
+                if 'id' in message_data:
+                    self._unsettled[message_data['id']] = str(segment)
+
+    def _nearest_index_entry(self, segment: Path, record_number: int) -> Tuple[int, int]:
+        """Closest (record, offset) at or before record_number from the sparse index"""
+        index_path = segment.with_suffix(INDEX_SUFFIX)
+        if not index_path.exists():
+            # Index files are not committed; a fresh clone scans from the start
+            return 0, 0
+        entries = self._read_index(index_path)
+        position = bisect.bisect_right([record for record, _ in entries], record_number) - 1
+        return entries[position] if position >= 0 else (0, 0)
+
+    @staticmethod
+    def _read_index(index_path: Path) -> List[Tuple[int, int]]:
+        data = index_path.read_bytes()
+        usable = len(data) - len(data) % INDEX_ENTRY.size
+        return [INDEX_ENTRY.unpack_from(data, i) for i in range(0, usable, INDEX_ENTRY.size)]
+
+
+def migrate_legacy_files(messages_dir: Path, log: SegmentLog) -> int:
+    """Move per-message JSON files into the segment log, oldest first"""
+    legacy: List[Tuple[str, str, Dict[str, Any]]] = []
+    for path in messages_dir.glob('message_*.json'):
+        try:
+            with open(path, 'r') as f:
+                message_data = json.load(f)
+            legacy.append((message_data['timestamp'], path.name, message_data))
+        except (json.JSONDecodeError, KeyError, IOError) as e:
+            print(f"Skipping unreadable message file {path}: {e}")
+
+    legacy.sort(key=lambda item: (item[0], item[1]))
+    for _, _, message_data in legacy:
+        log.append(message_data)
+    # Remove the originals only once every record is in a segment
+    for _, name, _ in legacy:
+        os.remove(messages_dir / name)
+    return len(legacy)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Segmented message log tools")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    migrate = subparsers.add_parser('migrate', help="convert messages/message_*.json into segments")
+    migrate.add_argument('--messages-dir', default=str(Path(__file__).parent / 'messages'))
+    migrate.add_argument('--segment-bytes', type=int, default=DEFAULT_SEGMENT_BYTES)
+    args = parser.parse_args()
+
+    messages_dir = Path(args.messages_dir)
+    log = SegmentLog(messages_dir / 'segments', max_segment_bytes=args.segment_bytes)
+    try:
+        migrated = migrate_legacy_files(messages_dir, log)
+    finally:
+        log.close()
+    print(f"Migrated {migrated} message files into {len(log.segments())} segment(s)")
+    print("Commit the result with: git add -A messages && git commit")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+import random
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from database.db_utils import DatabaseManager
+from git_manager import GitManager
+from metrics import REGISTRY
+
+SYNC_BATCHES = REGISTRY.counter(
+    'chat_sync_batches_total', 'Sync batches attempted by the background worker', ['result'])
+SYNC_MESSAGES = REGISTRY.counter(
+    'chat_sync_messages_total', 'Messages pushed to Git by the background worker')
+
+
+class SyncWorker:
+    """Background thread that drains unsynced SQLite rows into Git commits"""
+
+    def __init__(self, db: DatabaseManager, git_manager: GitManager,
+                 batch_size: int = 100, poll_interval: float = 5.0,
+                 min_backoff: float = 1.0, max_backoff: float = 60.0,
+                 max_backlog: int = 10000):
+        self.db = db
+        self.git_manager = git_manager
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.max_backlog = max_backlog
+
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+        # Metrics, read through stats()
+        self.queue_depth = 0
+        self.batches_synced = 0
+        self.messages_synced = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.last_sync_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    def start(self) -> None:
+        """Start the worker thread"""
+        if self._running:
+            return
+        self._running = True
+        self._stopping.clear()
+        self.queue_depth = self.db.count_unsynced_messages()
+        self._thread = threading.Thread(target=self._run, name="sync-worker", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Stop the worker thread after the batch in progress"""
+        self._running = False
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+        # Commits held back by a push interval must not outlive the process
+        self.git_manager.push_pending(force=True)
+
+    def notify(self) -> None:
+        """Signal that a new message was stored; called on the request path"""
+        with self._lock:
+            self.queue_depth += 1
+        self._wakeup.set()
+
+    def is_backlogged(self) -> bool:
+        """True when writers should back off until the worker catches up"""
+        return self.queue_depth >= self.max_backlog
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of the worker's queue and throughput metrics"""
+        return {
+            'running': self._running,
+            'queue_depth': self.queue_depth,
+            'max_backlog': self.max_backlog,
+            'backlogged': self.is_backlogged(),
+            'batches_synced': self.batches_synced,
+            'messages_synced': self.messages_synced,
+            'failures': self.failures,
+            'consecutive_failures': self.consecutive_failures,
+            'last_sync_at': self.last_sync_at,
+            'last_error': self.last_error,
+        }
+
+    def sync_once(self) -> int:
+        """Sync one batch of unsynced rows and return how many were synced"""
+        rows = self.db.get_unsynced_messages(limit=self.batch_size)
+        if not rows:
+            self._refresh_queue_depth()
+            return 0
+
+        filepaths = self._write_message_files(rows)
+        commit_hash = self.git_manager.push_messages(filepaths)
+        if not commit_hash:
+            raise Exception("Git push failed")
+
+        self.db.update_git_hashes([row['id'] for row in rows], commit_hash)
+        # Only now can a retry no longer resend these rows
+        self.git_manager.settle_segments()
+        self.batches_synced += 1
+        self.messages_synced += len(rows)
+        SYNC_BATCHES.inc('success')
+        SYNC_MESSAGES.inc(amount=len(rows))
+        self.last_sync_at = time.time()
+        self._refresh_queue_depth()
+        return len(rows)
+
+    def _write_message_files(self, rows: List[Dict[str, Any]]) -> List[str]:
+        filepaths = []
+        for row in rows:
+            filepath = self.git_manager.create_message_file(
+                row['content'],
+                row['sender'],
+                timestamp=_parse_timestamp(row['timestamp']),
+                message_id=row['id'],
+                room_id=row['room_id']
+            )
+            if not filepath:
+                raise Exception(f"Could not write message file for message {row['id']}")
+            filepaths.append(filepath)
+        return filepaths
+
+    def _refresh_queue_depth(self) -> None:
+        depth = self.db.count_unsynced_messages()
+        with self._lock:
+            self.queue_depth = depth
+
+    def _backoff_delay(self) -> float:
+        """Exponential backoff with jitter, capped at max_backoff"""
+        delay = min(self.max_backoff, self.min_backoff * (2 ** (self.consecutive_failures - 1)))
+        return delay * random.uniform(0.5, 1.0)
+
+    def _run(self) -> None:
+        while self._running:
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+            # Drain everything that is pending before sleeping again
+            while self._running:
+                try:
+                    synced = self.sync_once()
+                    self.consecutive_failures = 0
+                    self.last_error = None
+                except Exception as e:
+                    self.failures += 1
+                    SYNC_BATCHES.inc('failure')
+                    self.consecutive_failures += 1
+                    self.last_error = str(e)
+                    delay = self._backoff_delay()
+                    print(f"Error in sync worker, retrying in {delay:.1f}s: {e}")
+                    # New messages must not cut the backoff short; only stop() does
+                    self._stopping.wait(delay)
+                    continue
+                if synced < self.batch_size:
+                    break
+
+            # With a push interval, commits reach the remote on this schedule
+            self.git_manager.push_pending()
+
+
+def _parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    """Parse SQLite's CURRENT_TIMESTAMP format, tolerating bad values"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return None
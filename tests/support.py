@@ -0,0 +1,3 @@
+#!/usr/bin/env python3
+"""Offline fixtures: a local bare repository standing in for GitHub"""
+from benchmarks.common import git, make_local_remote  # noqa: F401
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+import unittest
+import os
+import sys
+
+# Add parent directory to path to import the application modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from admission import InFlightLimiter, RateLimiter
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class TestAdmission(unittest.TestCase):
+    def test_token_bucket_burst_and_refill(self):
+        """Test a key gets its burst, then one request per 1/rate seconds, and keys are separate"""
+        clock = FakeClock()
+        limiter = RateLimiter(rate=2, burst=3, clock=clock)
+        self.assertEqual([limiter.check("a") for _ in range(3)], [0, 0, 0])
+        self.assertAlmostEqual(limiter.check("a"), 0.5)
+        self.assertEqual(limiter.check("b"), 0)
+
+        clock.now = 0.5
+        self.assertEqual(limiter.check("a"), 0)
+        self.assertGreater(limiter.check("a"), 0)
+        self.assertEqual(limiter.stats()["limited"], 2)
+        self.assertEqual(RateLimiter(rate=0).check("a"), 0)
+
+    def test_throttled_key_outlives_new_keys(self):
+        """Test a throttled key keeps its bucket while max_keys new keys arrive"""
+        clock = FakeClock()
+        limiter = RateLimiter(rate=1, burst=2, max_keys=2, clock=clock)
+        self.assertEqual([limiter.check("a") for _ in range(2)], [0, 0])
+        self.assertGreater(limiter.check("a"), 0)
+
+        # "b" takes the free slot; the rest share the overflow bucket
+        self.assertEqual([limiter.check(key) for key in ("b", "c", "d")], [0, 0, 0])
+        self.assertGreater(limiter.check("e"), 0)
+        self.assertGreater(limiter.check("a"), 0)
+        self.assertEqual(limiter.stats()["keys"], 2)
+
+        # Refilled buckets make room again
+        clock.now = 2
+        self.assertEqual(limiter.check("c"), 0)
+        self.assertEqual(limiter.stats()["keys"], 2)
+
+    def test_in_flight_cap(self):
+        """Test requests over the cap are refused until one finishes"""
+        limiter = InFlightLimiter(2)
+        self.assertTrue(limiter.try_acquire())
+        self.assertTrue(limiter.try_acquire())
+        self.assertFalse(limiter.try_acquire())
+        limiter.release()
+        self.assertTrue(limiter.try_acquire())
+        self.assertTrue(InFlightLimiter(0).try_acquire())
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+import unittest
+import http.client
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+from pathlib import Path
+
+# Add parent directory to path to import the application modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app
+from asset_cache import StaticAssetCache
+from database.db_utils import DatabaseManager
+from database.init_db import DatabaseInitializer
+
+class TestChatServer(unittest.TestCase):
+    def setUp(self):
+        """Start a threaded server on a free port with a temporary database"""
+        self.tmp = tempfile.TemporaryDirectory()
+        db_path = Path(self.tmp.name) / "db.sqlite"
+        DatabaseInitializer(db_path).init_database()
+        self.db = DatabaseManager(db_path)
+        self.httpd = app.create_server("127.0.0.1", 0, db=self.db, mode="threaded")
+        self.port = self.httpd.server_address[1]
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    def tearDown(self):
+        if getattr(self.httpd, "broadcaster", None) is not None:
+            self.httpd.broadcaster.close()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.tmp.cleanup()
+
+    def connect(self):
+        return http.client.HTTPConnection("127.0.0.1", self.port, timeout=10)
+
+    def post_message(self, conn, content="Hello", sender="User"):
+        conn.request("POST", "/api/messages", body=json.dumps({"content": content, "sender": sender}),
+                     headers={"Content-Type": "application/json"})
+        response = conn.getresponse()
+        return response, json.loads(response.read())
+
+    def test_post_stores_message(self):
+        """Test a posted message is stored in SQLite"""
+        conn = self.connect()
+        response, data = self.post_message(conn)
+        conn.close()
+
+        self.assertEqual(response.status, 200)
+        self.assertEqual(data["status"], "success")
+        messages = self.db.get_messages()
+        self.assertEqual([(m["id"], m["content"]) for m in messages], [(data["id"], "Hello")])
+
+    def test_history_pagination(self):
+        """Test GET /api/messages walks pages with the before cursor"""
+        self.db.add_messages((f"Message {i}", "User") for i in range(5))
+        conn = self.connect()
+        seen = []
+        path = "/api/messages?limit=2"
+        while path:
+            conn.request("GET", path)
+            response = conn.getresponse()
+            data = json.loads(response.read())
+            self.assertEqual(response.status, 200)
+            seen.extend(message["content"] for message in data["messages"])
+            path = f"/api/messages?limit=2&before={data['next_before']}" if data["next_before"] else None
+        conn.close()
+        self.assertEqual(seen, [f"Message {i}" for i in range(4, -1, -1)])
+
+        response, body = self.get("/api/messages?before=999")
+        self.assertEqual(response.status, 400)
+
+    def test_latest_page_served_from_cache(self):
+        """Test posted messages are written through to the recent-message cache"""
+        conn = self.connect()
+        posted = [self.post_message(conn, content=f"Message {i}")[1]["id"] for i in range(3)]
+        conn.request("GET", "/api/messages?limit=2")
+        data = json.loads(conn.getresponse().read())
+        conn.close()
+
+        self.assertEqual([m["id"] for m in data["messages"]], posted[:0:-1])
+        self.assertEqual(self.db.recent_cache.stats()["hits"], 1)
+
+    def test_rooms(self):
+        """Test posts land in their room and history is read per room"""
+        conn = self.connect()
+        self.post_message(conn, content="Lobby")
+        conn.request("POST", "/api/messages", body=json.dumps({"content": "Deploy", "sender": "User",
+                                                              "room_id": "ops"}),
+                     headers={"Content-Type": "application/json"})
+        response = conn.getresponse()
+        response.read()
+        self.assertEqual(response.status, 200)
+        conn.close()
+
+        _, body = self.get("/api/messages?room=ops")
+        self.assertEqual([m["content"] for m in json.loads(body)["messages"]], ["Deploy"])
+        _, body = self.get("/api/messages")
+        self.assertEqual([m["content"] for m in json.loads(body)["messages"]], ["Lobby"])
+        response, _ = self.get("/api/messages?room=../etc")
+        self.assertEqual(response.status, 400)
+
+    def get(self, path, headers=None):
+        conn = self.connect()
+        conn.request("GET", path, headers=headers or {})
+        response = conn.getresponse()
+        body = response.read()
+        conn.close()
+        return response, body
+
+    def test_export_streams_chunked(self):
+        """Test the export is chunked, complete and resumable with after="""
+        self.db.add_messages((f"Message {i}", "User") for i in range(2000))
+        conn = self.connect()
+        conn.request("GET", "/api/messages/export")
+        response = conn.getresponse()
+        data = json.loads(response.read())
+        self.assertEqual(response.getheader("Transfer-Encoding"), "chunked")
+        self.assertEqual(len(data["messages"]), 2000)
+        self.assertEqual(data["messages"][0]["content"], "Message 0")
+
+        # Same connection: the terminating chunk left it reusable
+        conn.request("GET", "/api/messages/export?after=1990", headers={"Accept": "application/x-ndjson"})
+        response = conn.getresponse()
+        lines = response.read().decode("utf-8").splitlines()
+        conn.close()
+        self.assertEqual(response.getheader("Content-type"), "application/x-ndjson")
+        self.assertEqual([json.loads(line)["id"] for line in lines], list(range(1991, 2001)))
+
+    def test_retried_post_is_deduplicated(self):
+        """Test a repeated client_id returns the first message, from memory or SQLite"""
+        before = {layer: app.DUPLICATE_POSTS.value(layer) for layer in ("memory", "database")}
+        conn = self.connect()
+        body = json.dumps({"content": "Once", "sender": "User", "client_id": "c-1"})
+        ids = []
+        for forget in (False, False, True):
+            if forget:
+                # As if the retry reached another process: only the unique index knows
+                self.httpd.client_ids = app.RecentClientIds()
+            conn.request("POST", "/api/messages", body=body, headers={"Content-Type": "application/json"})
+            ids.append(json.loads(conn.getresponse().read()))
+        conn.close()
+
+        self.assertEqual(len({data["id"] for data in ids}), 1)
+        self.assertEqual([data.get("duplicate", False) for data in ids], [False, True, True])
+        self.assertEqual(len(self.db.get_messages()), 1)
+        self.assertEqual({layer: app.DUPLICATE_POSTS.value(layer) - count for layer, count in before.items()},
+                         {"memory": 1, "database": 1})
+
+    def test_overload_is_shed_with_retry_after(self):
+        """Test rate-limited posts get 429 and posts over the in-flight cap 503, both with Retry-After"""
+        before = {reason: app.SHED_REQUESTS.value(reason) for reason in ("sender_rate", "in_flight")}
+        self.httpd.sender_limiter = app.RateLimiter(rate=0.1, burst=2)
+        conn = self.connect()
+        statuses = [self.post_message(conn, sender="Chatty")[0].status for _ in range(3)]
+        self.assertEqual(statuses, [200, 200, 429])
+        self.assertEqual(self.post_message(conn, sender="Quiet")[0].status, 200)
+
+        self.httpd.in_flight = app.InFlightLimiter(1)
+        self.httpd.in_flight.try_acquire()
+        response, data = self.post_message(conn, sender="Quiet")
+        conn.close()
+        self.assertEqual(response.status, 503)
+        self.assertEqual(response.getheader("Retry-After"), "1")
+        self.assertEqual(app.SHED_REQUESTS.value("sender_rate") - before["sender_rate"], 1)
+        self.assertEqual(app.SHED_REQUESTS.value("in_flight") - before["in_flight"], 1)
+        self.assertEqual(len(self.db.get_messages()), 3)
+
+    def test_search_endpoint(self):
+        """Test /api/search returns ranked pages and rejects a missing query"""
+        self.db.add_messages((f"release {i}" + " release" * (i % 2), "User") for i in range(5))
+        conn = self.connect()
+        seen = []
+        path = "/api/search?q=release&limit=2"
+        while path:
+            conn.request("GET", path)
+            data = json.loads(conn.getresponse().read())
+            seen.extend(message["id"] for message in data["messages"])
+            path = f"/api/search?q=release&limit=2&cursor={data['next_cursor']}" if data["next_cursor"] else None
+        conn.request("GET", "/api/search?q=")
+        response = conn.getresponse()
+        response.read()
+        conn.close()
+        # Messages repeating the word rank first, ties newest first
+        self.assertEqual(seen, [4, 2, 5, 3, 1])
+        self.assertEqual(response.status, 400)
+
+    def test_index_revalidation_and_gzip(self):
+        """Test the main page is gzip-encoded and revalidates with 304"""
+        response, body = self.get("/", {"Accept-Encoding": "gzip"})
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.getheader("Content-Encoding"), "gzip")
+        self.assertEqual(int(response.getheader("Content-Length")), len(body))
+        etag = response.getheader("ETag")
+
+        response, body = self.get("/", {"If-None-Match": etag})
+        self.assertEqual(response.status, 304)
+        self.assertEqual(response.getheader("Vary"), "Accept-Encoding")
+        self.assertEqual(body, b"")
+
+        for refused in ("gzip;q=0", "gzip; q=0.0, identity", "*;q=0"):
+            response, body = self.get("/", {"Accept-Encoding": refused})
+            self.assertEqual(response.status, 200)
+            self.assertIsNone(response.getheader("Content-Encoding"))
+            self.assertEqual(int(response.getheader("Content-Length")), len(body))
+        response, _ = self.get("/", {"Accept-Encoding": "br;q=0, gzip;q=0.5"})
+        self.assertEqual(response.getheader("Content-Encoding"), "gzip")
+
+    def test_static_files(self):
+        """Test large files stream with sendfile and paths cannot escape the root"""
+        original = app.STATIC_ASSETS
+        static_dir = Path(self.tmp.name) / "static"
+        static_dir.mkdir()
+        (static_dir / "app.js").write_bytes(b"console.log('x');\n" * 100)
+        app.STATIC_ASSETS = StaticAssetCache(static_dir, max_cached_size=64)
+        try:
+            response, body = self.get("/static/app.js", {"Accept-Encoding": "gzip"})
+            self.assertEqual(response.status, 200)
+            self.assertIsNone(response.getheader("Content-Encoding"))
+            self.assertEqual(body, (static_dir / "app.js").read_bytes())
+
+            response, _ = self.get("/static/../db.sqlite")
+            self.assertEqual(response.status, 404)
+        finally:
+            app.STATIC_ASSETS = original
+
+    def test_metrics_endpoint(self):
+        """Test /metrics reports request, database and route counters"""
+        conn = self.connect()
+        self.post_message(conn)
+        conn.close()
+        response, body = self.get("/metrics")
+        text = body.decode("utf-8")
+
+        self.assertEqual(response.status, 200)
+        self.assertTrue(response.getheader("Content-type").startswith("text/plain"))
+        self.assertRegex(text, r'chat_http_requests_total\{method="POST",route="/api/messages",status="200"\} \d+')
+        self.assertIn('chat_db_query_duration_seconds_count{method="add_message"}', text)
+
+    def test_health_and_readiness(self):
+        """Test /healthz always answers and /readyz fails once the server starts draining"""
+        response, body = self.get("/healthz")
+        self.assertEqual((response.status, json.loads(body)["status"]), (200, "ok"))
+        response, body = self.get("/readyz")
+        data = json.loads(body)
+        self.assertEqual((response.status, data["status"], data["recent_cache"]), (200, "ready", "database"))
+
+        self.httpd.ready = False
+        response, body = self.get("/readyz")
+        self.assertEqual(response.status, 503)
+        self.assertEqual(json.loads(body)["checks"], {"accepting": False, "database": True})
+
+    def read_event(self, response):
+        """Read one SSE event and return its data as a dict"""
+        data = None
+        while True:
+            line = response.fp.readline().decode("utf-8").rstrip("\n")
+            if line.startswith("data: "):
+                data = json.loads(line[len("data: "):])
+            elif line == "" and data is not None:
+                return data
+
+    def test_stream_delivers_new_and_missed_messages(self):
+        """Test /api/stream replays after the since cursor, then pushes new posts"""
+        first_id = self.db.add_message("Before", "User")
+        self.db.add_message("Missed", "User")
+
+        stream = self.connect()
+        stream.request("GET", f"/api/stream?since={first_id}")
+        response = stream.getresponse()
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.getheader("Content-type"), "text/event-stream")
+        self.assertEqual(self.read_event(response)["content"], "Missed")
+
+        conn = self.connect()
+        _, posted = self.post_message(conn, content="Live")
+        conn.close()
+        event = self.read_event(response)
+        self.assertEqual((event["id"], event["content"]), (posted["id"], "Live"))
+        stream.close()
+
+    def test_stream_keeps_out_of_order_live_events(self):
+        """Test concurrent posts published out of id order all reach the stream"""
+        first_id = self.db.add_message("Before", "User")
+        stream = self.connect()
+        stream.request("GET", f"/api/stream?since={first_id}")
+        response = stream.getresponse()
+        # Subscribed before the headers were sent
+        self.assertEqual(response.status, 200)
+        for message_id in (first_id + 2, first_id + 1):
+            self.httpd.broadcaster.publish({"id": message_id, "content": f"Live {message_id}", "sender": "User",
+                                            "timestamp": "2025-01-07 12:00:00", "room_id": "default"})
+        self.assertEqual([self.read_event(response)["id"] for _ in range(2)], [first_id + 2, first_id + 1])
+        stream.close()
+
+    def test_streams_over_cap_get_503(self):
+        """Test streams beyond MAX_STREAMS are refused so workers stay free"""
+        before = app.SHED_REQUESTS.value("streams")
+        self.httpd.streams = app.InFlightLimiter(1)
+        self.httpd.streams.try_acquire()
+        conn = self.connect()
+        conn.request("GET", "/api/stream")
+        response = conn.getresponse()
+        response.read()
+        conn.close()
+        self.assertEqual(response.status, 503)
+        self.assertEqual(response.getheader("Retry-After"), "1")
+        self.assertEqual(app.SHED_REQUESTS.value("streams") - before, 1)
+        self.assertLess(min(app.MAX_STREAMS, app.MAX_WORKERS - 1), app.MAX_WORKERS)
+
+    def test_keep_alive_reuses_connection(self):
+        """Test several requests share one HTTP/1.1 connection"""
+        conn = self.connect()
+        for i in range(3):
+            response, _ = self.post_message(conn, content=f"Message {i}")
+            self.assertEqual(response.status, 200)
+            self.assertEqual(response.version, 11)
+            self.assertFalse(response.will_close)
+        conn.close()
+        self.assertEqual(len(self.db.get_messages()), 3)
+
+    def test_oversized_body_rejected(self):
+        """Test bodies over MAX_REQUEST_SIZE get 413 without being read"""
+        conn = self.connect()
+        conn.putrequest("POST", "/api/messages")
+        conn.putheader("Content-Length", str(app.MAX_REQUEST_SIZE + 1))
+        conn.endheaders()
+        response = conn.getresponse()
+        response.read()
+        conn.close()
+        self.assertEqual(response.status, 413)
+
+    def test_connection_limit(self):
+        """Test connections beyond max_connections are answered with 503"""
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.httpd = app.BoundedThreadingHTTPServer(("127.0.0.1", 0), app.KeepAliveChatRequestHandler,
+                                                    max_workers=1, max_connections=1)
+        self.httpd.db = self.db
+        self.httpd.sync_worker = None
+        self.port = self.httpd.server_address[1]
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+        # Hold the only slot with an idle keep-alive connection
+        idle = socket.create_connection(("127.0.0.1", self.port))
+        try:
+            conn = self.connect()
+            conn.request("GET", "/")
+            response = conn.getresponse()
+            response.read()
+            conn.close()
+            self.assertEqual(response.status, 503)
+        finally:
+            idle.close()
+
+    def test_drain_waits_for_open_connections(self):
+        """Test shutdown waits for open connections, up to the grace period"""
+        conn = self.connect()
+        self.post_message(conn)
+        self.httpd.shutdown()
+        self.httpd.socket.close()
+        self.assertFalse(self.httpd.drain(0.1))
+
+        conn.close()
+        self.assertTrue(self.httpd.drain(5))
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+import unittest
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add parent directory to path to import the application modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tests.support import git, make_local_remote
+from async_git_manager import AsyncGitManager
+from git_manager import GitManager
+
+class TestAsyncGitManager(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        """Create a local remote and an async manager for its clone"""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.work = make_local_remote(Path(self.tmp.name))
+        self.manager = AsyncGitManager(GitManager("local", base_path=self.work), local_timeout=1)
+
+    async def asyncTearDown(self):
+        await self.manager.close()
+        self.tmp.cleanup()
+
+    def slow_commits(self):
+        """Make every commit spend seconds in a pre-commit hook, holding index.lock"""
+        hook = self.work / '.git' / 'hooks' / 'pre-commit'
+        hook.write_text("#!/bin/sh\nsleep 3\n")
+        hook.chmod(0o755)
+        return hook
+
+    def assert_clean_index(self):
+        self.assertFalse((self.work / '.git' / 'index.lock').exists())
+        self.assertEqual(git(['diff', '--cached', '--name-only'], cwd=self.work), "")
+
+    async def test_push_and_history(self):
+        """Test files are committed, pushed and read back without blocking the loop"""
+        paths = [await self.manager.create_message_file(f"Message {i}", "User", message_id=i) for i in (1, 2)]
+        commit_hash = await self.manager.push_messages(paths)
+
+        self.assertEqual(commit_hash, git(['rev-parse', 'origin/master'], cwd=self.work).strip())
+        history = await self.manager.get_message_history()
+        self.assertEqual([message['content'] for message in history], ["Message 1", "Message 2"])
+
+    async def test_timeout_abandons_commit(self):
+        """Test a commit past its timeout is killed and leaves the index usable"""
+        hook = self.slow_commits()
+        path = await self.manager.create_message_file("Slow", "User", message_id=1)
+
+        self.assertIsNone(await self.manager.push_message(path))
+        self.assert_clean_index()
+
+        hook.unlink()
+        self.assertIsNotNone(await self.manager.push_message(path))
+
+    async def test_foreign_lock_is_kept(self):
+        """Test a failed push leaves alone an index.lock some other git process holds"""
+        lock = self.work / '.git' / 'index.lock'
+        lock.write_text("")
+        path = await self.manager.create_message_file("Blocked", "User", message_id=1)
+
+        self.assertIsNone(await self.manager.push_message(path))
+        self.assertTrue(lock.exists())
+        lock.unlink()
+        self.assertIsNotNone(await self.manager.push_message(path))
+
+    async def test_cancel_abandons_commit(self):
+        """Test cancelling a push mid-commit cleans up before the task ends"""
+        self.slow_commits()
+        self.manager.local_timeout = 30
+        path = await self.manager.create_message_file("Cancelled", "User", message_id=1)
+        task = asyncio.create_task(self.manager.push_message(path))
+        await asyncio.sleep(0.5)
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+        self.assert_clean_index()
+        self.assertEqual(git(['rev-list', '--count', 'HEAD'], cwd=self.work).strip(), "1")
+
+    async def test_concurrency_is_bounded(self):
+        """Test no more than max_concurrency git processes run at once"""
+        git(['config', 'alias.nap', '!sleep 0.3'], cwd=self.work)
+        manager = AsyncGitManager(self.manager.git_manager, max_concurrency=2)
+        start = time.monotonic()
+        await asyncio.gather(*(manager._run_git(['nap'], "nap failed", 5) for _ in range(4)))
+        # Two rounds of two
+        self.assertGreaterEqual(time.monotonic() - start, 0.6)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+import unittest
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Add parent directory to path to import the application modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tests.support import git, make_local_remote
+from git_manager import GitManager
+from batch_sync import BatchSyncEngine
+
+class TestBatchSyncEngine(unittest.TestCase):
+    def setUp(self):
+        """Create a local remote so pushes never leave the machine"""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.work = make_local_remote(Path(self.tmp.name))
+        self.git_manager = GitManager("local", base_path=self.work)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_push_messages_single_commit(self):
+        """Test several files land in one commit on the remote"""
+        files = [self.git_manager.create_message_file(f"Message {i}", "User") for i in range(3)]
+        commit_hash = self.git_manager.push_messages(files)
+
+        self.assertIsNotNone(commit_hash)
+        remote_head = git(['rev-parse', 'origin/master'], cwd=self.work).strip()
+        self.assertEqual(commit_hash, remote_head)
+        changed = git(['show', '--name-only', '--format=', commit_hash], cwd=self.work).split()
+        self.assertEqual(len(changed), 3)
+
+    def test_flush_on_size_limit(self):
+        """Test a full batch is committed without waiting for the delay"""
+        engine = BatchSyncEngine(self.git_manager, max_batch_size=4, max_batch_delay=60)
+        engine.start()
+        try:
+            futures = [
+                engine.submit(self.git_manager.create_message_file(f"Message {i}", "User"))
+                for i in range(4)
+            ]
+            hashes = {future.result(timeout=30) for future in futures}
+        finally:
+            engine.stop()
+
+        self.assertEqual(len(hashes), 1)
+        self.assertIsNotNone(hashes.pop())
+        self.assertEqual(engine.batches_committed, 1)
+
+    def test_flush_on_time_limit(self):
+        """Test a partial batch is committed once the delay expires"""
+        results = []
+        engine = BatchSyncEngine(self.git_manager, max_batch_size=100, max_batch_delay=0.05)
+        engine.start()
+        try:
+            filepath = self.git_manager.create_message_file("Lonely message", "User")
+            future = engine.submit(filepath, callback=lambda path, h: results.append((path, h)))
+            commit_hash = future.result(timeout=30)
+        finally:
+            engine.stop()
+
+        self.assertIsNotNone(commit_hash)
+        self.assertEqual(results, [(filepath, commit_hash)])
+
+    def test_flush_with_nothing_pending_is_ignored(self):
+        """Test an empty flush does not make the next submit skip the delay"""
+        engine = BatchSyncEngine(self.git_manager, max_batch_size=100, max_batch_delay=60)
+        engine.start()
+        try:
+            engine.flush()
+            future = engine.submit(self.git_manager.create_message_file("Later", "User"))
+            with self.assertRaises(TimeoutError):
+                future.result(timeout=0.3)
+        finally:
+            engine.stop()
+        self.assertIsNotNone(future.result(timeout=30))
+
+    def test_failed_batch_resolves_to_none(self):
+        """Test futures resolve to None when the push fails"""
+        engine = BatchSyncEngine(self.git_manager, max_batch_size=1)
+        engine.start()
+        try:
+            future = engine.submit(str(self.git_manager.messages_dir / "missing.json"))
+            self.assertIsNone(future.result(timeout=30))
+        finally:
+            engine.stop()
+        self.assertEqual(engine.batches_failed, 1)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
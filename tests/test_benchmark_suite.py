@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+import unittest
+import os
+import sys
+
+# Add parent directory to path to import the application modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.suite import compare, run
+
+class TestBenchmarkSuite(unittest.TestCase):
+    def test_compare_flags_only_regressions(self):
+        """Test rates that fell and latencies that grew past the threshold are reported"""
+        config = {"messages": 10}
+        baseline = {"config": config,
+                    "database": {"inserts_per_sec": 1000, "reads_per_sec": 1000, "p99_ms": 10.0},
+                    "pipeline": {"levels": {"c10": {"errors": 0, "requests": 100}}, "remote_commits": 5}}
+        results = {"config": config,
+                   "database": {"inserts_per_sec": 700, "reads_per_sec": 1500, "p99_ms": 11.0},
+                   "pipeline": {"levels": {"c10": {"errors": 3, "requests": 100}}, "remote_commits": 1}}
+
+        regressions = compare(results, baseline, threshold=20)
+        self.assertEqual([r["metric"] for r in regressions],
+                         ["database.inserts_per_sec", "pipeline.levels.c10.errors"])
+        self.assertEqual(regressions[0]["change_pct"], -30.0)
+        self.assertEqual(compare(results, baseline, threshold=50)[0]["metric"], "pipeline.levels.c10.errors")
+
+        with self.assertRaises(ValueError):
+            compare(results, dict(baseline, config={"messages": 20}))
+
+    def test_offline_run(self):
+        """Test the database and git scenarios run against a local remote"""
+        results = run(("database", "git"), messages=200, single_inserts=20, reads=20,
+                      git_messages=20, pushes=3)
+        self.assertGreater(results["database"]["batched_inserts_per_sec"], 0)
+        self.assertGreater(results["git"]["pushes_per_sec"], 0)
+        self.assertIn("bulk_push_seconds", results["git"])
+        self.assertEqual(compare(results, results), [])
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
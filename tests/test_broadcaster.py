@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+import unittest
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+# Add parent directory to path to import the application modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from broadcaster import DatabaseFeed, MessageBroadcaster
+from database.db_utils import DatabaseManager
+from database.init_db import DatabaseInitializer
+
+class TestMessageBroadcaster(unittest.TestCase):
+    def test_fan_out_latency_500_subscribers(self):
+        """Test one publish reaches 500 waiting subscribers within milliseconds"""
+        broadcaster = MessageBroadcaster()
+        subscriber_count = 500
+        latencies = []
+        lock = threading.Lock()
+        ready = threading.Barrier(subscriber_count + 1)
+
+        def listen():
+            subscription = broadcaster.subscribe()
+            ready.wait()
+            event = subscription.get(timeout=10)
+            received = time.perf_counter()
+            with lock:
+                latencies.append(received - event["sent"])
+            subscription.close()
+
+        threads = [threading.Thread(target=listen) for _ in range(subscriber_count)]
+        for thread in threads:
+            thread.start()
+        ready.wait()
+
+        delivered = broadcaster.publish({"id": 1, "sent": time.perf_counter()})
+        for thread in threads:
+            thread.join(timeout=10)
+
+        latencies.sort()
+        p50 = latencies[len(latencies) // 2] * 1000
+        p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+        print(f"\nFan-out to {subscriber_count} subscribers: p50={p50:.2f}ms p99={p99:.2f}ms max={latencies[-1] * 1000:.2f}ms")
+
+        self.assertEqual(delivered, subscriber_count)
+        self.assertEqual(len(latencies), subscriber_count)
+        self.assertLess(p99, 500)
+        self.assertEqual(broadcaster.stats()["subscribers"], 0)
+
+    def test_slow_subscriber_is_dropped(self):
+        """Test a full buffer drops that subscriber without affecting others"""
+        broadcaster = MessageBroadcaster(max_buffer=2)
+        slow = broadcaster.subscribe()
+        fast = broadcaster.subscribe()
+
+        for i in range(3):
+            broadcaster.publish({"id": i})
+            self.assertEqual(fast.get(timeout=1), {"id": i})
+
+        self.assertTrue(slow.dropped)
+        with self.assertRaises(ConnectionAbortedError):
+            slow.get(timeout=1)
+        stats = broadcaster.stats()
+        self.assertEqual(stats["subscribers"], 1)
+        self.assertEqual(stats["dropped_subscribers"], 1)
+
+    def test_close_ends_streams(self):
+        """Test close() wakes every subscriber"""
+        broadcaster = MessageBroadcaster()
+        subscription = broadcaster.subscribe()
+        broadcaster.close()
+        with self.assertRaises(ConnectionAbortedError):
+            subscription.get(timeout=1)
+
+class TestDatabaseFeed(unittest.TestCase):
+    def test_publishes_rows_from_other_writers(self):
+        """Test rows committed through another connection are published in id order"""
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = Path(tmp) / "db.sqlite"
+            DatabaseInitializer(db_path).init_database()
+            reader, writer = DatabaseManager(db_path), DatabaseManager(db_path)
+            writer.add_message("Before the feed", "User")
+
+            broadcaster = MessageBroadcaster()
+            subscription = broadcaster.subscribe()
+            feed = DatabaseFeed(reader, broadcaster, batch_size=2)
+            feed.start()
+            feed.stop()
+            ids = [writer.add_message(f"Message {i}", "User", room_id="ops") for i in range(3)]
+
+            self.assertEqual(feed.poll(), 3)
+            self.assertEqual([(event["id"], event["room_id"]) for event in (subscription.get(timeout=1) for _ in ids)],
+                             [(message_id, "ops") for message_id in ids])
+            self.assertIsNone(subscription.get(timeout=0.01))
+            reader.close()
+            writer.close()
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+import unittest
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Add parent directory to path to import the application modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tests.support import git, make_local_remote
+from bulk_transfer import export_messages, import_messages
+from database.db_utils import DatabaseManager
+from database.init_db import DatabaseInitializer
+from git_manager import GitManager
+from history_archive import archive_history
+
+class TestBulkTransfer(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        self.work = make_local_remote(self.root)
+        self.db_path = self.root / "imported.sqlite"
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def messages(self, db_path=None):
+        db = DatabaseManager(db_path or self.db_path)
+        try:
+            return sorted(db.get_messages(limit=1000), key=lambda row: row['id'])
+        finally:
+            db.close()
+
+    def test_import_files_with_git_hashes(self):
+        """Test message files are imported with the commit that added them"""
+        manager = GitManager("local", base_path=self.work)
+        first = manager.push_messages([manager.create_message_file(f"A{i}", "User", message_id=i) for i in (1, 2)])
+        second = manager.push_messages([manager.create_message_file("B", "User", message_id=3)])
+        manager.create_message_file("Unpushed", "User", message_id=4)
+
+        result = import_messages(self.db_path, manager.messages_dir, workers=2)
+        self.assertEqual(result['rows'], 4)
+
+        rows = self.messages()
+        self.assertEqual([row['id'] for row in rows], [1, 2, 3, 4])
+        self.assertEqual([row['git_hash'] for row in rows], [first, first, second, None])
+        self.assertEqual([row['is_synced'] for row in rows], [1, 1, 1, 0])
+
+        # A second run adds nothing, but rereads the unpushed file
+        self.assertEqual(import_messages(self.db_path, manager.messages_dir, workers=2)['rows'], 0)
+        third = manager.push_messages([str(manager.messages_dir / name) for name in os.listdir(manager.messages_dir)
+                                       if name.endswith('.json')])
+        self.assertEqual(import_messages(self.db_path, manager.messages_dir, workers=2)['rows'], 1)
+        self.assertEqual([(row['git_hash'], row['is_synced']) for row in self.messages()][3], (third, 1))
+        self.assertEqual(import_messages(self.db_path, manager.messages_dir, workers=2)['rows'], 0)
+
+    def test_resumed_import_reports_its_own_time(self):
+        """Test a resumed import times itself, not the offsets it resumed from"""
+        manager = GitManager("local", base_path=self.work)
+        manager.push_messages([manager.create_message_file(f"A{i}", "User", message_id=i) for i in range(1, 6)])
+        import_messages(self.db_path, manager.messages_dir, workers=1)
+        manager.push_messages([manager.create_message_file(f"B{i}", "User", message_id=i) for i in range(6, 11)])
+
+        started = time.perf_counter()
+        result = import_messages(self.db_path, manager.messages_dir, workers=1)
+        self.assertEqual(result['rows'], 5)
+        # seconds is rounded to the millisecond
+        self.assertLessEqual(result['seconds'], time.perf_counter() - started + 0.0005)
+        self.assertGreater(result['rows_per_sec'], 0)
+
+    def test_import_segments_resumes(self):
+        """Test segment records map to the commit that first contained them"""
+        manager = GitManager("local", base_path=self.work, storage_format="segments")
+        first = manager.push_messages([manager.create_message_file("One", "User", message_id=1)])
+        second = manager.push_messages([manager.create_message_file("Two", "User", message_id=2)])
+
+        self.assertEqual(import_messages(self.db_path, manager.messages_dir, workers=1)['rows'], 2)
+        manager.create_message_file("Three", "User", message_id=3)
+        manager.segment_log.close()
+        # Only the bytes appended since the last run are parsed
+        self.assertEqual(import_messages(self.db_path, manager.messages_dir, workers=1)['rows'], 1)
+
+        rows = self.messages()
+        self.assertEqual([row['content'] for row in rows], ["One", "Two", "Three"])
+        self.assertEqual([row['git_hash'] for row in rows], [first, second, None])
+
+        # Once pushed, the next run fills in the hash of the unsynced record
+        third = manager.push_messages([str(manager.segment_log.active_segment)])
+        self.assertEqual(import_messages(self.db_path, manager.messages_dir, workers=1)['rows'], 1)
+        self.assertEqual(self.messages()[2]['git_hash'], third)
+
+        # The search index is rebuilt after each import and the trigger restored
+        db = DatabaseManager(self.db_path)
+        try:
+            self.assertEqual([row['id'] for row in db.search_messages("Three")], [3])
+            db.add_message("Four", "User")
+            self.assertEqual(len(db.search_messages("Four")), 1)
+        finally:
+            db.close()
+
+    def test_import_archive_blocks(self):
+        """Test archived messages import with the commit that added their block"""
+        manager = GitManager("local", base_path=self.work)
+        old = datetime(2024, 1, 1)
+        manager.push_messages([manager.create_message_file(f"Old {i}", "User", timestamp=old, message_id=i)
+                               for i in (1, 2)])
+        archive_history(manager.messages_dir, timedelta(days=30))
+        git(['add', '-A', 'messages'], cwd=self.work)
+        git(['commit', '-q', '-m', 'Archive old messages'], cwd=self.work)
+        archived = git(['rev-parse', 'HEAD'], cwd=self.work).strip()
+
+        self.assertEqual(import_messages(self.db_path, manager.messages_dir, workers=1)['rows'], 2)
+        self.assertEqual([(row['content'], row['git_hash']) for row in self.messages()],
+                         [("Old 1", archived), ("Old 2", archived)])
+
+    def test_export_round_trip(self):
+        """Test exported files import back into the same rows"""
+        source = self.root / "source.sqlite"
+        DatabaseInitializer(source).init_database()
+        db = DatabaseManager(source)
+        for i in range(7):
+            db.add_message(f"Message {i}", "User", timestamp=f"2025-01-0{i + 1} 12:00:00")
+        db.close()
+
+        for storage_format in ("files", "segments"):
+            out = self.root / f"export_{storage_format}"
+            self.assertEqual(export_messages(source, out, storage_format, batch_size=3)['rows'], 7)
+            # Resuming finds nothing left to write
+            self.assertEqual(export_messages(source, out, storage_format, batch_size=3)['rows'], 0)
+
+            target = self.root / f"{storage_format}.sqlite"
+            import_messages(target, out, workers=1)
+            self.assertEqual(
+                [(row['id'], row['content'], row['timestamp']) for row in self.messages(target)],
+                [(row['id'], row['content'], row['timestamp']) for row in self.messages(source)])
+
+    def test_rooms_round_trip(self):
+        """Test import takes the room from the directory and export writes it back there"""
+        manager = GitManager("local", base_path=self.work)
+        lobby = manager.push_messages([manager.create_message_file("Lobby", "User", message_id=1)])
+        ops = manager.push_messages([manager.create_message_file("Deploy", "User", message_id=2, room_id="ops")])
+
+        self.assertEqual(import_messages(self.db_path, manager.messages_dir, workers=1)['rows'], 2)
+        db = DatabaseManager(self.db_path)
+        self.assertEqual([(m['content'], m['git_hash']) for m in db.get_messages(room_id="ops")], [("Deploy", ops)])
+        self.assertEqual([(m['content'], m['git_hash']) for m in db.get_messages()], [("Lobby", lobby)])
+        db.close()
+
+        out = self.root / "export"
+        self.assertEqual(export_messages(self.db_path, out)['rows'], 2)
+        self.assertEqual(len(list((out / "rooms" / "ops").glob("message_*.json"))), 1)
+        self.assertEqual(len(list(out.glob("message_*.json"))), 1)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
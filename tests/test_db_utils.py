@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+import unittest
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+from pathlib import Path
+
+# Add parent directory to path to import the application modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database.db_utils import DatabaseManager, DuplicateMessageError, UnknownCursorError
+from database.init_db import DatabaseInitializer
+from recent_cache import RecentMessageCache
+
+class TestDatabaseManager(unittest.TestCase):
+    def setUp(self):
+        """Create a temporary database from schema.sql"""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = Path(self.tmp.name) / "db.sqlite"
+        DatabaseInitializer(self.db_path).init_database()
+        self.db = DatabaseManager(self.db_path)
+
+    def tearDown(self):
+        self.db.close()
+        self.tmp.cleanup()
+
+    def test_pooled_connection_uses_wal(self):
+        """Test pooled connections are reused per thread and run in WAL mode"""
+        with self.db.get_db() as first, self.db.get_db() as second:
+            self.assertIs(first, second)
+            self.assertEqual(first.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+
+        other = []
+        thread = threading.Thread(target=lambda: other.append(self.db.get_db().__enter__()))
+        thread.start()
+        thread.join()
+        with self.db.get_db() as conn:
+            self.assertIsNot(other[0], conn)
+
+    def test_add_messages_batch(self):
+        """Test a batch insert stores every message"""
+        inserted = self.db.add_messages((f"Message {i}", "User") for i in range(10))
+        self.assertEqual(inserted, 10)
+        self.assertEqual(self.db.count_unsynced_messages(), 10)
+
+    def test_keyset_pages_through_equal_timestamps(self):
+        """Test pages split a run of equal timestamps by id, and an unknown cursor is an error"""
+        self.db.add_message("Older", "User", timestamp="2025-01-01 00:00:00")
+        for i in range(5):
+            self.db.add_message(f"Same {i}", "User", timestamp="2025-01-01 00:00:01")
+        self.db.add_message("Newer", "User", timestamp="2025-01-01 00:00:02")
+
+        seen, before = [], None
+        while True:
+            page = self.db.get_messages(limit=3, before_id=before)
+            seen.extend(m["content"] for m in page)
+            if len(page) < 3:
+                break
+            before = page[-1]["id"]
+        self.assertEqual(seen, ["Newer"] + [f"Same {i}" for i in range(4, -1, -1)] + ["Older"])
+        with self.db.get_db() as conn:
+            plan = " ".join(row[3] for row in conn.execute(
+                "EXPLAIN QUERY PLAN SELECT id FROM messages WHERE room_id = 'default' AND timestamp = '' "
+                "AND id < 3 ORDER BY id DESC"))
+        self.assertIn("timestamp=? AND id<?", plan)
+
+        with self.assertRaises(UnknownCursorError):
+            self.db.get_messages(before_id=999)
+
+    def test_failed_statement_rolls_back(self):
+        """Test an error inside get_db does not leave a transaction open"""
+        with self.assertRaises(sqlite3.IntegrityError):
+            with self.db.get_db() as conn:
+                conn.execute("INSERT INTO messages (content, sender) VALUES ('kept?', 'User')")
+                conn.execute("INSERT INTO messages (content) VALUES ('no sender')")
+        with self.db.get_db() as conn:
+            self.assertFalse(conn.in_transaction)
+        self.assertEqual(self.db.get_messages(), [])
+
+    def test_unpooled_mode(self):
+        """Test the connection-per-call mode still works"""
+        db = DatabaseManager(self.db_path, pooled=False)
+        message_id = db.add_message("Hello", "User")
+        self.assertTrue(db.update_git_hash(message_id, "abc123"))
+        self.assertEqual(db.get_messages()[0]["git_hash"], "abc123")
+
+    def test_search_ranks_filters_and_pages(self):
+        """Test full-text search ranks matches and pages through them with a cursor"""
+        self.db.add_message("deploy finished", "alice", timestamp="2024-01-01 10:00:00")
+        self.db.add_message("deploy deploy rollback", "bob", timestamp="2024-01-02 10:00:00")
+        self.db.add_message("lunch?", "alice", timestamp="2024-01-03 10:00:00")
+        self.db.add_message("Déployé: deploying now", "alice", timestamp="2024-01-04 10:00:00")
+
+        ranked = self.db.search_messages("deploy")
+        self.assertEqual([m["id"] for m in ranked], [2, 1])
+        self.assertEqual([m["id"] for m in self.db.search_messages("deploy*", order="recent")], [4, 2, 1])
+        self.assertEqual([m["id"] for m in self.db.search_messages("deploy", sender="alice")], [1])
+        self.assertEqual([m["id"] for m in self.db.search_messages(
+            "deploy*", since="2024-01-02 00:00:00", until="2024-01-04 00:00:00")], [2])
+
+        first = self.db.search_messages("deploy", limit=1)
+        rest = self.db.search_messages("deploy", limit=1, after=(first[0]["rank"], first[0]["id"]))
+        self.assertEqual([m["id"] for m in first + rest], [2, 1])
+
+        # Query syntax in user input is matched literally, never parsed
+        self.assertEqual(self.db.search_messages('deploy" OR (lunch'), [])
+
+    def test_search_index_follows_updates_and_backfill(self):
+        """Test triggers keep the index in sync and migration backfills old history"""
+        message_id = self.db.add_message("old words", "User")
+        with self.db.get_db() as conn:
+            conn.execute("UPDATE messages SET content = 'new words' WHERE id = ?", (message_id,))
+            conn.commit()
+        self.assertEqual(self.db.search_messages("old"), [])
+        self.assertEqual(len(self.db.search_messages("new")), 1)
+
+        # A database from before the index existed gets it filled on migration
+        with self.db.get_db() as conn:
+            conn.executescript("DROP TRIGGER messages_fts_insert; DROP TABLE messages_fts;")
+            conn.execute("INSERT INTO messages (content, sender) VALUES ('history', 'User')")
+            conn.commit()
+        self.assertTrue(DatabaseInitializer(self.db_path).migrate_database())
+        self.assertEqual(len(self.db.search_messages("history")), 1)
+
+    def test_duplicate_client_id(self):
+        """Test a client_id is stored once and a repeat reports the original id"""
+        message_id = self.db.add_message("Once", "User", client_id="c-1")
+        self.db.add_message("No key", "User")
+        self.db.add_message("No key", "User")
+        with self.assertRaises(DuplicateMessageError) as raised:
+            self.db.add_message("Once", "User", client_id="c-1")
+        self.assertEqual(raised.exception.message_id, message_id)
+        self.assertEqual(len(self.db.get_messages()), 3)
+
+    def test_rooms_are_separate(self):
+        """Test history, search and the recent cache only see their own room"""
+        self.db.add_messages((f"Ops {i}", "User") for i in range(3))
+        self.db.add_messages([("Older ops", "User")], room_id="ops")
+        self.db.attach_recent_cache(RecentMessageCache(10))
+
+        # The first post to a room warms its buffer with the history before it
+        self.db.add_message("Newer ops", "User", room_id="ops")
+        self.assertEqual([m["content"] for m in self.db.get_messages(room_id="ops")], ["Newer ops", "Older ops"])
+        self.assertEqual(self.db.recent_cache.stats()["misses"], 0)
+        self.assertEqual([m["content"] for m in self.db.get_messages()], ["Ops 2", "Ops 1", "Ops 0"])
+
+        self.assertEqual([m["content"] for m in self.db.search_messages("ops", room_id="ops")],
+                         ["Newer ops", "Older ops"])
+        self.assertEqual(len(self.db.search_messages("ops")), 5)
+        self.assertEqual([m["content"] for m in self.db.get_messages_after(0, room_id="ops")],
+                         ["Older ops", "Newer ops"])
+        with self.db.get_db() as conn:
+            plan = " ".join(row[3] for row in conn.execute(
+                "EXPLAIN QUERY PLAN SELECT id FROM messages WHERE id > 0 AND room_id = 'ops' ORDER BY id"))
+        self.assertIn("idx_messages_room_id (room_id=? AND id>?)", plan)
+
+    def test_migration_adds_client_id(self):
+        """Test a database from before client_id gains the column and its index"""
+        old_path = Path(self.tmp.name) / "old.sqlite"
+        conn = sqlite3.connect(old_path)
+        conn.execute("""
+            CREATE TABLE messages (id INTEGER PRIMARY KEY AUTOINCREMENT, content TEXT NOT NULL,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP, git_hash TEXT, sender TEXT NOT NULL,
+                is_synced BOOLEAN DEFAULT 0)
+        """)
+        conn.execute("INSERT INTO messages (content, sender) VALUES ('Before', 'User')")
+        conn.commit()
+        conn.close()
+
+        self.assertTrue(DatabaseInitializer(old_path).migrate_database())
+        db = DatabaseManager(old_path)
+        db.add_message("After", "User", client_id="c-1")
+        with self.assertRaises(DuplicateMessageError):
+            db.add_message("After", "User", client_id="c-1")
+        self.assertEqual(len(db.search_messages("before")), 1)
+        # Everything from before rooms belongs to the default room
+        self.assertEqual([m["content"] for m in db.get_messages()], ["After", "Before"])
+        db.close()
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
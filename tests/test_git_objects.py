@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+import unittest
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Add parent directory to path to import the application modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tests.support import git, make_local_remote
+from git_manager import GitManager
+from git_objects import FastCommitWriter, GitObjectError
+
+class TestFastCommitWriter(unittest.TestCase):
+    def setUp(self):
+        """Create a local remote and a writer on its clone"""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.work = make_local_remote(Path(self.tmp.name))
+        self.writer = FastCommitWriter(self.work)
+
+    def tearDown(self):
+        self.writer.close()
+        self.tmp.cleanup()
+
+    def write(self, relative_path, content):
+        path = self.work / relative_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+        return str(path)
+
+    def test_commit_matches_git(self):
+        """Test commits are valid objects with the files at their paths"""
+        first = self.writer.commit_files([self.write("messages/a.json", "one")], "Add a")
+        second = self.writer.commit_files(
+            [self.write("messages/b.json", "two"), self.write("messages/segments/s.jsonl", "three")],
+            "Add b and s")
+
+        self.assertEqual(git(['rev-parse', 'HEAD'], cwd=self.work).strip(), second)
+        self.assertEqual(git(['rev-parse', 'HEAD~1'], cwd=self.work).strip(), first)
+        self.assertEqual(git(['show', 'HEAD:messages/a.json'], cwd=self.work), "one")
+        self.assertEqual(git(['show', 'HEAD:messages/segments/s.jsonl'], cwd=self.work), "three")
+        self.assertEqual(git(['log', '-1', '--format=%an <%ae> %s'], cwd=self.work).strip(),
+                         "Offline <offline@localhost> Add b and s")
+        git(['fsck', '--strict'], cwd=self.work)
+
+    def test_tree_order_matches_git(self):
+        """Test the written tree hashes the same as one built by git itself"""
+        paths = [self.write(name, name) for name in ("a.b", "a/x", "a-b", "a0")]
+        commit = self.writer.commit_files(paths, "Mixed names")
+        git(['add', '.'], cwd=self.work)
+        expected = git(['write-tree'], cwd=self.work).strip()
+        self.assertEqual(git(['rev-parse', f'{commit}^{{tree}}'], cwd=self.work).strip(), expected)
+
+    def test_unchanged_files_reuse_head(self):
+        """Test committing identical contents again creates no commit"""
+        path = self.write("messages/a.json", "one")
+        first = self.writer.commit_files([path], "Add a")
+        self.assertEqual(self.writer.commit_files([path], "Add a again"), first)
+        self.assertEqual(self.writer.commits_written, 1)
+
+    def test_locked_ref_rejected(self):
+        """Test a ref held by another git process is left alone"""
+        lock = self.work / ".git" / "refs" / "heads" / "master.lock"
+        lock.write_text("")
+        before = self.writer.read_ref()
+        with self.assertRaises(GitObjectError):
+            self.writer.commit_files([self.write("messages/a.json", "one")], "Add a")
+        self.assertEqual(self.writer.read_ref(), before)
+
+class TestFastCommitMode(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.work = make_local_remote(Path(self.tmp.name))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_push_every_commit(self):
+        """Test fast mode without an interval pushes like the CLI path"""
+        manager = GitManager("local", base_path=self.work, commit_mode="fast", push_interval=0)
+        files = [manager.create_message_file(f"Message {i}", "User") for i in range(3)]
+        commit_hash = manager.push_messages(files)
+        manager.close()
+
+        self.assertEqual(git(['rev-parse', 'origin/master'], cwd=self.work).strip(), commit_hash)
+        self.assertEqual(git(['status', '--porcelain'], cwd=self.work), "")
+
+    def test_push_interval_defers_push(self):
+        """Test commits wait for the push interval or a forced push"""
+        manager = GitManager("local", base_path=self.work, commit_mode="fast", push_interval=3600)
+        remote_before = git(['rev-parse', 'origin/master'], cwd=self.work).strip()
+        first = manager.push_messages([manager.create_message_file("One", "User")])
+        second = manager.push_messages([manager.create_message_file("Two", "User")])
+
+        self.assertNotEqual(first, second)
+        self.assertEqual(git(['rev-parse', 'origin/master'], cwd=self.work).strip(), remote_before)
+        self.assertTrue(manager.push_pending(force=True))
+        self.assertEqual(git(['rev-parse', 'origin/master'], cwd=self.work).strip(), second)
+        manager.close()
+
+    def test_restart_pushes_commits_held_back(self):
+        """Test commits a stopped process never pushed go out on the next start"""
+        manager = GitManager("local", base_path=self.work, commit_mode="fast", push_interval=3600)
+        held_back = manager.push_messages([manager.create_message_file("One", "User")])
+        manager.close()
+        self.assertNotEqual(git(['rev-parse', 'origin/master'], cwd=self.work).strip(), held_back)
+
+        restarted = GitManager("local", base_path=self.work, commit_mode="fast", push_interval=3600)
+        self.assertTrue(restarted.push_pending())
+        restarted.close()
+        self.assertEqual(git(['rev-parse', 'origin/master'], cwd=self.work).strip(), held_back)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+import unittest
+import json
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Add parent directory to path to import the application modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from git_manager import GitManager
+from history_archive import archive_history, storage_stats
+from message_codec import CodecError, decode_block, encode_block, zstandard
+
+class TestMessageCodec(unittest.TestCase):
+    def test_round_trip(self):
+        """Test every message decodes exactly as it was, key order included"""
+        messages = [
+            {"content": "Hi", "sender": "Alice", "timestamp": "2025-01-07T15:44:54.387856", "id": 7},
+            {"content": "Later", "sender": "Bob", "timestamp": "2025-01-07T15:44:55", "id": 3},
+            {"content": "No id", "sender": "Alice", "timestamp": "2025-01-07 15:44:55+00:00"},
+            {"content": "Null id", "sender": "Alice", "timestamp": "2025-01-07T15:44:56", "id": None},
+            {"content": "Extra", "sender": "Alice", "timestamp": "2025-01-08T00:00:00", "room": "ops"},
+            {"unexpected": ["shape"]},
+        ]
+        for compression in ("none", "zlib"):
+            decoded = decode_block(encode_block(messages, compression))
+            self.assertEqual([json.dumps(m) for m in decoded], [json.dumps(m) for m in messages])
+
+    def test_corrupt_block(self):
+        """Test damaged blocks raise CodecError rather than returning bad data"""
+        block = encode_block([{"content": "Hi", "sender": "Alice", "timestamp": "2025-01-07T15:44:54"}])
+        with self.assertRaises(CodecError):
+            decode_block(block[:-4])
+        with self.assertRaises(CodecError):
+            decode_block(b"not a block")
+
+    @unittest.skipIf(zstandard is None, "zstandard is not installed")
+    def test_corrupt_zstd_block(self):
+        """Test a damaged zstd body raises CodecError too"""
+        block = encode_block([{"content": "Hi", "sender": "Alice", "timestamp": "2025-01-07T15:44:54"}], "zstd")
+        with self.assertRaises(CodecError):
+            decode_block(block[:-4])
+
+class TestHistoryArchive(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.now = datetime(2025, 3, 1)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_cold_history_is_archived_transparently(self):
+        """Test old files and closed segments move into blocks and history reads the same"""
+        base = Path(self.tmp.name)
+        (base / "files").mkdir()
+        (base / "segments").mkdir()
+        files = GitManager("local", base_path=base / "files")
+        segments = GitManager("local", base_path=base / "segments", storage_format="segments", segment_bytes=300)
+        for manager in (files, segments):
+            for day in range(40):
+                manager.create_message_file(f"Message {day}", f"User {day % 3}", message_id=day + 1,
+                                            timestamp=datetime(2025, 1, 1) + timedelta(days=day, hours=1))
+
+            before = manager.get_message_history()
+            result = archive_history(manager.messages_dir, timedelta(days=30), now=self.now)
+            self.assertGreater(result["messages"], 0)
+            self.assertLess(result["bytes_after"], result["bytes_before"])
+            self.assertEqual(manager.get_message_history(), before)
+
+            # A new message adds to the archived history rather than replacing
+            # it, once the index trusts the archive directory's mtime
+            archive_dir = manager.messages_dir / "archive"
+            aged = archive_dir.stat().st_mtime_ns - 10 ** 10
+            os.utime(archive_dir, ns=(aged, aged))
+            self.assertEqual(manager.get_message_history(), before)
+            manager.create_message_file("New", "User", message_id=100, timestamp=self.now)
+            self.assertEqual(manager.get_message_history(), before + [manager.get_message_history()[-1]])
+            self.assertEqual(len(manager.get_message_history()), 41)
+
+        # Only messages past the cutoff moved; recent files stay as they are
+        self.assertEqual(len(list(files.messages_dir.glob("message_*.json"))), 12)
+        stats = storage_stats(files.messages_dir)
+        self.assertEqual(stats["archives"]["messages"], 29)
+        # The active segment is never archived, however old
+        self.assertTrue(segments.segment_log.active_segment.exists())
+        files.close()
+        segments.close()
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
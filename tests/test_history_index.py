@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+import unittest
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Add parent directory to path to import the application modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from git_manager import GitManager
+from history_index import HistoryIndex
+
+class TestHistoryIndex(unittest.TestCase):
+    def setUp(self):
+        """Use a throwaway base path so the index and messages stay local"""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.git_manager = GitManager("local", base_path=Path(self.tmp.name))
+        self.start = datetime(2025, 1, 7, 12, 0, 0)
+        for i in range(5):
+            self.git_manager.create_message_file(f"Message {i}", "User",
+                                                 timestamp=self.start + timedelta(minutes=i))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_only_new_files_are_parsed(self):
+        """Test a warm call parses nothing and new files are picked up"""
+        self.assertEqual(len(self.git_manager.get_message_history()), 5)
+        index = self.git_manager._room_history_index("default")
+        self.assertEqual(index.refresh(), 0)
+
+        self.git_manager.create_message_file("Message 5", "User",
+                                             timestamp=self.start + timedelta(minutes=5))
+        self.assertEqual(index.refresh(), 1)
+        self.assertEqual(len(self.git_manager.get_message_history()), 6)
+
+    def test_same_tick_and_rewritten_files_are_found(self):
+        """Test a file hidden by an unchanged directory mtime or rewritten in place is still indexed"""
+        messages_dir = self.git_manager.messages_dir
+        index = HistoryIndex(messages_dir, Path(self.tmp.name) / "index.sqlite", verify_interval=3600)
+        self.addCleanup(index.close)
+        index.refresh()
+        dir_mtime = messages_dir.stat().st_mtime_ns
+
+        # A coarse clock: the new file leaves the directory mtime as it was
+        self.git_manager.create_message_file("Message 5", "User", timestamp=self.start + timedelta(minutes=5))
+        os.utime(messages_dir, ns=(dir_mtime, dir_mtime))
+        self.assertEqual(index.refresh(), 1)
+
+        first = sorted(messages_dir.glob('message_*.json'))[0]
+        first.write_text(first.read_text().replace("Message 0", "Edited 0"))
+        index.verify_interval = 0
+        self.assertEqual(index.refresh(), 1)
+        self.assertEqual(index.query(limit=1)[0]['content'], "Edited 0")
+        self.assertEqual(index.count(), 6)
+
+    def test_removed_files_are_dropped(self):
+        """Test deleting a file removes it from the history"""
+        self.git_manager.get_message_history()
+        first = sorted(self.git_manager.messages_dir.glob('message_*.json'))[0]
+        first.unlink()
+        contents = [m['content'] for m in self.git_manager.get_message_history()]
+        self.assertEqual(contents, [f"Message {i}" for i in range(1, 5)])
+
+    def test_paging_and_time_range(self):
+        """Test limit/offset and since/until slices stay in timestamp order"""
+        page = self.git_manager.get_message_history(limit=2, offset=1)
+        self.assertEqual([m['content'] for m in page], ["Message 1", "Message 2"])
+
+        window = self.git_manager.get_message_history(since=self.start + timedelta(minutes=3))
+        self.assertEqual([m['content'] for m in window], ["Message 3", "Message 4"])
+
+        window = self.git_manager.get_message_history(until=self.start + timedelta(minutes=1))
+        self.assertEqual([m['content'] for m in window], ["Message 0"])
+
+    def test_unreadable_file_is_retried(self):
+        """Test a half-written file is parsed once it is complete"""
+        self.git_manager.get_message_history()
+        partial = self.git_manager.messages_dir / "message_20250107_130000_000000.json"
+        partial.write_text('{"content": "late", ')
+        self.assertEqual(len(self.git_manager.get_message_history()), 5)
+
+        partial.write_text('{"content": "late", "sender": "User", "timestamp": "2025-01-07T13:00:00"}')
+        self.assertEqual(len(self.git_manager.get_message_history()), 6)
+
+    def test_rooms_have_separate_history(self):
+        """Test a room's messages live in their own directory and index"""
+        self.git_manager.create_message_file("Deploy", "User", timestamp=self.start, room_id="ops")
+        self.assertTrue((self.git_manager.messages_dir / "rooms" / "ops").is_dir())
+        self.assertEqual([m["content"] for m in self.git_manager.get_message_history(room_id="ops")], ["Deploy"])
+        self.assertEqual(len(self.git_manager.get_message_history()), 5)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
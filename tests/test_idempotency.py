@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+import unittest
+import os
+import sys
+
+# Add parent directory to path to import the application modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from idempotency import RecentClientIds
+
+class TestRecentClientIds(unittest.TestCase):
+    def test_least_recently_used_is_evicted(self):
+        """Test lookups refresh an id and the oldest untouched one goes first"""
+        ids = RecentClientIds(capacity=2)
+        ids.add("a", 1)
+        ids.add("b", 2)
+        self.assertEqual(ids.get("a"), 1)
+        ids.add("c", 3)
+        self.assertIsNone(ids.get("b"))
+        self.assertEqual((ids.get("a"), ids.get("c")), (1, 3))
+        self.assertEqual(ids.stats()["hits"], 3)
+
+    def test_zero_capacity_remembers_nothing(self):
+        """Test capacity 0 turns the in-memory check off"""
+        ids = RecentClientIds(capacity=0)
+        ids.add("a", 1)
+        self.assertIsNone(ids.get("a"))
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
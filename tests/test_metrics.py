@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+import unittest
+import os
+import sys
+
+# Add parent directory to path to import the application modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from metrics import MetricsRegistry, timed
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.registry = MetricsRegistry()
+
+    def test_counter_rendering(self):
+        """Test counters render one labelled sample per label set"""
+        counter = self.registry.counter("requests_total", "Requests", ["route"])
+        counter.inc("/")
+        counter.inc("/", amount=2)
+        counter.inc('a"b')
+        text = self.registry.render()
+        self.assertIn("# TYPE requests_total counter", text)
+        self.assertIn('requests_total{route="/"} 3', text)
+        self.assertIn('requests_total{route="a\\"b"} 1', text)
+
+    def test_histogram_buckets_are_cumulative(self):
+        """Test histogram buckets, sum and count follow the Prometheus format"""
+        histogram = self.registry.histogram("latency_seconds", "Latency", ["stage"], buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 0.5, 5.0):
+            histogram.observe(value, "push")
+        lines = self.registry.render().splitlines()
+        self.assertIn('latency_seconds_bucket{stage="push",le="0.1"} 1', lines)
+        self.assertIn('latency_seconds_bucket{stage="push",le="1"} 3', lines)
+        self.assertIn('latency_seconds_bucket{stage="push",le="+Inf"} 4', lines)
+        self.assertIn('latency_seconds_sum{stage="push"} 6.05', lines)
+        self.assertIn('latency_seconds_count{stage="push"} 4', lines)
+
+    def test_timed_records_on_error(self):
+        """Test timed() observes the block even when it raises"""
+        histogram = self.registry.histogram("call_seconds", "Calls")
+        with self.assertRaises(RuntimeError):
+            with timed(histogram):
+                raise RuntimeError("boom")
+        self.assertEqual(histogram.count(), 1)
+
+    def test_label_mismatch_rejected(self):
+        """Test using the wrong number of labels is an error"""
+        counter = self.registry.counter("errors_total", "Errors", ["kind"])
+        with self.assertRaises(ValueError):
+            counter.inc()
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
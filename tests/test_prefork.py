@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+import unittest
+import http.client
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add parent directory to path to import the application modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database.db_utils import DatabaseManager
+from database.init_db import DatabaseInitializer
+from prefork import PreforkServer
+
+class TestPreforkServer(unittest.TestCase):
+    def setUp(self):
+        """Start two worker processes on a shared port, without Git sync"""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = Path(self.tmp.name) / "db.sqlite"
+        DatabaseInitializer(self.db_path).init_database()
+        self.server = PreforkServer("127.0.0.1", 0, workers=2, sync_enabled=False, db_path=self.db_path)
+        self.server.start()
+
+    def tearDown(self):
+        self.server.stop()
+        self.tmp.cleanup()
+
+    def request(self, method, path, body=None):
+        conn = http.client.HTTPConnection("127.0.0.1", self.server.port, timeout=10)
+        conn.request(method, path, body=json.dumps(body) if body else None,
+                     headers={"Connection": "close"})
+        response = conn.getresponse()
+        data = json.loads(response.read())
+        conn.close()
+        return response.status, data
+
+    def test_workers_share_database(self):
+        """Test posts from any worker land in the one SQLite database"""
+        for i in range(10):
+            status, _ = self.request("POST", "/api/messages", {"content": f"Message {i}", "sender": "User"})
+            self.assertEqual(status, 200)
+        status, data = self.request("GET", "/api/messages?limit=50")
+        self.assertEqual(len(data["messages"]), 10)
+        db = DatabaseManager(self.db_path)
+        self.assertEqual(len(db.get_messages(limit=50)), 10)
+        db.close()
+
+    def test_stream_sees_room_posts_from_any_worker(self):
+        """Test a stream of a non-default room gets posts whichever worker took them"""
+        stream = http.client.HTTPConnection("127.0.0.1", self.server.port, timeout=10)
+        stream.request("GET", "/api/stream?room=ops")
+        response = stream.getresponse()
+        self.assertEqual(response.status, 200)
+        posted = [self.request("POST", "/api/messages", {"content": f"Deploy {i}", "sender": "User",
+                                                         "room_id": "ops"})[1]["id"] for i in range(4)]
+
+        received = []
+        while len(received) < len(posted):
+            line = response.fp.readline().decode("utf-8")
+            if line.startswith("data: "):
+                received.append(json.loads(line[len("data: "):])["id"])
+        stream.close()
+        self.assertEqual(received, posted)
+
+    def test_backlog_sheds_posts_while_sync_fails(self):
+        """Test posts get 503 once the unsynced backlog passes SYNC_MAX_BACKLOG, with Git failing"""
+        self.server.stop()
+        repo = Path(self.tmp.name) / "repo"
+        repo.mkdir()
+        # A checkout with no origin: every push fails
+        subprocess.run(["git", "init", "-q", str(repo)], check=True)
+        saved = dict(os.environ)
+        self.addCleanup(lambda: (os.environ.clear(), os.environ.update(saved)))
+        os.environ.update(REPO_URL="local", REPO_PATH=str(repo), SYNC_MAX_BACKLOG="3",
+                          CLIENT_RATE_LIMIT="0", SENDER_RATE_LIMIT="0", ACCESS_LOG="0")
+        self.server = PreforkServer("127.0.0.1", 0, workers=1, sync_enabled=True, db_path=self.db_path)
+        self.server.start()
+
+        self.assertEqual(self.request("POST", "/api/messages", {"content": "Posted", "sender": "User"})[0], 200)
+        # Rows the sync process was never woken for, as when wakeups coalesce
+        db = DatabaseManager(self.db_path)
+        db.add_messages((f"Message {i}", "User") for i in range(3))
+        db.close()
+        # Long enough for several polls of the sync process
+        time.sleep(1.5)
+        status, _ = self.request("POST", "/api/messages", {"content": "One too many", "sender": "User"})
+        self.assertEqual(status, 503)
+        self.assertEqual(self.request("GET", "/api/sync/status")[1]["sync"]["queue_depth"], 4)
+
+    def test_reload_replaces_workers(self):
+        """Test a reload swaps every worker and keeps serving"""
+        before = set(self.server.pids())
+        self.server.reload()
+        after = set(self.server.pids())
+        self.assertEqual(len(after), 2)
+        self.assertFalse(before & after)
+        self.assertEqual(self.request("GET", "/api/messages")[0], 200)
+
+    def test_crashed_worker_restarted(self):
+        """Test a worker that dies is replaced by the supervisor"""
+        victim = self.server.pids()[0]
+        os.kill(victim, signal.SIGKILL)
+        deadline = time.time() + 10
+        while time.time() < deadline:
+            self.server.check_children()
+            if len(self.server.pids()) == 2 and victim not in self.server.pids():
+                break
+            time.sleep(0.1)
+        self.assertEqual(self.server.restarts, 1)
+        self.assertNotIn(victim, self.server.pids())
+        self.assertEqual(self.request("GET", "/api/messages")[0], 200)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+import unittest
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Add parent directory to path to import the application modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database.db_utils import DatabaseManager
+from database.init_db import DatabaseInitializer
+from recent_cache import RecentMessageCache
+
+class TestRecentMessageCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        db_path = Path(self.tmp.name) / "db.sqlite"
+        DatabaseInitializer(db_path).init_database()
+        self.db = DatabaseManager(db_path)
+
+    def tearDown(self):
+        self.db.close()
+        self.tmp.cleanup()
+
+    def add(self, content, timestamp):
+        return self.db.add_message(content, "User", timestamp=timestamp)
+
+    def uncached(self, limit, before_id=None, room_id="default"):
+        with self.db.get_db() as conn:
+            return self.db._query_messages(conn, limit, before_id, room_id)
+
+    def test_pages_match_database(self):
+        """Test cached pages are identical to get_messages, cursor included"""
+        cache = RecentMessageCache(capacity=10)
+        self.db.attach_recent_cache(cache)
+        for i in range(8):
+            self.add(f"Message {i}", f"2025-01-01 00:00:0{i % 4}")
+        self.add("Default timestamp", None)
+
+        before = None
+        for _ in range(3):
+            page = self.db.get_messages(limit=3, before_id=before)
+            self.assertEqual(page, self.uncached(3, before))
+            before = page[-1]["id"]
+        self.assertEqual(cache.stats()["hits"], 3)
+
+    def test_eviction_turns_old_pages_into_misses(self):
+        """Test only the newest capacity messages are kept once full"""
+        cache = RecentMessageCache(capacity=5)
+        self.db.attach_recent_cache(cache)
+        ids = [self.add(f"Message {i}", f"2025-01-01 00:00:{i:02d}") for i in range(8)]
+
+        stats = cache.stats()
+        self.assertEqual((stats["messages"], stats["evictions"]), (5, 3))
+        self.assertEqual([m["id"] for m in cache.get_page(5)], ids[:2:-1])
+        # Older than anything buffered, and the buffer no longer holds it all
+        self.assertIsNone(cache.get_page(5, before_id=ids[4]))
+        self.assertIsNone(cache.get_page(2, before_id=ids[1]))
+        self.assertEqual(cache.stats()["misses"], 2)
+
+    def test_warm_partial_history(self):
+        """Test a warm cache misses pages deeper than it holds"""
+        self.db.add_messages((f"Message {i}", "User") for i in range(20))
+        cache = RecentMessageCache(capacity=10)
+        self.assertEqual(self.db.attach_recent_cache(cache), 10)
+        self.assertEqual(len(cache.get_page(10)), 10)
+        self.assertIsNone(cache.get_page(11))
+
+        # Bulk inserts reload the buffer with the newest rows
+        self.db.add_messages((f"Bulk {i}", "User") for i in range(3))
+        self.assertEqual(self.db.get_messages(limit=4), self.uncached(4))
+
+    def test_mark_synced(self):
+        """Test update_git_hashes reaches cached messages"""
+        cache = RecentMessageCache()
+        self.db.attach_recent_cache(cache)
+        message_id = self.add("Hello", "2025-01-01 00:00:00")
+        self.db.update_git_hashes([message_id], "abc123")
+        self.assertEqual(cache.get_page(1)[0]["git_hash"], "abc123")
+        self.assertEqual(cache.get_page(1)[0]["is_synced"], 1)
+
+    def test_least_recent_room_is_evicted_and_rewarmed(self):
+        """Test rooms past max_rooms are dropped and warmed again on their next read"""
+        cache = RecentMessageCache(capacity=10, max_rooms=2)
+        self.db.attach_recent_cache(cache)
+        for room in ("a", "b", "c"):
+            self.db.add_message(f"In {room}", "User", room_id=room)
+
+        # The default room, warmed on attach, went first
+        self.assertEqual(cache.stats()["room_evictions"], 2)
+        self.assertFalse(cache.has_room("default"))
+        self.assertFalse(cache.has_room("a"))
+        self.assertEqual(self.db.get_messages(limit=5, room_id="a"), self.uncached(5, room_id="a"))
+        # Warmed by that read, so "b" went instead and the next read is a hit
+        self.assertTrue(cache.has_room("a"))
+        self.assertFalse(cache.has_room("b"))
+        hits = cache.stats()["hits"]
+        self.assertEqual(len(self.db.get_messages(limit=5, room_id="a")), 1)
+        self.assertEqual(cache.stats()["hits"], hits + 1)
+
+    def test_snapshot_restores_until_database_changes(self):
+        """Test a saved snapshot restores every room and is ignored once the database moves on"""
+        self.db.add_messages((f"Message {i}", "User") for i in range(12))
+        self.db.add_messages([(f"Ops {i}", "User") for i in range(3)], room_id="ops")
+        snapshot = Path(self.tmp.name) / "recent_snapshot.json"
+        self.db.attach_recent_cache(RecentMessageCache(capacity=10))
+        # A post warms its room, which the snapshot then carries
+        self.db.add_message("Ops 3", "User", room_id="ops")
+        self.assertEqual(self.db.save_recent_snapshot(snapshot), 14)
+
+        cache = RecentMessageCache(capacity=10)
+        self.assertEqual(self.db.attach_recent_cache(cache, snapshot_path=snapshot), 14)
+        self.assertEqual(cache.source, "snapshot")
+        self.assertEqual(cache.get_page(5, room="ops"), self.uncached(5, room_id="ops"))
+        self.assertEqual(len(cache.get_page(5, room="ops")), 4)
+        self.assertIsNone(cache.get_page(11))
+
+        # A sync or a post since the snapshot invalidates it
+        self.db.update_git_hashes([1], "abc123")
+        cache = RecentMessageCache(capacity=10)
+        self.assertEqual(self.db.attach_recent_cache(cache, snapshot_path=snapshot), 10)
+        self.assertEqual(cache.source, "database")
+        self.assertFalse(cache.has_room("ops"))
+        self.assertIsNone(RecentMessageCache(capacity=20).load(snapshot, self.db.data_fingerprint()))
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+import unittest
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Add parent directory to path to import the application modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tests.support import git, make_local_remote
+from git_manager import GitManager
+from segment_log import SegmentLog, migrate_legacy_files
+
+class TestSegmentLog(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.segments_dir = Path(self.tmp.name) / "segments"
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def message(self, i):
+        return {'content': f"Message {i}", 'sender': "User", 'timestamp': f"2025-01-07T12:00:{i:02d}"}
+
+    def test_segments_roll_at_size_limit(self):
+        """Test appends roll over to a new segment once the limit is reached"""
+        log = SegmentLog(self.segments_dir, max_segment_bytes=200)
+        paths = {log.append(self.message(i)) for i in range(10)}
+        log.close()
+
+        self.assertGreater(len(paths), 1)
+        self.assertTrue(all(path.stat().st_size <= 200 for path in log.segments()))
+        self.assertEqual([m['content'] for m in log.iter_messages()], [f"Message {i}" for i in range(10)])
+
+    def test_read_from_uses_sparse_index(self):
+        """Test reading from a record number via the sparse offset index"""
+        log = SegmentLog(self.segments_dir, index_interval=4)
+        for i in range(10):
+            log.append(self.message(i))
+        log.close()
+
+        segment = log.segments()[0]
+        self.assertEqual(segment.with_suffix('.idx').stat().st_size, 3 * 16)
+        self.assertEqual([m['content'] for m in log.read_from(segment, 6)],
+                         ["Message 6", "Message 7", "Message 8", "Message 9"])
+
+    def test_reopen_recovers_torn_record_and_ids(self):
+        """Test reopening drops a half-written record and skips known ids"""
+        log = SegmentLog(self.segments_dir)
+        log.append(dict(self.message(0), id=1))
+        log.close()
+        with open(log.active_segment, 'ab') as f:
+            f.write(b'{"content": "torn')
+
+        reopened = SegmentLog(self.segments_dir)
+        reopened.append(dict(self.message(0), id=1))
+        reopened.append(dict(self.message(1), id=2))
+        reopened.close()
+        self.assertEqual([m['id'] for m in reopened.iter_messages()], [1, 2])
+
+    def test_retry_across_roll_until_settled(self):
+        """Test a retried batch is skipped across rolls and reopens until settle()"""
+        log = SegmentLog(self.segments_dir, max_segment_bytes=200)
+        for i in range(1, 6):
+            log.append(dict(self.message(i), id=i))
+        self.assertGreater(len(log.segments()), 1)
+        for i in range(1, 6):
+            log.append(dict(self.message(i), id=i))
+        log.close()
+
+        reopened = SegmentLog(self.segments_dir, max_segment_bytes=200)
+        for i in range(1, 6):
+            reopened.append(dict(self.message(i), id=i))
+        self.assertEqual([m['id'] for m in reopened.iter_messages()], [1, 2, 3, 4, 5])
+
+        reopened.settle()
+        reopened.append(dict(self.message(6), id=6))
+        reopened.close()
+        settled = SegmentLog(self.segments_dir, max_segment_bytes=200)
+        settled.append(dict(self.message(6), id=6))
+        settled.append(dict(self.message(1), id=1))
+        settled.close()
+        self.assertEqual([m['id'] for m in settled.iter_messages()], [1, 2, 3, 4, 5, 6, 1])
+
+class TestSegmentStorage(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.work = make_local_remote(Path(self.tmp.name))
+        self.start = datetime(2025, 1, 7, 12, 0, 0)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_history_reads_both_layouts(self):
+        """Test history merges legacy files and segment records by timestamp"""
+        legacy = GitManager("local", base_path=self.work, storage_format='files')
+        segmented = GitManager("local", base_path=self.work, storage_format='segments')
+        for i in range(4):
+            manager = legacy if i % 2 == 0 else segmented
+            manager.create_message_file(f"Message {i}", "User", timestamp=self.start + timedelta(minutes=i))
+
+        contents = [m['content'] for m in segmented.get_message_history()]
+        self.assertEqual(contents, [f"Message {i}" for i in range(4)])
+
+        # Records appended after the first read are picked up incrementally
+        segmented.create_message_file("Message 4", "User", timestamp=self.start + timedelta(minutes=4))
+        self.assertEqual(len(segmented.get_message_history()), 5)
+
+    def test_push_segment_messages(self):
+        """Test a batch of segment messages is pushed as one file change"""
+        manager = GitManager("local", base_path=self.work, storage_format='segments')
+        paths = [manager.create_message_file(f"Message {i}", "User") for i in range(3)]
+        commit_hash = manager.push_messages(paths)
+
+        self.assertIsNotNone(commit_hash)
+        changed = git(['show', '--name-only', '--format=', commit_hash], cwd=self.work).split()
+        self.assertEqual(changed, ["messages/segments/segment_000001.jsonl"])
+
+    def test_open_rooms_are_bounded(self):
+        """Test the least recent room's log and index are closed and reopen with its ids"""
+        manager = GitManager("local", base_path=self.work, storage_format='segments', max_open_rooms=2)
+        for i, room in enumerate(("a", "b", "c")):
+            manager.create_message_file(f"In {room}", "User", message_id=i + 1, room_id=room)
+            self.assertEqual(len(manager.get_message_history(room_id=room)), 1)
+        self.assertEqual(list(manager._segment_logs), ["b", "c"])
+        self.assertEqual(list(manager._history_indexes), ["b", "c"])
+
+        # Not settled yet, so the reopened log still skips a retried append
+        manager.create_message_file("In a", "User", message_id=1, room_id="a")
+        self.assertEqual([m['content'] for m in manager.get_message_history(room_id="a")], ["In a"])
+        self.assertEqual(list(manager._segment_logs), ["c", "a"])
+        manager.close()
+
+    def test_migrate_legacy_files(self):
+        """Test migration moves every legacy file into segments"""
+        manager = GitManager("local", base_path=self.work, storage_format='files')
+        for i in range(3):
+            manager.create_message_file(f"Message {i}", "User", timestamp=self.start + timedelta(minutes=i))
+        before = manager.get_message_history()
+
+        migrated = migrate_legacy_files(manager.messages_dir, manager.segment_log)
+        self.assertEqual(migrated, 3)
+        self.assertEqual(list(manager.messages_dir.glob('message_*.json')), [])
+        self.assertEqual(manager.get_message_history(), before)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+import unittest
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add parent directory to path to import the application modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tests.support import git, make_local_remote
+from database.db_utils import DatabaseManager
+from database.init_db import DatabaseInitializer
+from git_manager import GitManager
+from sync_worker import SyncWorker
+
+class TestSyncWorker(unittest.TestCase):
+    def setUp(self):
+        """Create a temporary database and a local remote"""
+        self.tmp = tempfile.TemporaryDirectory()
+        root = Path(self.tmp.name)
+        self.work = make_local_remote(root)
+        self.db_path = root / "db.sqlite"
+        DatabaseInitializer(self.db_path).init_database()
+        self.db = DatabaseManager(self.db_path)
+        self.git_manager = GitManager("local", base_path=self.work)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_sync_once_marks_batch(self):
+        """Test a batch of rows becomes one commit and is marked synced"""
+        for i in range(5):
+            self.db.add_message(f"Message {i}", "User")
+        worker = SyncWorker(self.db, self.git_manager, batch_size=3)
+
+        self.assertEqual(worker.sync_once(), 3)
+        self.assertEqual(worker.sync_once(), 2)
+        self.assertEqual(worker.sync_once(), 0)
+
+        self.assertEqual(self.db.count_unsynced_messages(), 0)
+        hashes = {row['git_hash'] for row in self.db.get_messages(limit=10)}
+        self.assertEqual(len(hashes), 2)
+        self.assertEqual(len(list(self.git_manager.messages_dir.glob('message_*.json'))), 5)
+
+    def test_retry_after_failed_push(self):
+        """Test a failed push is retried without duplicating message files"""
+        self.db.add_message("Message", "User")
+        worker = SyncWorker(self.db, self.git_manager)
+
+        remote = Path(self.tmp.name) / "remote.git"
+        moved = Path(self.tmp.name) / "moved.git"
+        shutil.move(str(remote), str(moved))
+        with self.assertRaises(Exception):
+            worker.sync_once()
+        self.assertEqual(self.db.count_unsynced_messages(), 1)
+
+        shutil.move(str(moved), str(remote))
+        self.assertEqual(worker.sync_once(), 1)
+        self.assertEqual(len(list(self.git_manager.messages_dir.glob('message_*.json'))), 1)
+        remote_head = git(['rev-parse', 'origin/master'], cwd=self.work).strip()
+        self.assertEqual(self.db.get_messages(limit=1)[0]['git_hash'], remote_head)
+
+    def test_retry_after_failed_hash_update(self):
+        """Test rows pushed but not marked synced are not appended to their segment again"""
+        for i in range(2):
+            self.db.add_message(f"Message {i}", "User")
+        git_manager = GitManager("local", base_path=self.work, storage_format="segments")
+        worker = SyncWorker(self.db, git_manager)
+
+        update_git_hashes = self.db.update_git_hashes
+        def fail_once(message_ids, commit_hash):
+            self.db.update_git_hashes = update_git_hashes
+            raise Exception("database is locked")
+        self.db.update_git_hashes = fail_once
+        with self.assertRaises(Exception):
+            worker.sync_once()
+        self.assertEqual(self.db.count_unsynced_messages(), 2)
+
+        self.assertEqual(worker.sync_once(), 2)
+        self.assertEqual([m['id'] for m in git_manager.segment_log.iter_messages()], [1, 2])
+        git_manager.close()
+
+    def test_background_thread_drains_queue(self):
+        """Test notify() wakes the worker and backlog metrics follow"""
+        worker = SyncWorker(self.db, self.git_manager, poll_interval=60, max_backlog=2)
+        worker.start()
+        try:
+            self.db.add_message("Message", "User")
+            worker.notify()
+            deadline = time.time() + 30
+            while self.db.count_unsynced_messages() and time.time() < deadline:
+                time.sleep(0.05)
+        finally:
+            worker.stop()
+
+        self.assertEqual(self.db.count_unsynced_messages(), 0)
+        stats = worker.stats()
+        self.assertEqual(stats['messages_synced'], 1)
+        self.assertEqual(stats['queue_depth'], 0)
+        self.assertFalse(worker.is_backlogged())
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
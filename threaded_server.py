@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import HTTPServer
+
+from admission import SHED_REQUESTS
+
+# Sent on connections rejected before any handler runs
+OVERLOADED_RESPONSE = (
+    b"HTTP/1.1 503 Service Unavailable\r\n"
+    b"Content-Type: text/plain\r\n"
+    b"Content-Length: 20\r\n"
+    b"Retry-After: 1\r\n"
+    b"Connection: close\r\n"
+    b"\r\n"
+    b"Server overloaded.\r\n"
+)
+
+
+class BoundedThreadingHTTPServer(HTTPServer):
+    """HTTP server that handles connections on a bounded worker pool
+
+    Connections beyond max_connections are answered with 503 straight away
+    instead of queueing without limit. Accepted connections wait for one of
+    max_workers threads, which serves them until the client closes the
+    keep-alive connection or the handler's idle timeout expires.
+    """
+
+    daemon_threads = True
+    # The socketserver default backlog of 5 drops SYNs under bursts, which
+    # shows up as one-second client retransmits
+    request_queue_size = 128
+
+    def __init__(self, server_address, handler_class, max_workers: int = 64,
+                 max_connections: int = 256, bind_and_activate: bool = True):
+        self.max_workers = max_workers
+        self.max_connections = max_connections
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="http-worker")
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self._lock = threading.Lock()
+        self.active_connections = 0
+        self.rejected_connections = 0
+        super().__init__(server_address, handler_class, bind_and_activate)
+
+    def process_request(self, request, client_address):
+        """Hand the connection to the worker pool, or reject it when full"""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected_connections += 1
+            SHED_REQUESTS.inc("connections")
+            try:
+                request.sendall(OVERLOADED_RESPONSE)
+            except OSError:
+                pass
+            self.shutdown_request(request)
+            return
+
+        with self._lock:
+            self.active_connections += 1
+        self._executor.submit(self._process_request_worker, request, client_address)
+
+    def _process_request_worker(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            with self._lock:
+                self.active_connections -= 1
+            self._slots.release()
+
+    def drain(self, timeout: float) -> bool:
+        """Wait up to timeout seconds for open connections to end; True if they all did"""
+        deadline = time.monotonic() + timeout
+        while self.active_connections and time.monotonic() < deadline:
+            time.sleep(0.05)
+        return not self.active_connections
+
+    def server_close(self):
+        super().server_close()
+        self._executor.shutdown(wait=False)